@@ -0,0 +1,113 @@
+"""
+Product hydration benchmark: ChromaDB metadata round-trips versus the
+memory-mapped catalog snapshot.
+
+A synthetic catalog is pushed through build_records into a ChromaDB
+collection and a CatalogSnapshotWriter in a temp directory. Reported:
+  - bytes per product of the old metadata record (with the duplicated
+    "document" string) versus the new one, and of the snapshot on disk
+  - heap bytes per product held by Python for dict-of-metadata versus the
+    loaded ProductCatalog (tracemalloc; the snapshot pages are file-backed)
+  - latency to hydrate 5 recommended products
+
+    python benchmarks/catalog_hydration_benchmark.py --size 20000
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+COLORS = ["black", "red", "blue", "green", "pink", "white", "maroon", "beige"]
+GARMENTS = ["dress", "saree", "kurti", "top", "skirt", "jeans", "lehenga", "jumpsuit"]
+LOOKUPS = 500
+
+
+def synthetic_products(size: int):
+    rng = random.Random(0)
+    for i in range(size):
+        color, garment = rng.choice(COLORS), rng.choice(GARMENTS)
+        yield {
+            "name": f"{color.title()} {garment.title()} {i}",
+            "brand": f"Brand {i % 500}",
+            "price": f"₹{rng.randint(299, 9999):,}",
+            "description": f"A {color} {garment} in soft cotton, ideal for festive and casual wear. " * 2,
+            "image": f"https://cdn.example.com/products/{i}.jpg",
+            "color": color,
+            "sizes": ["S", "M", "L", "XL"],
+            "attributes": {"fabric": "cotton", "fit": "regular"},
+        }
+
+
+def heap_bytes(build):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    obj = build()
+    used = sum(stat.size_diff for stat in tracemalloc.take_snapshot().compare_to(before, "filename"))
+    tracemalloc.stop()
+    return obj, used
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=20000)
+    args = parser.parse_args()
+
+    import chromadb
+    from chromadb.config import Settings
+    from db_store import build_records
+    from product_catalog import CatalogSnapshotWriter, ProductCatalog
+
+    with tempfile.TemporaryDirectory() as tmp:
+        client = chromadb.PersistentClient(path=os.path.join(tmp, "chroma_db"), settings=Settings(anonymized_telemetry=False))
+        collection = client.create_collection("bench_products")
+        writer = CatalogSnapshotWriter(os.path.join(tmp, "catalog_snapshot"))
+
+        old_bytes = new_bytes = 0
+        batch = []
+        for pid, doc, metadata in build_records(synthetic_products(args.size)):
+            new_bytes += len(json.dumps(metadata, ensure_ascii=False).encode("utf-8"))
+            old_bytes += len(json.dumps({**metadata, "document": doc}, ensure_ascii=False).encode("utf-8"))
+            writer.add(pid, metadata)
+            batch.append((pid, metadata))
+            if len(batch) == 1000:
+                collection.add(ids=[p for p, _ in batch], embeddings=[[0.0, 1.0]] * len(batch), metadatas=[m for _, m in batch])
+                batch = []
+        if batch:
+            collection.add(ids=[p for p, _ in batch], embeddings=[[0.0, 1.0]] * len(batch), metadatas=[m for _, m in batch])
+        writer.save()
+        snapshot_bytes = sum(os.path.getsize(os.path.join(writer.path, name)) for name in os.listdir(writer.path))
+
+        print(f"{args.size} products")
+        print(f"  metadata record  with document: {old_bytes / args.size:7.0f} B/product")
+        print(f"  metadata record  w/o document:  {new_bytes / args.size:7.0f} B/product")
+        print(f"  snapshot on disk:               {snapshot_bytes / args.size:7.0f} B/product")
+
+        all_ids = [str(i + 1) for i in range(args.size)]
+        metadata_by_id, dict_heap = heap_bytes(
+            lambda: dict(zip(all_ids, collection.get(ids=all_ids, include=["metadatas"])["metadatas"]))
+        )
+        catalog, catalog_heap = heap_bytes(lambda: ProductCatalog(writer.path))
+        print(f"  heap, metadata dicts:           {dict_heap / args.size:7.0f} B/product")
+        print(f"  heap, ProductCatalog:           {catalog_heap / args.size:7.0f} B/product")
+
+        rng = random.Random(1)
+        samples = [rng.sample(all_ids, 5) for _ in range(LOOKUPS)]
+        for label, hydrate in (
+            ("collection.get", lambda ids: collection.get(ids=ids)["metadatas"]),
+            ("ProductCatalog", lambda ids: list(catalog.get_many(ids).values())),
+        ):
+            start = time.perf_counter()
+            for ids in samples:
+                assert len(hydrate(ids)) == 5
+            print(f"  hydrate 5 via {label:<15} {(time.perf_counter() - start) / LOOKUPS * 1e6:9.1f} us")
+        del metadata_by_id
+
+
+if __name__ == "__main__":
+    main()
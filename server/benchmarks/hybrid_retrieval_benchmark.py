@@ -0,0 +1,117 @@
+"""
+Hybrid retrieval benchmark: vector-only vs BM25-only vs reciprocal rank fusion.
+
+Builds a synthetic catalog with format_product, a ChromaDB collection and a
+lexical index in a temp directory. No Gemini calls are made. Vectors come
+from a local stand-in "semantic" embedding: a bag of fashion-lexicon concepts
+(garment, color, fabric, style, event) plus noise. Like a real dense model,
+it carries no signal for rare tokens such as brand names and SKUs.
+
+Two query sets are measured:
+  exact        "<brand> <sku>" for one target product  -> recall@k of the target
+  descriptive  "<color> <fabric> <garment>"            -> hit@k of any matching product
+
+    python benchmarks/hybrid_retrieval_benchmark.py --size 14000
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DIM = 256
+K = 5
+
+
+def concept_embedding(text, vocab, rng_seed):
+    import numpy as np
+    from fashion_lexicon import normalize
+    vector = np.random.default_rng(rng_seed).normal(0, 0.02, DIM)
+    for token in normalize(text).split():
+        if token in vocab:
+            vector[vocab[token]] += 1.0
+    return (vector / np.linalg.norm(vector)).astype("float32")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=14000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    import numpy as np
+    import chromadb
+    from chromadb.config import Settings
+    from fashion_lexicon import FASHION_LEXICON, normalize
+    from db_store import format_product
+    from lexical_index import LexicalIndexBuilder, LexicalIndex, reciprocal_rank_fusion
+
+    rng = random.Random(0)
+    garments = FASHION_LEXICON["garment"][:40]
+    colors = FASHION_LEXICON["color"][:20]
+    fabrics = FASHION_LEXICON["fabric"][:15]
+    concepts = sorted({normalize(w) for w in garments + colors + fabrics + FASHION_LEXICON["style"]})
+    vocab = {c: i % DIM for i, c in enumerate(concepts)}
+
+    products = []
+    for i in range(args.size):
+        products.append({
+            "name": f"{rng.choice(colors)} {rng.choice(fabrics)} {rng.choice(garments)} SKU{i:06d}".title(),
+            "brand": f"Brand{rng.randint(0, 2000):04d}",
+            "price": rng.randint(299, 9999),
+            "description": f"{rng.choice(FASHION_LEXICON['style'])} {rng.choice(FASHION_LEXICON['event'])} wear",
+            "color": rng.choice(colors),
+        })
+
+    with tempfile.TemporaryDirectory() as tmp:
+        client = chromadb.PersistentClient(path=os.path.join(tmp, "chroma_db"), settings=Settings(anonymized_telemetry=False))
+        collection = client.create_collection("bench_products", metadata={"hnsw:space": "cosine"})
+        builder = LexicalIndexBuilder()
+        print(f"Indexing {args.size} products...")
+        for start in range(0, args.size, 1000):
+            batch = products[start:start + 1000]
+            ids = [str(start + j + 1) for j in range(len(batch))]
+            docs = [format_product(p) for p in batch]
+            collection.add(ids=ids, embeddings=[concept_embedding(d, vocab, int(i)).tolist() for d, i in zip(docs, ids)])
+            for pid, doc in zip(ids, docs):
+                builder.add(pid, doc)
+        builder.save(os.path.join(tmp, "lexical_index"))
+        lexical = LexicalIndex(os.path.join(tmp, "lexical_index"))
+
+        targets = rng.sample(range(args.size), args.queries)
+        exact_queries = [(f"{products[t]['brand']} SKU{t:06d}", {str(t + 1)}) for t in targets]
+        descriptive_queries = []
+        for t in rng.sample(range(args.size), args.queries):
+            phrase = products[t]["name"].rsplit(" ", 1)[0].lower()
+            relevant = {str(i + 1) for i, p in enumerate(products) if p["name"].lower().startswith(phrase + " ")}
+            descriptive_queries.append((phrase, relevant))
+
+        def vector(q):
+            res = collection.query(query_embeddings=[concept_embedding(q, vocab, 0).tolist()], n_results=K, include=[])
+            return res["ids"][0]
+
+        def bm25(q):
+            return lexical.search(q, K)[0]
+
+        def hybrid(q):
+            lexical_ids, exact = lexical.search(q, K)
+            if exact:
+                return lexical_ids
+            return reciprocal_rank_fusion([vector(q), lexical_ids])[:K]
+
+        for label, queries in (("exact", exact_queries), ("descriptive", descriptive_queries)):
+            print(f"\n{label} queries ({len(queries)}):")
+            for name, fn in (("vector", vector), ("bm25", bm25), ("hybrid", hybrid)):
+                hits = 0
+                start = time.perf_counter()
+                for query, relevant in queries:
+                    hits += bool(relevant & set(fn(query)))
+                per_query_ms = (time.perf_counter() - start) / len(queries) * 1000
+                print(f"  {name:>7}: hit@{K} {hits / len(queries):6.1%} | {per_query_ms:6.2f}ms/query")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Catalog ingestion memory benchmark: peak RSS and items/sec for the streaming
+loader versus loading the whole export with json.load first.
+
+A synthetic Fashion_Dataset.json-style catalog ({"Sheet1": [...]}) is written
+to a temp directory. Each mode runs in its own subprocess and pushes every
+product through format_product/sanitize_metadata and fixed-size batches into
+a no-op embedder and writer, so only the loading pipeline is measured.
+
+    python benchmarks/ingest_stream_benchmark.py --size 1000000
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+import subprocess
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BATCH_SIZE = 100
+COLORS = ["black", "red", "blue", "green", "pink", "white", "maroon", "beige"]
+GARMENTS = ["dress", "saree", "kurti", "top", "skirt", "jeans", "lehenga", "jumpsuit"]
+
+
+def write_catalog(path: str, size: int):
+    rng = random.Random(0)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('{"Sheet1": [')
+        for i in range(size):
+            color, garment = rng.choice(COLORS), rng.choice(GARMENTS)
+            product = {
+                "name": f"{color.title()} {garment.title()} {i}",
+                "brand": f"Brand {i % 500}",
+                "price": rng.randint(299, 9999),
+                "description": f"A {color} {garment} in soft cotton, ideal for festive and casual wear. " * 2,
+                "image": f"https://cdn.example.com/products/{i}.jpg",
+                "color": color,
+                "sizes": ["S", "M", "L", "XL"],
+                "attributes": {"fabric": "cotton", "fit": "regular"},
+            }
+            f.write(("," if i else "") + json.dumps(product))
+        f.write("]}")
+
+
+def run_mode(mode: str, path: str) -> dict:
+    from catalog_loader import iter_products, batched
+    from db_store import build_records
+
+    def embed(documents):
+        return [[0.0] * 8 for _ in documents]
+
+    start = time.perf_counter()
+    count = 0
+    if mode == "stream":
+        for batch in batched(build_records(iter_products(path)), BATCH_SIZE):
+            embed([doc for _, doc, _ in batch])
+            count += len(batch)
+    else:
+        # Previous behaviour: whole file, then parallel documents/metadatas/ids lists
+        with open(path, "r", encoding="utf-8") as f:
+            products = json.load(f)["Sheet1"]
+        records = list(build_records(products))
+        for i in range(0, len(records), BATCH_SIZE):
+            embed([doc for _, doc, _ in records[i:i + BATCH_SIZE]])
+        count = len(records)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "mode": mode,
+        "items": count,
+        "items_per_sec": count / elapsed,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=1_000_000)
+    parser.add_argument("--modes", nargs="+", default=["stream", "load"], choices=["stream", "load"])
+    parser.add_argument("--mode", help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.path)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "Fashion_Dataset.json")
+        print(f"Writing synthetic catalog of {args.size} products...")
+        write_catalog(path, args.size)
+        print(f"Catalog size: {os.path.getsize(path) / 1024 / 1024:.0f}MB")
+        for mode in args.modes:
+            out = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--mode", mode, "--path", path],
+                capture_output=True, text=True, check=True,
+            )
+            r = json.loads(out.stdout.strip().splitlines()[-1])
+            print(f"{r['mode']:>7}: {r['items']} items | {r['items_per_sec']:9.0f} items/s | peak RSS {r['peak_rss_mb']:8.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Lexicon fast-path benchmark for detect_women_clothing_keywords.
+
+Runs the local pre-classifier over a labelled sample of OCR-like texts and
+reports the fraction of Gemini calls avoided, accuracy of the local decisions
+against the labels and the classifier's own latency. With --llm (needs
+GEMINI_API_KEY) it also asks Gemini for every sample and reports how often the
+local decision agrees with the LLM's.
+
+    python benchmarks/keyword_fastpath_benchmark.py [--llm]
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# (text, is women's clothing)
+LABELLED_SAMPLE = [
+    ("Beautiful Red Silk Saree with Golden Border - Perfect for Wedding", True),
+    ("Women's A-Line Floral Printed Cotton Kurti | Rs. 799", True),
+    ("Black Bodycon Midi Dress for Cocktail Party", True),
+    ("High Waist Skinny Jeans - Blue Denim - Size 28", True),
+    ("Anarkali Suit Set with Dupatta, Georgette, Festive Collection", True),
+    ("Oversized Hoodie in Lavender Fleece", True),
+    ("Pleated Maxi Skirt, Pastel Pink, Summer Vacation", True),
+    ("Linen Palazzo Pants - Relaxed Fit - Office Wear", True),
+    ("Bridal Lehenga Choli with Heavy Embroidery in Maroon Velvet", True),
+    ("Off Shoulder Ruffle Top - White", True),
+    ("Sequin Embellished Evening Gown", True),
+    ("Chiffon Blouse, Sleeveless, Navy", True),
+    ("Trending now: crop tops and wide leg trousers", True),
+    ("New arrivals for her", True),
+    ("Ethnic wear sale - up to 60% off", True),
+    ("Party ready looks in black", True),
+    ("Samsung Galaxy S23 Ultra 12GB RAM 256GB Storage Phantom Black", False),
+    ("Invoice No. 4521  Subtotal 1,299.00  GST 18%  Total 1,532.82", False),
+    ("Margherita Pizza  Large  Rs 499  Add extra cheese", False),
+    ("Boarding Pass  Flight AI 202  Gate 14  Seat 22A", False),
+    ("Login failed: invalid password. Try again or reset via OTP", False),
+    ("boAt Airdopes 141 Bluetooth Earbuds with 42H Playtime", False),
+    ("Dell Inspiron 15 Laptop Intel Core i5 Processor 8GB RAM", False),
+    ("Meeting agenda: Q3 roadmap, hiring plan, budget review", False),
+    ("Beauty Of Joseon Glow Serum: Propolis + Niacinamide 30ml", False),
+    ("Leather Handbag with Gold Chain Strap", False),
+    ("Stiletto Heel Sandals in Tan", False),
+    ("Sterling Silver Hoop Earrings", False),
+    ("Your order has been shipped and will arrive tomorrow", False),
+    ("Weather today: 31 degrees and sunny", False),
+]
+
+
+async def llm_label(text: str) -> bool:
+    import semantic_filter
+    semantic_filter.KEYWORD_FAST_PATH = False
+    return len(await semantic_filter.detect_women_clothing_keywords(text)) > 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--llm", action="store_true", help="Compare local decisions with Gemini's")
+    args = parser.parse_args()
+
+    from fashion_lexicon import classify_fashion_text
+
+    start = time.perf_counter()
+    verdicts = [classify_fashion_text(text) for text, _ in LABELLED_SAMPLE]
+    per_call_us = (time.perf_counter() - start) / len(LABELLED_SAMPLE) * 1e6
+
+    decided = [(v, label) for v, (_, label) in zip(verdicts, LABELLED_SAMPLE) if v.decision != "ambiguous"]
+    correct = sum((v.decision == "positive") == label for v, label in decided)
+
+    print(f"samples:            {len(LABELLED_SAMPLE)}")
+    print(f"decided locally:    {len(decided)} ({len(decided) / len(LABELLED_SAMPLE):.0%} of Gemini calls avoided)")
+    print(f"label agreement:    {correct}/{len(decided)} ({correct / max(1, len(decided)):.0%}) on decided samples")
+    print(f"classifier latency: {per_call_us:.1f}us per text")
+
+    for verdict, (text, label) in zip(verdicts, LABELLED_SAMPLE):
+        mark = "?" if verdict.decision == "ambiguous" else ("ok" if (verdict.decision == "positive") == label else "XX")
+        print(f"  {mark:>2} {verdict.decision:<9} {text[:60]}")
+
+    if args.llm:
+        llm = [asyncio.run(llm_label(text)) for text, _ in LABELLED_SAMPLE]
+        agree = sum((v.decision == "positive") == l for v, l in zip(verdicts, llm) if v.decision != "ambiguous")
+        llm_correct = sum(l == label for l, (_, label) in zip(llm, LABELLED_SAMPLE))
+        print(f"LLM agreement:      {agree}/{len(decided)} on decided samples")
+        print(f"LLM label accuracy: {llm_correct}/{len(LABELLED_SAMPLE)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""
+Offline load test for the chat and upload endpoints.
+
+Drives the FastAPI app in-process at increasing client concurrency with the
+local FakeProvider in place of Gemini (LLM_PROVIDER=fake) and a ChromaDB
+stand-in that blocks for a fixed time, the way the real calls do. No API key
+or network access is needed, and the fake's seeded latency and error draws
+make runs comparable, so the numbers can gate regressions in CI.
+
+Reports requests, errors, throughput and p50/p95/p99 latency per endpoint and
+concurrency level:
+  chat     POST /generate-response
+  stream   POST /generate-response/stream (until the final event)
+  upload   POST /upload-file with a distinct generated image per request
+  batch    POST /generate-response/batch with --batch-size distinct prompts
+  uploads  POST /upload-files with --batch-size distinct images
+  jobs     POST /upload-jobs, then follow the job's events until its result;
+           a 429 is retried after its Retry-After and counted in the latency
+
+For the batch endpoints req/s counts batches; items/s is req/s x batch size.
+
+    python benchmarks/load_test.py --endpoints chat stream upload --concurrency 1 4 16
+    python benchmarks/load_test.py --endpoints chat --max-p95-ms 800   # exit 1 if slower
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("LLM_PROVIDER", "fake")
+# Every client sends the same prompt; measure generation, not cache hits
+os.environ.setdefault("SEMANTIC_CACHE", "false")
+os.environ.setdefault("UPLOAD_CACHE_PHASH_DISTANCE", "0")
+os.environ.setdefault("UPLOAD_JOB_DB_PATH", os.path.join(tempfile.mkdtemp(prefix="load-test-"), "jobs.db"))
+
+PROMPTS = ["red party dress", "silk saree for a wedding", "black office trousers", "floral summer maxi dress"]
+
+
+class FakeCollection:
+    latency = 0.02
+
+    def query(self, query_embeddings=None, n_results=5, **kwargs):
+        time.sleep(self.latency)
+        ids = [str(i) for i in range(1, n_results + 1)]
+        count = len(query_embeddings) if query_embeddings is not None else 1
+        return {"ids": [ids] * count, "metadatas": [[{"name": f"Product {i}"} for i in ids]] * count}
+
+    def get(self, ids, **kwargs):
+        time.sleep(self.latency / 2)
+        return {"ids": ids, "metadatas": [{"name": f"Product {i}", "image": "", "price": 999} for i in ids]}
+
+
+class FakeChroma:
+    ready = True
+    collection = FakeCollection()
+
+
+def percentile(sorted_values, pct: float) -> float:
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def make_image(seed: int) -> bytes:
+    from PIL import Image
+    rng = random.Random(seed)
+    image = Image.frombytes("L", (96, 96), bytes(rng.getrandbits(8) for _ in range(96 * 96)))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+async def call_chat(client, n: int):
+    res = await client.post("/generate-response", json={"prompt": PROMPTS[n % len(PROMPTS)]})
+    res.raise_for_status()
+    if res.json()["response"].startswith("I apologize"):
+        raise RuntimeError("fallback response")
+
+
+async def call_stream(client, n: int):
+    async with client.stream("POST", "/generate-response/stream", json={"prompt": PROMPTS[n % len(PROMPTS)]}) as res:
+        res.raise_for_status()
+        body = "".join([chunk async for chunk in res.aiter_text()])
+    if "event: error" in body:
+        raise RuntimeError("error event")
+
+
+async def call_upload(client, n: int):
+    files = {"file": (f"load-{n}.png", make_image(n), "image/png")}
+    res = await client.post("/upload-file", files=files)
+    res.raise_for_status()
+
+
+BATCH_SIZE = 8
+
+
+async def read_batch(res):
+    body = "".join([chunk async for chunk in res.aiter_text()])
+    if body.count("event: result") != BATCH_SIZE:
+        raise RuntimeError("missing batch results")
+
+
+async def call_batch(client, n: int):
+    items = [{"prompt": f"{PROMPTS[(n + i) % len(PROMPTS)]} {n}-{i}"} for i in range(BATCH_SIZE)]
+    async with client.stream("POST", "/generate-response/batch", json={"items": items}) as res:
+        res.raise_for_status()
+        await read_batch(res)
+
+
+async def call_uploads(client, n: int):
+    files = [("files", (f"load-{n}-{i}.png", make_image(n * 1000 + i), "image/png")) for i in range(BATCH_SIZE)]
+    async with client.stream("POST", "/upload-files", files=files) as res:
+        res.raise_for_status()
+        await read_batch(res)
+
+
+async def call_job(client, n: int):
+    files = {"file": (f"load-{n}.png", make_image(n), "image/png")}
+    res = await client.post("/upload-jobs", files=files)
+    while res.status_code == 429:
+        await asyncio.sleep(float(res.headers["Retry-After"]))
+        res = await client.post("/upload-jobs", files=files)
+    res.raise_for_status()
+    async with client.stream("GET", f"/upload-jobs/{res.json()['job_id']}/events") as events:
+        body = "".join([chunk async for chunk in events.aiter_text()])
+    if '"status": "done"' not in body:
+        raise RuntimeError("job failed")
+
+
+ENDPOINTS = {"chat": call_chat, "stream": call_stream, "upload": call_upload, "batch": call_batch,
+             "uploads": call_uploads, "jobs": call_job}
+
+
+async def run_level(client, endpoint: str, concurrency: int, requests_per_client: int, counter):
+    call = ENDPOINTS[endpoint]
+    latencies = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        for _ in range(requests_per_client):
+            n = next(counter)
+            start = time.perf_counter()
+            try:
+                await call(client, n)
+                latencies.append(time.perf_counter() - start)
+            except Exception:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "throughput_rps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+async def main(args):
+    import itertools
+    import httpx
+    import main as server
+    from providers import FakeProvider, set_provider
+
+    set_provider(FakeProvider(
+        latency_ms={"embed": args.embed_ms, "generate": args.generate_ms, "vision": args.vision_ms},
+        sigma=args.sigma,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    ))
+    FakeCollection.latency = args.chroma_ms / 1000
+    global BATCH_SIZE
+    BATCH_SIZE = args.batch_size
+    server.app.state.chroma = FakeChroma()
+    # The ASGI transport does not run the app's lifespan
+    workers = server.start_upload_workers()
+
+    results = []
+    counter = itertools.count()
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://load-test", timeout=None) as client:
+        print(f"{'endpoint':>8} {'clients':>8} {'requests':>9} {'errors':>7} {'req/s':>8} "
+              f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for endpoint in args.endpoints:
+            for concurrency in args.concurrency:
+                r = await run_level(client, endpoint, concurrency, args.requests_per_client, counter)
+                results.append(r)
+                print(
+                    f"{r['endpoint']:>8} {r['concurrency']:>8} {r['requests']:>9} {r['errors']:>7} "
+                    f"{r['throughput_rps']:>8.1f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f}"
+                )
+    await server.stop_upload_workers(workers)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    failed = [r for r in results if args.max_p95_ms and r["p95_ms"] > args.max_p95_ms]
+    for r in failed:
+        print(f"p95 {r['p95_ms']:.1f}ms over the {args.max_p95_ms}ms budget: {r['endpoint']} x{r['concurrency']}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoints", nargs="+", choices=list(ENDPOINTS), default=["chat"])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--requests-per-client", type=int, default=5)
+    parser.add_argument("--embed-ms", type=float, default=20, help="Fake embedding median latency")
+    parser.add_argument("--generate-ms", type=float, default=200, help="Fake generation median latency")
+    parser.add_argument("--vision-ms", type=float, default=400, help="Fake vision median latency")
+    parser.add_argument("--sigma", type=float, default=0.25, help="Log-normal latency spread (0 = constant)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probability each fake call fails")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=8, help="Items per request for batch and uploads")
+    parser.add_argument("--chroma-ms", type=float, default=20, help="Simulated vector query latency")
+    parser.add_argument("--max-p95-ms", type=float, default=0, help="Exit 1 if any level's p95 exceeds this")
+    parser.add_argument("--json", help="Also write the results to this file")
+    sys.exit(asyncio.run(main(parser.parse_args())))
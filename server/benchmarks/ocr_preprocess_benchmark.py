@@ -0,0 +1,67 @@
+"""
+OCR preprocessing benchmark on the sample screenshots in uploaded_files/.
+
+Reports payload size and preprocessing time for each image. With --ocr (needs
+GEMINI_API_KEY or GOOGLE_API_KEY) it also runs Gemini Vision on the original
+and the preprocessed image, reporting OCR latency and how closely the text
+from the preprocessed image matches the text from the original.
+
+    python benchmarks/ocr_preprocess_benchmark.py [--ocr] [images...]
+"""
+import os
+import sys
+import glob
+import time
+import difflib
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def text_similarity(reference: str, candidate: str) -> float:
+    return difflib.SequenceMatcher(None, reference.split(), candidate.split()).ratio()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("images", nargs="*")
+    parser.add_argument("--ocr", action="store_true", help="Also call Gemini Vision on both variants")
+    args = parser.parse_args()
+
+    from image_preprocess import preprocess_image
+
+    if args.ocr:
+        os.environ.setdefault("GOOGLE_API_KEY", os.getenv("GEMINI_API_KEY", ""))
+        from ocr_utils import extract_text_from_image
+
+    images = args.images or sorted(glob.glob(os.path.join(SERVER_DIR, "uploaded_files", "*")))
+    for path in images:
+        with open(path, "rb") as f:
+            data = f.read()
+
+        start = time.perf_counter()
+        prepared = preprocess_image(data)
+        prep_ms = (time.perf_counter() - start) * 1000
+
+        line = (
+            f"{os.path.basename(path)[:34]:<34} {len(data) / 1024:9.1f}KB -> {len(prepared.data) / 1024:8.1f}KB "
+            f"({len(prepared.data) / len(data):6.1%}) prep {prep_ms:6.1f}ms"
+        )
+
+        if args.ocr:
+            start = time.perf_counter()
+            original_text = extract_text_from_image(path)
+            original_ms = (time.perf_counter() - start) * 1000
+            start = time.perf_counter()
+            prepared_text = extract_text_from_image(prepared)
+            prepared_ms = (time.perf_counter() - start) * 1000
+            line += (
+                f" | OCR {original_ms:7.0f}ms -> {prepared_ms:7.0f}ms"
+                f" | text match {text_similarity(original_text, prepared_text):6.1%}"
+            )
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+"""
+Startup benchmark: time-to-first-query and per-request latency for the old
+per-request ChromaDB construction versus the shared, pre-warmed collection.
+
+Each mode runs in a fresh subprocess so the first query is genuinely cold.
+No Gemini calls are made: queries use random vectors via `query_embeddings`.
+
+    python benchmarks/startup_benchmark.py                      # synthetic index
+    python benchmarks/startup_benchmark.py --path ./chroma_db   # real index
+
+With --cold-start it instead measures a whole API server process against a
+synthetic published snapshot of --size products, comparing the default
+startup with FAST_STARTUP=true plus the precomputed filter index:
+  - import: `import main` (imports and module setup) in a fresh interpreter,
+    with the Gemini provider (dummy key, no calls) so the SDK import is counted
+  - live / ready / first request: milliseconds from spawning uvicorn until
+    /health/live, /health/ready and a successful /generate-response (fake
+    provider), plus the server's own phase breakdown from /stats
+
+    python benchmarks/startup_benchmark.py --cold-start --size 14000 --runs 3
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import argparse
+import statistics
+import subprocess
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DIM = 768
+
+
+def build_synthetic_index(path: str, name: str, size: int):
+    import numpy as np
+    import chromadb
+    from chromadb.config import Settings
+
+    client = chromadb.PersistentClient(path=path, settings=Settings(anonymized_telemetry=False))
+    collection = client.get_or_create_collection(name)
+    rng = np.random.default_rng(0)
+    for start in range(0, size, 1000):
+        stop = min(start + 1000, size)
+        collection.add(
+            ids=[str(i) for i in range(start, stop)],
+            embeddings=rng.standard_normal((stop - start, DIM)).astype("float32").tolist(),
+            metadatas=[{"name": f"Product {i}"} for i in range(start, stop)],
+        )
+
+
+def run_mode(mode: str, path: str, name: str, requests: int) -> dict:
+    import numpy as np
+    from chroma_store import ChromaResources, open_collection
+
+    rng = np.random.default_rng(1)
+    probes = rng.standard_normal((requests, DIM)).astype("float32").tolist()
+    latencies = []
+    first_query_ms = None
+    t0 = time.perf_counter()
+
+    if mode == "shared":
+        chroma = ChromaResources(embedding_fn=None, path=path, name=name)
+        chroma.load()
+        for probe in probes:
+            start = time.perf_counter()
+            chroma.collection.query(query_embeddings=[probe], n_results=5)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if first_query_ms is None:
+                first_query_ms = (time.perf_counter() - t0) * 1000
+    else:
+        for probe in probes:
+            start = time.perf_counter()
+            _, collection = open_collection(embedding_fn=None, path=path, name=name)
+            collection.query(query_embeddings=[probe], n_results=5)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if first_query_ms is None:
+                first_query_ms = (time.perf_counter() - t0) * 1000
+
+    latencies.sort()
+    return {
+        "mode": mode,
+        "time_to_first_query_ms": round(first_query_ms, 2),
+        "p50_ms": round(latencies[len(latencies) // 2], 2),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 2),
+    }
+
+
+# -------------------- Cold Start --------------------
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COLORS = ["red", "blue", "black", "green", "white", "pink", "maroon", "yellow"]
+KINDS = ["dress", "saree", "kurta", "shirt", "trousers", "skirt", "top", "gown"]
+
+
+def build_synthetic_snapshot(root: str, name: str, size: int):
+    """Publish a versioned snapshot embedded like LLM_PROVIDER=fake embeds queries"""
+    import chromadb
+    from chromadb.config import Settings
+    from db_store import build_records
+    from providers import FakeProvider
+    from lexical_index import LexicalIndexBuilder
+    from product_catalog import CatalogSnapshotWriter
+    from query_constraints import CatalogFilterIndex
+    from index_versions import IndexVersion, publish
+
+    products = [
+        {"name": f"{COLORS[i % 8]} {KINDS[i // 8 % 8]} {i}", "brand": f"Brand{i % 300}", "price": str(499 + i % 5000),
+         "color": COLORS[i % 8], "description": f"A {COLORS[i % 8]} {KINDS[i // 8 % 8]} in soft fabric", "image": ""}
+        for i in range(size)
+    ]
+    version = IndexVersion.create(root)
+    client = chromadb.PersistentClient(path=version.chroma_path, settings=Settings(anonymized_telemetry=False))
+    collection = client.create_collection(
+        name, metadata={"embedding_backend": "gemini", "embedding_model": "models/embedding-001"})
+    provider, lexical, catalog = FakeProvider(), LexicalIndexBuilder(), CatalogSnapshotWriter(version.catalog_path)
+    ids, metadatas = [], []
+    records = list(build_records(products))
+    for start in range(0, size, 1000):
+        batch = records[start:start + 1000]
+        collection.add(ids=[pid for pid, _, _ in batch], embeddings=provider.embed([doc for _, doc, _ in batch]),
+                       metadatas=[metadata for _, _, metadata in batch])
+        for pid, doc, metadata in batch:
+            lexical.add(pid, doc)
+            catalog.add(pid, metadata)
+            ids.append(pid)
+            metadatas.append(metadata)
+    lexical.save(version.lexical_path)
+    catalog.save()
+    CatalogFilterIndex(ids, metadatas).save(version.filter_path)
+    version.write_manifest({"created": time.time(), "products": size})
+    publish(version.name, root)
+    return version
+
+
+def import_ms(env: dict) -> float:
+    code = "import json, main; print(json.dumps(main.startup_timings))"
+    out = subprocess.run([sys.executable, "-c", code], cwd=SERVER_DIR, env=env, capture_output=True, text=True, check=True)
+    timings = json.loads(out.stdout.strip().splitlines()[-1])
+    # Module setup is part of the import (it creates the provider unless FAST_STARTUP)
+    return timings["imports_ms"] + timings["setup_ms"]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def serve_until_answered(env: dict, timeout: float = 120) -> dict:
+    """Spawn uvicorn and time it until live, ready and one successful chat answer"""
+    import httpx
+
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=SERVER_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    marks = {}
+    try:
+        with httpx.Client(timeout=10) as client:
+            while "first_request_ms" not in marks:
+                if time.perf_counter() - start > timeout or server.poll() is not None:
+                    raise RuntimeError(f"Server did not answer within {timeout}s")
+                try:
+                    if "live_ms" not in marks:
+                        check = client.get(f"{url}/health/live")
+                        key = "live_ms"
+                    elif "ready_ms" not in marks:
+                        check = client.get(f"{url}/health/ready")
+                        key = "ready_ms"
+                    else:
+                        check = client.post(f"{url}/generate-response", json={"prompt": "red dress"})
+                        key = "first_request_ms"
+                        if check.status_code == 200 and check.json()["response"].startswith("I apologize"):
+                            check.status_code = 503
+                except httpx.TransportError:
+                    check = None
+                if check is not None and check.status_code == 200:
+                    marks[key] = round((time.perf_counter() - start) * 1000, 1)
+                else:
+                    time.sleep(0.01)
+            marks["phases"] = client.get(f"{url}/stats").json()["startup"]
+    finally:
+        server.terminate()
+        server.wait()
+    return marks
+
+
+def cold_start(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        root = os.path.join(tmp, "index")
+        print(f"Building synthetic snapshot of {args.size} products...")
+        version = build_synthetic_snapshot(root, args.name, args.size)
+        base = {**os.environ, "ANONYMIZED_TELEMETRY": "False", "SEMANTIC_CACHE": "false",
+                "UPLOAD_JOB_DB_PATH": os.path.join(tmp, "jobs.db"), "CHROMA_COLLECTION": args.name}
+        configs = {
+            # Unversioned paths into the same snapshot, with no filter index to load
+            "default": {"FAST_STARTUP": "false", "INDEX_ROOT": os.path.join(tmp, "none"),
+                        "CHROMA_PATH": version.chroma_path, "LEXICAL_INDEX_PATH": version.lexical_path,
+                        "CATALOG_SNAPSHOT_PATH": version.catalog_path,
+                        "FILTER_INDEX_PATH": os.path.join(tmp, "none")},
+            "fast": {"FAST_STARTUP": "true", "INDEX_ROOT": root},
+        }
+        report = []
+        print(f"{'config':>8} {'import ms':>10} {'live ms':>8} {'ready ms':>9} {'1st req ms':>11}  server phases")
+        for name, config in configs.items():
+            env = {**base, **config}
+            imports = [import_ms({**env, "LLM_PROVIDER": "gemini", "GEMINI_API_KEY": "benchmark"})
+                       for _ in range(args.runs)]
+            runs = [serve_until_answered({**env, "LLM_PROVIDER": "fake"}) for _ in range(args.runs)]
+            row = {"config": name, "import_ms": statistics.median(imports)}
+            for key in ("live_ms", "ready_ms", "first_request_ms"):
+                row[key] = statistics.median(run[key] for run in runs)
+            row["phases"] = runs[-1]["phases"]
+            report.append(row)
+            phases = {k: v for k, v in row["phases"].items() if k != "index"}
+            print(f"{name:>8} {row['import_ms']:>10.1f} {row['live_ms']:>8.1f} {row['ready_ms']:>9.1f} "
+                  f"{row['first_request_ms']:>11.1f}  {phases} index {row['phases'].get('index')}")
+        shutil.rmtree(root, ignore_errors=True)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--path", help="Existing chroma_db directory (default: build a synthetic one)")
+    parser.add_argument("--name", default="Clothes_products")
+    parser.add_argument("--size", type=int, default=14000, help="Synthetic index size")
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--cold-start", action="store_true", help="Time whole server processes instead")
+    parser.add_argument("--runs", type=int, default=3, help="Server starts per configuration (--cold-start)")
+    parser.add_argument("--json", help="Also write the --cold-start results to this file")
+    parser.add_argument("--mode", choices=["per-request", "shared"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.cold_start:
+        cold_start(args)
+        return
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.path, args.name, args.requests)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.path
+        if not path:
+            path = os.path.join(tmp, "chroma_db")
+            print(f"Building synthetic index of {args.size} vectors...")
+            build_synthetic_index(path, args.name, args.size)
+
+        for mode in ("per-request", "shared"):
+            out = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--mode", mode, "--path", path,
+                 "--name", args.name, "--requests", str(args.requests)],
+                capture_output=True, text=True, check=True,
+            )
+            result = json.loads(out.stdout.strip().splitlines()[-1])
+            print(
+                f"{result['mode']:>12}: first query {result['time_to_first_query_ms']:8.2f}ms | "
+                f"p50 {result['p50_ms']:7.2f}ms | p95 {result['p95_ms']:7.2f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
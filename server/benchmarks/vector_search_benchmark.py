@@ -0,0 +1,178 @@
+"""
+Vector search benchmark: ChromaDB HNSW versus the memory-mapped flat index
+(float32, float16 and int8) as the catalog grows.
+
+Synthetic clustered unit vectors stand in for product embeddings. Each backend
+is measured in a fresh subprocess so its resident memory is not mixed with the
+others'. Reported per catalog size and backend:
+  - load time, and RSS growth after loading and answering the queries
+  - p50/p95 latency of a single top-k query
+  - per-query latency when 32 concurrent queries share one batched pass
+  - recall@k against exact float32 search
+
+Building HNSW is slow at large sizes, so ChromaDB is skipped above --chroma-max.
+
+    python benchmarks/vector_search_benchmark.py --sizes 14000 100000
+    python benchmarks/vector_search_benchmark.py --sizes 1000000 --chroma-max 0 --queries 100
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BATCH = 32
+
+
+def rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def synthetic_vectors(size: int, dimensions: int, start: int = 0, seed: int = 0):
+    """Rows [start, start + size) of a deterministic clustered catalog"""
+    import numpy as np
+    centers = np.random.default_rng(seed).normal(size=(256, dimensions)).astype(np.float32)
+    rng = np.random.default_rng(seed + 1 + start)
+    vectors = centers[rng.integers(0, len(centers), size)] + rng.normal(size=(size, dimensions)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def queries_for(count: int, dimensions: int):
+    import numpy as np
+    rng = np.random.default_rng(12345)
+    base = synthetic_vectors(count, dimensions, start=10 ** 9)
+    return base + rng.normal(size=base.shape).astype(np.float32) * 0.5
+
+
+def percentile(sorted_values, pct: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))]
+
+
+# -------------------- Build --------------------
+def build(workdir: str, size: int, dimensions: int, chroma: bool):
+    import chromadb
+    from chromadb.config import Settings
+    from vector_index import FlatIndexWriter
+
+    writers = {
+        dtype: FlatIndexWriter(os.path.join(workdir, f"flat_{dtype}"), size, dimensions, dtype)
+        for dtype in ("float32", "float16", "int8")
+    }
+    collection = None
+    if chroma:
+        client = chromadb.PersistentClient(path=os.path.join(workdir, "chroma"),
+                                           settings=Settings(anonymized_telemetry=False))
+        collection = client.create_collection("bench", metadata={"hnsw:space": "cosine"})
+    for start in range(0, size, 5000):
+        vectors = synthetic_vectors(min(5000, size - start), dimensions, start)
+        ids = [str(i + 1) for i in range(start, start + len(vectors))]
+        for writer in writers.values():
+            writer.add(ids, vectors)
+        if collection is not None:
+            collection.add(ids=ids, embeddings=vectors)
+    for writer in writers.values():
+        writer.save()
+
+
+# -------------------- Measure (subprocess) --------------------
+def measure(backend: str, workdir: str, args, truth, results):
+    import numpy as np
+    queries = queries_for(args.queries, args.dimensions)
+    baseline = rss_mb()
+    start = time.perf_counter()
+    if backend == "chroma":
+        import chromadb
+        from chromadb.config import Settings
+        client = chromadb.PersistentClient(path=os.path.join(workdir, "chroma"),
+                                           settings=Settings(anonymized_telemetry=False))
+        collection = client.get_collection("bench")
+        collection.query(query_embeddings=queries[:1].tolist(), n_results=args.k, include=[])
+
+        def search(batch):
+            found = collection.query(query_embeddings=batch.tolist(), n_results=args.k, include=[])["ids"]
+            return [[int(pid) - 1 for pid in ids] for ids in found]
+    else:
+        from vector_index import FlatVectorIndex
+        index = FlatVectorIndex(os.path.join(workdir, f"flat_{backend}"))
+        index.search(queries[:1], args.k)
+
+        def search(batch):
+            return [rows.tolist() for rows, _ in index.search(batch, args.k)]
+    load_s = time.perf_counter() - start
+
+    single, found = [], []
+    for query in queries:
+        t = time.perf_counter()
+        found.extend(search(query[None, :]))
+        single.append(time.perf_counter() - t)
+    single.sort()
+    t = time.perf_counter()
+    for offset in range(0, len(queries), BATCH):
+        search(queries[offset:offset + BATCH])
+    batched_ms = (time.perf_counter() - t) / len(queries) * 1000
+
+    recall = float(np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth)]))
+    results.put({
+        "backend": backend,
+        "load_s": round(load_s, 2),
+        "rss_mb": round(rss_mb() - baseline, 1),
+        "p50_ms": round(percentile(single, 50) * 1000, 3),
+        "p95_ms": round(percentile(single, 95) * 1000, 3),
+        "batched_ms": round(batched_ms, 3),
+        f"recall@{args.k}": round(recall, 4),
+    })
+
+
+def exact_truth(workdir: str, args):
+    from vector_index import FlatVectorIndex
+    index = FlatVectorIndex(os.path.join(workdir, "flat_float32"))
+    return [rows.tolist() for rows, _ in index.search(queries_for(args.queries, args.dimensions), args.k)]
+
+
+def main(args):
+    context = multiprocessing.get_context("spawn")
+    report = []
+    print(f"{'size':>9} {'backend':>8} {'load s':>7} {'RSS MB':>8} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'batch ms':>9} {'recall':>7}")
+    for size in args.sizes:
+        workdir = tempfile.mkdtemp(prefix="vector-bench-")
+        try:
+            with_chroma = size <= args.chroma_max
+            build(workdir, size, args.dimensions, with_chroma)
+            truth = exact_truth(workdir, args)
+            backends = (["chroma"] if with_chroma else []) + ["float32", "float16", "int8"]
+            for backend in backends:
+                results = context.Queue()
+                process = context.Process(target=measure, args=(backend, workdir, args, truth, results))
+                process.start()
+                row = {"size": size, **results.get()}
+                process.join()
+                report.append(row)
+                print(f"{size:>9} {row['backend']:>8} {row['load_s']:>7} {row['rss_mb']:>8} {row['p50_ms']:>8} "
+                      f"{row['p95_ms']:>8} {row['batched_ms']:>9} {row[f'recall@{args.k}']:>7}")
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[14000, 100000])
+    parser.add_argument("--dimensions", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--chroma-max", type=int, default=100000, help="Skip ChromaDB above this catalog size")
+    parser.add_argument("--json", help="Also write the results to this file")
+    main(parser.parse_args())
@@ -0,0 +1,133 @@
+import os
+import csv
+import json
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List
+
+CHUNK_SIZE = 1 << 16
+_decoder = json.JSONDecoder()
+
+
+class _JsonStream:
+    """
+    Minimal pull reader over a JSON file: holds only the unread tail of the
+    current chunk, and decodes one value at a time with raw_decode
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.f.read(CHUNK_SIZE)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Next non-whitespace character without consuming it ('' at EOF)"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, chars: str) -> str:
+        ch = self.peek()
+        if not ch or ch not in chars:
+            raise ValueError(f"Malformed JSON: expected one of {chars!r}, got {ch!r}")
+        self.pos += 1
+        return ch
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                obj, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                # Value continues past the buffered text
+                if not self._fill():
+                    raise
+                continue
+            # A number at the end of the buffer may still be incomplete
+            if end == len(self.buf) and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return obj
+
+
+def _iter_json_array(stream: _JsonStream) -> Iterator[Dict]:
+    stream.expect("[")
+    if stream.peek() == "]":
+        stream.pos += 1
+        return
+    while True:
+        yield stream.value()
+        if stream.expect(",]") == "]":
+            return
+
+
+def iter_json_products(path: str, key: str = "Sheet1") -> Iterator[Dict]:
+    """
+    Stream products from a JSON export that is either a list of products or an
+    object holding the list under `key` (the Excel "Sheet1" export)
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        stream = _JsonStream(f)
+        first = stream.peek()
+        if first == "[":
+            yield from _iter_json_array(stream)
+            return
+        if first != "{":
+            raise ValueError("Unexpected JSON format.")
+
+        stream.expect("{")
+        while stream.peek() != "}":
+            name = stream.value()
+            stream.expect(":")
+            if name == key and stream.peek() == "[":
+                yield from _iter_json_array(stream)
+                return
+            stream.value()
+            if stream.expect(",}") == "}":
+                break
+
+
+def iter_jsonl_products(path: str) -> Iterator[Dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def iter_csv_products(path: str) -> Iterator[Dict]:
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        yield from csv.DictReader(f)
+
+
+def iter_products(path: str) -> Iterator[Dict]:
+    """Yield products one at a time from a .json, .jsonl/.ndjson or .csv catalog export"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".jsonl", ".ndjson"):
+        return iter_jsonl_products(path)
+    if ext == ".csv":
+        return iter_csv_products(path)
+    return iter_json_products(path)
+
+
+def batched(items: Iterable, size: int) -> Iterator[List]:
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
@@ -0,0 +1,281 @@
+import os
+import time
+import logging
+import threading
+from lexical_index import LexicalIndex, LEXICAL_INDEX_PATH
+from query_constraints import CatalogFilterIndex, FILTER_INDEX_PATH
+from product_catalog import ProductCatalog, CATALOG_SNAPSHOT_PATH
+from vector_index import FlatCollection, FlatVectorIndex, FLAT_INDEX_PATH, VECTOR_BACKEND
+from index_versions import IndexVersion, INDEX_ROOT, current_version
+
+logger = logging.getLogger(__name__)
+
+CHROMA_PATH = os.getenv("CHROMA_PATH", "./chroma_db")
+COLLECTION_NAME = os.getenv("CHROMA_COLLECTION", "Clothes_products")
+
+# Collection metadata keys identifying how the stored vectors were embedded
+SIGNATURE_KEYS = ("embedding_backend", "embedding_model", "embedding_dimensions")
+# Collections built before the backend was recorded were all embedded with Gemini
+LEGACY_SIGNATURE = {"embedding_backend": "gemini", "embedding_model": "models/embedding-001"}
+
+
+class EmbeddingBackendMismatch(RuntimeError):
+    """The collection was embedded with a different backend or model than this process uses"""
+
+
+# -------------------- Collection Helpers --------------------
+def check_embedding_backend(collection, embedding_fn, record: bool = False):
+    """
+    Raise EmbeddingBackendMismatch if `embedding_fn.signature` disagrees with the
+    signature recorded in the collection metadata. With `record`, an empty or
+    legacy collection is stamped with the embedder's signature.
+    """
+    expected = getattr(embedding_fn, "signature", None)
+    if not expected:
+        return
+    metadata = collection.metadata or {}
+    stored = {key: metadata[key] for key in SIGNATURE_KEYS if key in metadata}
+    if not stored and collection.count():
+        stored = dict(LEGACY_SIGNATURE)
+
+    conflicts = [key for key in SIGNATURE_KEYS if key in stored and key in expected and stored[key] != expected[key]]
+    if conflicts:
+        describe = lambda signature: ", ".join(f"{key}={signature[key]}" for key in SIGNATURE_KEYS if key in signature)
+        raise EmbeddingBackendMismatch(
+            f"Collection '{collection.name}' was embedded with {describe(stored)} but this process uses "
+            f"{describe(expected)}; rebuild it with db_store.py or set CHROMA_COLLECTION to a matching collection"
+        )
+    if record and any(metadata.get(key) != value for key, value in expected.items()):
+        # The distance function lives in the collection configuration and cannot be re-sent
+        kept = {key: value for key, value in metadata.items() if not key.startswith("hnsw:")}
+        collection.modify(metadata={**kept, **expected})
+
+def open_collection(embedding_fn, path: str = CHROMA_PATH, name: str = COLLECTION_NAME):
+    """
+    Open the persistent client and return (client, collection) with our embedder attached.
+    Fails with EmbeddingBackendMismatch if the collection was embedded differently.
+    """
+    # Imported here so the API server's import does not pay for it; the
+    # background index load does
+    import chromadb
+    from chromadb.config import Settings
+    from chromadb.errors import NotFoundError
+
+    client = chromadb.PersistentClient(
+        path=path,
+        settings=Settings(anonymized_telemetry=False)
+    )
+
+    try:
+        collection = client.get_collection(name)
+    except NotFoundError:
+        collection = None
+    if collection is not None:
+        check_embedding_backend(collection, embedding_fn)
+        collection._embedding_function = embedding_fn
+    else:
+        collection = client.create_collection(
+            name=name,
+            embedding_function=embedding_fn,
+            metadata=getattr(embedding_fn, "signature", None) or None,
+        )
+        logger.info("Created new collection")
+
+    return client, collection
+
+
+def warm_collection(collection) -> int:
+    """
+    Force the HNSW segment into memory with one nearest-neighbour query.
+    Uses a stored embedding as the probe so no embedding API call is made.
+    Returns the number of items in the collection.
+    """
+    count = collection.count()
+    if count == 0:
+        logger.warning("Collection is empty, skipping HNSW warm-up")
+        return 0
+
+    sample = collection.get(limit=1, include=["embeddings"])
+    embeddings = sample.get("embeddings")
+    if embeddings is None or len(embeddings) == 0:
+        return count
+
+    collection.query(query_embeddings=[list(embeddings[0])], n_results=1, include=[])
+    return count
+
+
+# -------------------- App-Lifetime Resources --------------------
+class ChromaResources:
+    """
+    Holds the single ChromaDB client and collection, the BM25 lexical index and
+    product catalog snapshot when they have been built, and the metadata filter
+    index (loaded from its snapshot, or else built from the collection), for
+    the lifetime of the app.
+    With VECTOR_BACKEND=flat, `collection` answers queries from the memory-mapped
+    flat index instead of HNSW (falling back to HNSW if none has been built).
+    `load()` opens and warms the indexes; handlers read them once `ready` is set.
+    `version` names the published snapshot the paths point into, if any.
+    Requests pin the snapshot they use with acquire()/release(); a snapshot
+    that has been swapped out is retire()d and only closed once unpinned.
+    """
+
+    def __init__(self, embedding_fn, path: str = CHROMA_PATH, name: str = COLLECTION_NAME,
+                 lexical_path: str = LEXICAL_INDEX_PATH, catalog_path: str = CATALOG_SNAPSHOT_PATH,
+                 vector_backend: str = VECTOR_BACKEND, flat_index_path: str = FLAT_INDEX_PATH,
+                 filter_path: str = FILTER_INDEX_PATH, version: str | None = None):
+        self.embedding_fn = embedding_fn
+        self.version = version
+        self.path = path
+        self.name = name
+        self.lexical_path = lexical_path
+        self.catalog_path = catalog_path
+        self.vector_backend = vector_backend
+        self.flat_index_path = flat_index_path
+        self.filter_path = filter_path
+        self.client = None
+        self.collection = None
+        self.lexical = None
+        self.filters = None
+        self.catalog = None
+        self.item_count = 0
+        self.error = None
+        self.timings = {}
+        self._ready = threading.Event()
+        self._users = 0
+        self._retired = False
+        self._users_lock = threading.Lock()
+
+    @classmethod
+    def for_version(cls, embedding_fn, version: IndexVersion, **kwargs) -> "ChromaResources":
+        return cls(embedding_fn, path=version.chroma_path, lexical_path=version.lexical_path,
+                   catalog_path=version.catalog_path, flat_index_path=version.flat_index_path,
+                   filter_path=version.filter_path, version=version.name, **kwargs)
+
+    @classmethod
+    def published(cls, embedding_fn, root: str = INDEX_ROOT, **kwargs) -> "ChromaResources":
+        """The version INDEX_ROOT/CURRENT points at, or the unversioned paths if nothing is published"""
+        version = current_version(root)
+        if version is None:
+            return cls(embedding_fn, **kwargs)
+        return cls.for_version(embedding_fn, version, **kwargs)
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def load(self):
+        try:
+            logger.info("Initializing ChromaDB client...")
+            start = time.perf_counter()
+            self.client, self.collection = open_collection(self.embedding_fn, self.path, self.name)
+            opened = time.perf_counter()
+            flat = self.load_flat_index() if self.vector_backend == "flat" else None
+            if flat is not None:
+                # The HNSW segment is never queried, so it is not worth loading
+                self.item_count = self.collection.count()
+                self.collection = FlatCollection(self.collection, flat)
+            else:
+                self.vector_backend = "chroma"
+                self.item_count = warm_collection(self.collection)
+            warmed = time.perf_counter()
+            self.lexical = LexicalIndex.load(self.lexical_path)
+            lexical_loaded = time.perf_counter()
+            self.filters = self.load_filter_index()
+            filters_built = time.perf_counter()
+            self.catalog = ProductCatalog.load(self.catalog_path)
+            catalog_loaded = time.perf_counter()
+
+            self.timings = {
+                "open_ms": round((opened - start) * 1000, 2),
+                "warm_ms": round((warmed - opened) * 1000, 2),
+                "lexical_ms": round((lexical_loaded - warmed) * 1000, 2),
+                "filters_ms": round((filters_built - lexical_loaded) * 1000, 2),
+                "catalog_ms": round((catalog_loaded - filters_built) * 1000, 2),
+            }
+            self._ready.set()
+            logger.info(
+                f"ChromaDB ready: {self.item_count} items "
+                f"(open {self.timings['open_ms']}ms, warm {self.timings['warm_ms']}ms)"
+            )
+        except Exception as e:
+            self.error = str(e)
+            logger.exception("Failed to initialize ChromaDB")
+
+    def load_filter_index(self):
+        filters = CatalogFilterIndex.load(self.filter_path)
+        if filters is not None and filters.size == self.item_count:
+            return filters
+        if filters is not None:
+            logger.warning(f"Filter index at {self.filter_path} holds {filters.size} products but the collection "
+                           f"has {self.item_count}; rebuilding it from the collection")
+        return CatalogFilterIndex.from_collection(getattr(self.collection, "collection", self.collection))
+
+    def load_flat_index(self):
+        flat = FlatVectorIndex.load(self.flat_index_path)
+        if flat is None:
+            logger.warning("VECTOR_BACKEND=flat but no flat index was found, using HNSW")
+            return None
+        expected = getattr(self.embedding_fn, "signature", None) or {}
+        conflicts = [key for key in SIGNATURE_KEYS if key in flat.signature and key in expected
+                     and flat.signature[key] != expected[key]]
+        if conflicts:
+            raise EmbeddingBackendMismatch(
+                f"Flat index at {self.flat_index_path} was built from {flat.signature}, "
+                f"but this process embeds with {expected}; rebuild it with db_store.py"
+            )
+        count = self.collection.count()
+        if flat.size != count:
+            logger.warning(f"Flat index holds {flat.size} vectors but the collection has {count}; "
+                           f"re-run db_store.py to refresh it")
+        return flat
+
+    def acquire(self) -> bool:
+        """Pin the snapshot for one user; False if it has already been retired"""
+        with self._users_lock:
+            if self._retired:
+                return False
+            self._users += 1
+            return True
+
+    def release(self):
+        """Unpin; the last user of a retired snapshot closes it"""
+        with self._users_lock:
+            self._users -= 1
+            idle = self._retired and self._users == 0
+        if idle:
+            self.close()
+
+    def retire(self):
+        """Close as soon as no request, batch item or job has the snapshot pinned"""
+        with self._users_lock:
+            self._retired = True
+            idle = self._users == 0
+        if idle:
+            self.close()
+        else:
+            logger.info(f"Index version {self.version} retired, closing after {self._users} pinned users finish")
+
+    def close(self):
+        """
+        Drop the snapshot's client, collection and indexes. chromadb has no public
+        per-client close, so the client's system stays in chromadb's per-path cache
+        (and is reused if the version is loaded again); the memory-mapped indexes
+        are freed with their last reference.
+        """
+        self.client = self.collection = self.lexical = self.filters = self.catalog = None
+        self._ready.clear()
+
+    def status(self) -> dict:
+        return {
+            "ready": self.ready,
+            "version": self.version,
+            "pinned": self._users,
+            "collection": self.name,
+            "vector_backend": self.vector_backend,
+            "items": self.item_count,
+            "lexical_documents": self.lexical.size if self.lexical is not None else 0,
+            "filter_products": self.filters.size if self.filters is not None else 0,
+            "catalog_products": self.catalog.size if self.catalog is not None else 0,
+            "timings": self.timings,
+            "error": self.error,
+        }
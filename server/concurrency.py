@@ -0,0 +1,69 @@
+import os
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+# Maximum in-flight blocking calls per downstream dependency
+DEPENDENCY_LIMITS = {
+    "gemini": int(os.getenv("GEMINI_CONCURRENCY", "16")),
+    "ocr": int(os.getenv("OCR_CONCURRENCY", "4")),
+    "chroma": int(os.getenv("CHROMA_CONCURRENCY", "8")),
+}
+
+_executor = None
+_semaphores = {}
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        # Sized so every dependency can use its full limit at the same time
+        _executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("BLOCKING_POOL_SIZE", str(sum(DEPENDENCY_LIMITS.values())))),
+            thread_name_prefix="blocking",
+        )
+    return _executor
+
+
+def _semaphore(dependency: str) -> asyncio.Semaphore:
+    # Semaphores are bound to the running loop, so keep one set per loop
+    loop = asyncio.get_running_loop()
+    key = (id(loop), dependency)
+    if key not in _semaphores:
+        _semaphores[key] = asyncio.Semaphore(DEPENDENCY_LIMITS[dependency])
+    return _semaphores[key]
+
+
+async def run_blocking(dependency: str, fn, *args, **kwargs):
+    """
+    Run a synchronous SDK call (Gemini, ChromaDB, ...) on the shared thread pool
+    without blocking the event loop, under the dependency's concurrency limit
+    """
+    async with _semaphore(dependency):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_executor(), functools.partial(fn, *args, **kwargs))
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def stream_blocking(dependency: str, fn, *args, **kwargs):
+    """
+    Iterate a blocking iterator (e.g. a streamed Gemini response) from async code.
+    `fn(*args, **kwargs)` and every `next()` run on the shared pool; the dependency
+    slot is held until the stream is exhausted.
+    """
+    async with _semaphore(dependency):
+        loop = asyncio.get_running_loop()
+        executor = _get_executor()
+        iterator = await loop.run_in_executor(executor, lambda: iter(fn(*args, **kwargs)))
+        done = object()
+        while True:
+            item = await loop.run_in_executor(executor, next, iterator, done)
+            if item is done:
+                return
+            yield item
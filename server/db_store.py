@@ -143,12 +143,25 @@
 #     main()
 
 import json
-import chromadb
-from chromadb.utils.embedding_functions import EmbeddingFunction
 import os
-from dotenv import load_dotenv
+import time
+import hashlib
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import chromadb
+from chromadb.config import Settings
+from dotenv import load_dotenv
 import google.generativeai as genai
+from embedding import EMBEDDING_BACKEND, create_embedding_function
+from chroma_store import (CHROMA_PATH, COLLECTION_NAME, ChromaResources, EmbeddingBackendMismatch,
+                          check_embedding_backend)
+from index_versions import IndexVersion, current_version, publish, prune
+from catalog_loader import iter_products, batched
+from lexical_index import LexicalIndexBuilder, LEXICAL_INDEX_PATH
+from product_catalog import CatalogSnapshotWriter, CATALOG_SNAPSHOT_PATH
+from query_constraints import CatalogFilterIndex, FILTER_INDEX_PATH
+from vector_index import build_flat_index, FLAT_INDEX_PATH, FLAT_INDEX_DTYPE, VECTOR_BACKEND
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -157,27 +170,18 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
-    logger.error("Error: GEMINI_API_KEY environment variable not set.")
-    exit(1)
-genai.configure(api_key=GEMINI_API_KEY)
-
-# Load products from Fashion_Dataset.json
-try:
-    with open('Fashion_Dataset.json', 'r', encoding='utf-8') as f:
-        data = json.load(f)
-        if isinstance(data, dict):
-            products = data.get("Sheet1", [])
-            logger.info("Loaded products from key 'Sheet1'.")
-        elif isinstance(data, list):
-            products = data
-            logger.info("Loaded products as a list.")
-        else:
-            logger.error("Unexpected JSON format.")
-            exit(1)
-except Exception as e:
-    logger.error(f"Error loading JSON: {e}")
-    exit(1)
+
+# Ingestion tuning
+BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "100"))
+WORKERS = int(os.getenv("INGEST_WORKERS", "4"))
+MAX_REQUESTS_PER_MINUTE = float(os.getenv("INGEST_MAX_RPM", "120"))
+MAX_RETRIES = int(os.getenv("INGEST_MAX_RETRIES", "5"))
+
+# Catalog export to ingest: .json (list or {"Sheet1": [...]}), .jsonl or .csv
+CATALOG_PATH = os.getenv("CATALOG_PATH", "Fashion_Dataset.json")
+# Build into a fresh snapshot under INDEX_ROOT and publish it once validated,
+# instead of syncing the collection the servers are reading in place
+INDEX_VERSIONED = os.getenv("INDEX_VERSIONED", "false").lower() == "true"
 
 # Format each product into searchable doc
 def format_product(product):
@@ -212,102 +216,347 @@ def sanitize_metadata(data, parent_key='', sep='_'):
             sanitized[key] = v
     return sanitized
 
-# Define Gemini embedding function
-# Define Gemini embedding function
-class GeminiEmbeddingFunction(EmbeddingFunction):
-    def __init__(self, model_name="models/embedding-001", task_type="RETRIEVAL_DOCUMENT"):
-        self.model = model_name
-        self.task_type = task_type
+# Hash of everything written for a product, used to skip unchanged items
+def content_hash(doc, metadata):
+    payload = json.dumps([doc, metadata], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
 
-    def __call__(self, input_texts):
-        try:
-            # Handle single string input
-            if isinstance(input_texts, str):
-                input_texts = [input_texts]
-                
-            resp = genai.embed_content(
-                model=self.model,
-                content=input_texts,
-                task_type=self.task_type
-            )
-            # The response contains 'embedding' (singular) not 'embeddings'
-            if isinstance(input_texts, list):
-                return [embedding for embedding in resp['embedding']]
-            return resp['embedding']
-        except Exception as e:
-            logger.error(f"Gemini embedding error: {e}")
-            raise
-
-# Initialize embedding function
-embedding_func = GeminiEmbeddingFunction(
-    model_name=os.getenv("GEMINI_MODEL_NAME", "models/embedding-001"),
-    task_type="RETRIEVAL_DOCUMENT"
-)
-
-# Initialize local ChromaDB client
-try:
-    client = chromadb.PersistentClient(path="./chroma_db")
-    logger.info("Initialized local ChromaDB client.")
-except Exception as e:
-    logger.error(f"Failed to initialize local ChromaDB: {e}")
-    exit(1)
-
-# Create or recreate collection
-collection_name = "Clothes_products"
-try:
-    existing = client.list_collections()
-    if any(col.name == collection_name for col in existing):
-        client.delete_collection(collection_name)
-        logger.info(f"Deleted existing collection: {collection_name}")
-    # Create collection WITHOUT embedding function
-    collection = client.create_collection(collection_name)
-    logger.info(f"Created new collection: {collection_name}")
-except Exception as e:
-    logger.error(f"Collection setup error: {e}")
-    exit(1)
-
-# Add products in batches with manual embeddings
-batch_size = 100
-documents, metadatas, ids = [], [], []
-try:
-    for i, product in enumerate(products):
-        seq_id = i + 1
+def product_key(fields):
+    """
+    What identifies a product across catalog exports: name, brand and image.
+    Works on raw products and on their stored (sanitized) metadata alike.
+    """
+    name = fields.get("name") or fields.get("Title") or ""
+    image = fields.get("image") or fields.get("image_url") or ""
+    payload = json.dumps([str(name), str(fields.get("brand") or ""), str(image)])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+class ProductIdMap:
+    """
+    Assigns record IDs that survive catalog edits: a product keeps the ID it is
+    stored under for as long as its product_key is unchanged, so inserting or
+    removing a product does not renumber (and re-embed) everything after it.
+    New products get the next unused number, keeping IDs short integers for the
+    'Product ID: 123' answer format. Repeated products take stored IDs in order.
+    """
+
+    def __init__(self, stored_keys=None):
+        self._free = {}
+        stored_keys = stored_keys or {}
+        for pid in sorted(stored_keys, key=lambda pid: (not pid.isdigit(), int(pid) if pid.isdigit() else 0, pid)):
+            self._free.setdefault(stored_keys[pid], []).append(pid)
+        self._next = max((int(pid) for pid in stored_keys if pid.isdigit()), default=0) + 1
+
+    def assign(self, key):
+        ids = self._free.get(key)
+        if ids:
+            return ids.pop(0)
+        pid = str(self._next)
+        self._next += 1
+        return pid
+
+def build_records(products, ids=None):
+    """
+    Yield (id, document, metadata) for each product. IDs come from `ids`
+    (a ProductIdMap); a fresh map numbers an empty collection 1, 2, 3, ...
+    """
+    ids = ids or ProductIdMap()
+    for product in products:
+        pid = ids.assign(product_key(product))
         doc = format_product(product)
         sanitized = sanitize_metadata(product)
-        sanitized["seq_id"] = seq_id
-        # Store document in metadata for retrieval
-        sanitized["document"] = doc
-        
-        documents.append(doc)
-        metadatas.append(sanitized)
-        ids.append(str(seq_id))
-
-        if len(documents) >= batch_size:
-            # Manually compute embeddings
-            embeddings_list = embedding_func(documents)
-            collection.add(
-                ids=ids,
-                embeddings=embeddings_list,
-                metadatas=metadatas
-            )
-            logger.info(f"Added batch of {len(documents)} products.")
-            documents, metadatas, ids = [], [], []
-
-    if documents:
-        embeddings_list = embedding_func(documents)
-        collection.add(
-            ids=ids,
+        sanitized["seq_id"] = int(pid) if pid.isdigit() else pid
+        sanitized["content_hash"] = content_hash(doc, sanitized)
+        yield pid, doc, sanitized
+
+# -------------------- Rate Limiting --------------------
+class RateLimiter:
+    """Spaces calls evenly so all workers together stay under the per-minute quota"""
+
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+def embed_with_retry(embedding_func, limiter, documents):
+    for attempt in range(1, MAX_RETRIES + 1):
+        limiter.wait()
+        try:
+            return embedding_func(documents)
+        except Exception as e:
+            if attempt == MAX_RETRIES:
+                raise
+            delay = min(60, 2 ** attempt)
+            logger.warning(f"Embedding batch failed (attempt {attempt}/{MAX_RETRIES}), retrying in {delay}s: {e}")
+            time.sleep(delay)
+
+# -------------------- Incremental Sync --------------------
+def existing_records(collection, page_size=5000):
+    """
+    (id -> content_hash, id -> product_key) for everything already in the collection
+    """
+    hashes, keys = {}, {}
+    offset = 0
+    while True:
+        page = collection.get(include=["metadatas"], limit=page_size, offset=offset)
+        for pid, meta in zip(page["ids"], page["metadatas"]):
+            hashes[pid] = (meta or {}).get("content_hash", "")
+            keys[pid] = product_key(meta or {})
+        if len(page["ids"]) < page_size:
+            return hashes, keys
+        offset += page_size
+
+def sync_catalog(collection, products, embedding_func, lexical_builder=None, snapshot_writer=None):
+    """
+    Upsert new and changed products, then delete products no longer in the catalog.
+
+    `products` may be any iterable and is consumed as a stream: records are formatted,
+    filtered and batched lazily, and at most WORKERS * 2 batches are in flight, so
+    memory does not grow with catalog size beyond the stored hash and ID maps.
+
+    Each batch is written together with its content hashes, so the collection itself
+    is the checkpoint: an interrupted run leaves every finished batch in place and the
+    next run only embeds what is still missing or stale. The index is never emptied.
+
+    Products keep their stored IDs (see ProductIdMap), so an insertion or deletion
+    only touches the products involved.
+
+    Every product, changed or not, is also fed to `lexical_builder` and
+    `snapshot_writer` when given.
+    """
+    stored, stored_keys = existing_records(collection)
+    ids = ProductIdMap(stored_keys)
+    del stored_keys
+    logger.info(f"Collection holds {len(stored)} products.")
+
+    stats = {"upserted": 0, "unchanged": 0, "deleted": 0, "failed": 0}
+    total = 0
+    start = time.time()
+
+    def changed_records():
+        nonlocal total
+        for pid, doc, metadata in build_records(products, ids):
+            total += 1
+            if lexical_builder is not None:
+                lexical_builder.add(pid, doc)
+            if snapshot_writer is not None:
+                snapshot_writer.add(pid, metadata)
+            if stored.pop(pid, None) == metadata["content_hash"]:
+                stats["unchanged"] += 1
+            else:
+                yield pid, doc, metadata
+
+    def write(future, batch):
+        try:
+            embeddings_list = future.result()
+        except Exception as e:
+            stats["failed"] += len(batch)
+            logger.error(f"Giving up on batch {batch[0][0]}-{batch[-1][0]}: {e}")
+            return
+        # Writes stay on this thread; ChromaDB serialises them anyway.
+        # Upsert merges metadata, so the legacy "document" copy is cleared explicitly.
+        collection.upsert(
+            ids=[pid for pid, _, _ in batch],
             embeddings=embeddings_list,
-            metadatas=metadatas
+            metadatas=[{**metadata, "document": None} for _, _, metadata in batch]
         )
-        logger.info(f"Added final batch of {len(documents)} products.")
-    logger.info("All products successfully added!")
-except Exception as e:
-    logger.exception(f"Error adding products: {e}")  # Detailed traceback
-    exit(1)
-
-# List all collections
-cols = client.list_collections()
-logger.info("Available collections:")
-for col in cols:
-    logger.info(col.name)
\ No newline at end of file
+        stats["upserted"] += len(batch)
+        logger.info(f"Upserted {stats['upserted']} products ({time.time() - start:.1f}s).")
+
+    # Local models have no request quota
+    limiter = RateLimiter(MAX_REQUESTS_PER_MINUTE if EMBEDDING_BACKEND == "gemini" else 0)
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        in_flight = {}
+        for batch in batched(changed_records(), BATCH_SIZE):
+            if len(in_flight) >= WORKERS * 2:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    write(future, in_flight.pop(future))
+            future = pool.submit(embed_with_retry, embedding_func, limiter, [doc for _, doc, _ in batch])
+            in_flight[future] = batch
+        for future in list(in_flight):
+            write(future, in_flight.pop(future))
+
+    # Whatever is left in `stored` was not seen in the catalog
+    removed = list(stored)
+    logger.info(f"{total} products read: {stats['unchanged']} unchanged, {len(removed)} removed.")
+
+    # Only prune once additions are in, so a failed run never shrinks the index first
+    if removed and not stats["failed"]:
+        for i in range(0, len(removed), 5000):
+            collection.delete(ids=removed[i:i + 5000])
+        stats["deleted"] = len(removed)
+        logger.info(f"Deleted {len(removed)} removed products.")
+
+    return stats
+
+# -------------------- Versioned Builds --------------------
+class IndexValidationError(RuntimeError):
+    """A freshly built snapshot failed its checks and must not be published"""
+
+def open_source_collection():
+    """
+    The collection a new snapshot starts from: the published version, or the
+    unversioned CHROMA_PATH collection on the first versioned build.
+    Returns (collection, description) or (None, None).
+    """
+    published = current_version()
+    path = published.chroma_path if published else CHROMA_PATH
+    if not os.path.isdir(path):
+        return None, None
+    client = chromadb.PersistentClient(path=path, settings=Settings(anonymized_telemetry=False))
+    if not any(col.name == COLLECTION_NAME for col in client.list_collections()):
+        return None, None
+    return client.get_collection(COLLECTION_NAME), published.name if published else path
+
+def seed_collection(source, target, page_size=1000):
+    """
+    Copy stored vectors and metadata (with their content hashes) from `source`,
+    so sync_catalog only embeds products that changed since that build
+    """
+    copied = 0
+    while True:
+        page = source.get(include=["embeddings", "metadatas"], limit=page_size, offset=copied)
+        if not page["ids"]:
+            return copied
+        target.add(ids=page["ids"], embeddings=page["embeddings"], metadatas=page["metadatas"])
+        copied += len(page["ids"])
+
+def create_version_collection(version):
+    """Empty collection in the new snapshot, seeded from the current one"""
+    source, source_name = open_source_collection()
+    client = chromadb.PersistentClient(path=version.chroma_path, settings=Settings(anonymized_telemetry=False))
+    collection = client.create_collection(COLLECTION_NAME, metadata=(source.metadata if source else None) or None)
+    if source is not None:
+        start = time.time()
+        copied = seed_collection(source, collection)
+        logger.info(f"Seeded {copied} products from {source_name} ({time.time() - start:.1f}s).")
+    return client, collection, source_name
+
+def validate_build(version, embedding_func, expected):
+    """
+    Open the snapshot the way the API server does and check it is complete:
+    every product is present in each index and a stored vector finds itself.
+    Raises IndexValidationError.
+    """
+    resources = ChromaResources.for_version(embedding_func, version)
+    resources.load()
+    try:
+        if not resources.ready:
+            raise IndexValidationError(f"Snapshot does not load: {resources.error}")
+        if expected == 0:
+            raise IndexValidationError("Refusing to publish an empty index")
+        counts = {
+            "vectors": resources.item_count,
+            "lexical documents": resources.lexical.size if resources.lexical is not None else 0,
+            "filter products": resources.filters.size if resources.filters is not None else 0,
+            "catalog products": resources.catalog.size if resources.catalog is not None else 0,
+        }
+        wrong = {name: count for name, count in counts.items() if count != expected}
+        if wrong:
+            raise IndexValidationError(f"Expected {expected} products but found {wrong}")
+        collection = getattr(resources.collection, "collection", resources.collection)
+        probe = collection.get(limit=1, include=["embeddings"])
+        vector = list(probe["embeddings"][0])
+        top = resources.collection.query(query_embeddings=[vector], n_results=1, include=[])["ids"][0]
+        if top != probe["ids"]:
+            # Catalogs repeat products, so an identical vector under another ID also passes
+            match = collection.get(ids=top, include=["embeddings"])["embeddings"]
+            if not len(match) or max(abs(a - b) for a, b in zip(match[0], vector)) > 1e-5:
+                raise IndexValidationError(f"Smoke query for product {probe['ids'][0]} returned {top}")
+    finally:
+        resources.close()
+
+def main():
+    if EMBEDDING_BACKEND == "gemini":
+        if not GEMINI_API_KEY:
+            logger.error("Error: GEMINI_API_KEY environment variable not set.")
+            exit(1)
+        genai.configure(api_key=GEMINI_API_KEY)
+
+    # Initialize embedding function (EMBEDDING_BACKEND selects Gemini or a local ONNX model)
+    embedding_func = create_embedding_function(
+        model=os.getenv("GEMINI_MODEL_NAME", "models/embedding-001"),
+        task_type="RETRIEVAL_DOCUMENT"
+    )
+
+    # Initialize local ChromaDB client
+    version = source_name = None
+    try:
+        if INDEX_VERSIONED:
+            version = IndexVersion.create()
+            logger.info(f"Building index version {version.name}")
+            client, collection, source_name = create_version_collection(version)
+        else:
+            client = chromadb.PersistentClient(path=CHROMA_PATH, settings=Settings(anonymized_telemetry=False))
+            collection = client.get_or_create_collection(COLLECTION_NAME)
+        logger.info(f"Using collection: {COLLECTION_NAME}")
+        # The API server refuses to query a collection embedded by another backend
+        check_embedding_backend(collection, embedding_func, record=True)
+    except EmbeddingBackendMismatch as e:
+        logger.error(str(e))
+        exit(1)
+    except Exception as e:
+        logger.error(f"Collection setup error: {e}")
+        exit(1)
+
+    lexical_builder = LexicalIndexBuilder()
+    snapshot_writer = CatalogSnapshotWriter(version.catalog_path if version else CATALOG_SNAPSHOT_PATH)
+    try:
+        result = sync_catalog(collection, iter_products(CATALOG_PATH), embedding_func,
+                              lexical_builder, snapshot_writer)
+    except (OSError, ValueError) as e:
+        logger.error(f"Error loading catalog {CATALOG_PATH}: {e}")
+        exit(1)
+    logger.info(f"Sync finished: {result}")
+    if result["failed"]:
+        logger.error(f"{result['failed']} products failed to embed; re-run to resume.")
+        exit(1)
+
+    # BM25 index over the same documents, loaded memory-mapped by the API server
+    lexical_builder.save(version.lexical_path if version else LEXICAL_INDEX_PATH)
+    # Product cards for response hydration, also memory-mapped by the API server
+    snapshot_writer.save()
+    # Price / colour / category / brand indexes, so the server need not scan every product's metadata at startup
+    CatalogFilterIndex.from_collection(collection).save(version.filter_path if version else FILTER_INDEX_PATH)
+    if VECTOR_BACKEND == "flat":
+        # Exact-search matrix exported from the collection, replacing HNSW queries in the server
+        build_flat_index(collection, version.flat_index_path if version else FLAT_INDEX_PATH,
+                         FLAT_INDEX_DTYPE, signature=embedding_func.signature)
+
+    if version is not None:
+        products = result["upserted"] + result["unchanged"]
+        try:
+            validate_build(version, embedding_func, products)
+        except IndexValidationError as e:
+            logger.error(f"Version {version.name} failed validation and was not published: {e}")
+            exit(1)
+        version.write_manifest({
+            "created": time.time(),
+            "products": products,
+            "seeded_from": source_name,
+            "signature": embedding_func.signature,
+            "vector_backend": VECTOR_BACKEND,
+            "sync": result,
+        })
+        # Servers polling INDEX_ROOT swap the new version in from here
+        publish(version.name)
+        prune()
+        return
+
+    # List all collections
+    cols = client.list_collections()
+    logger.info("Available collections:")
+    for col in cols:
+        logger.info(col.name)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+import os
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+from typing import List
+from providers import GeminiProvider, get_provider
+
+logger = logging.getLogger(__name__)
+
+# Gemini accepts at most 100 texts per embed_content call
+GEMINI_MAX_BATCH = 100
+
+# "gemini" embeds through the provider API; "onnx" runs a local model (see local_embedding.py).
+# Queries must be embedded like the collection was, which chroma_store checks at startup.
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "gemini").lower()
+
+
+class EmbeddingError(RuntimeError):
+    """
+    Raised when texts could not be embedded; never replaced by placeholder vectors.
+    `code` is the upstream error's status, so the retry policy still sees 429s and 5xxs.
+    """
+
+    def __init__(self, message: str, code=None):
+        super().__init__(message)
+        self.code = code
+
+
+def _as_text_list(input) -> List[str]:
+    if input is None:
+        raise ValueError("'input' must be provided")
+    if isinstance(input, str):
+        return [input]
+    return list(input)
+
+
+# -------------------- Custom Gemini Embedder --------------------
+class GeminiEmbeddingFunction:
+    """
+    Embeds a list of texts with one embed_content call per chunk of up to 100 texts.
+    Calls go through `provider`, or the process-wide one from providers.get_provider().
+    """
+
+    def __init__(self, model="models/embedding-001", api_key=None,
+                 task_type="retrieval_document", max_batch_size=GEMINI_MAX_BATCH, provider=None):
+        self.model = model
+        self.api_key = api_key
+        self.task_type = task_type
+        self.max_batch_size = min(max_batch_size, GEMINI_MAX_BATCH)
+        self.provider = provider or (GeminiProvider(api_key) if api_key else None)
+        self.signature = {"embedding_backend": "gemini", "embedding_model": model}
+        self.__name__ = "gemini-embedding"
+        self.name = lambda: "gemini-embedding"
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        empty = [i for i, text in enumerate(texts) if not text or not text.strip()]
+        if empty:
+            raise EmbeddingError(f"Cannot embed empty text at positions {empty}")
+
+        provider = self.provider or get_provider()
+        embeddings = []
+        for start in range(0, len(texts), self.max_batch_size):
+            chunk = texts[start:start + self.max_batch_size]
+            try:
+                vectors = provider.embed(chunk, model=self.model, task_type=self.task_type)
+            except (TimeoutError, ConnectionError):
+                raise
+            except Exception as e:
+                raise EmbeddingError(f"Gemini embedding failed for {len(chunk)} texts: {e}",
+                                     code=getattr(e, "code", None)) from e
+
+            if len(vectors) != len(chunk):
+                raise EmbeddingError(f"Gemini returned {len(vectors)} embeddings for {len(chunk)} texts")
+            embeddings.extend(vectors)
+        return embeddings
+
+    def __call__(self, input):
+        return self.embed_batch(_as_text_list(input))
+
+
+def create_embedding_function(model="models/embedding-001", task_type="retrieval_document"):
+    """
+    The embedder for EMBEDDING_BACKEND; `model` and `task_type` apply to Gemini only,
+    the ONNX model is configured by the ONNX_* environment variables
+    """
+    if EMBEDDING_BACKEND == "onnx":
+        from local_embedding import OnnxEmbeddingFunction
+        return OnnxEmbeddingFunction()
+    if EMBEDDING_BACKEND != "gemini":
+        raise ValueError(f"Unknown EMBEDDING_BACKEND '{EMBEDDING_BACKEND}', expected 'gemini' or 'onnx'")
+    return GeminiEmbeddingFunction(model=model, task_type=task_type)
+
+
+# -------------------- Cross-Request Micro-Batching --------------------
+class _PendingEmbed:
+    __slots__ = ("texts", "future")
+
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.future = Future()
+
+
+class MicroBatchingEmbedder:
+    """
+    Coalesces embedding calls from concurrent requests into shared batches.
+
+    Callers block until their vectors are ready. A background thread collects
+    pending calls until `max_batch_size` texts are queued or `max_wait_ms` has
+    passed since the first one arrived, then embeds them with a single call.
+    If a merged batch fails, each caller's texts are retried on their own so one
+    bad input only fails its own request.
+    """
+
+    def __init__(self, embedder, max_batch_size: int = 32, max_wait_ms: float = 10.0):
+        self.embedder = embedder
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.signature = getattr(embedder, "signature", None)
+        self.__name__ = getattr(embedder, "__name__", "micro-batching-embedder")
+        self.name = lambda: self.__name__
+        self.stats = {"calls": 0, "batches": 0, "texts": 0, "failed_calls": 0}
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+
+    def __call__(self, input):
+        texts = _as_text_list(input)
+        if not texts:
+            return []
+        pending = _PendingEmbed(texts)
+        self._ensure_worker()
+        self._queue.put(pending)
+        return pending.future.result()
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="embed-batcher", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            size = len(first.texts)
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)
+                    break
+                batch.append(item)
+                size += len(item.texts)
+            self._flush(batch)
+
+    def _flush(self, batch: List[_PendingEmbed]):
+        texts = [text for item in batch for text in item.texts]
+        self.stats["calls"] += len(batch)
+        self.stats["batches"] += 1
+        self.stats["texts"] += len(texts)
+        try:
+            vectors = self.embedder.embed_batch(texts)
+        except Exception as e:
+            if len(batch) == 1:
+                self._fail(batch[0], e)
+                return
+            logger.warning(f"Merged embedding batch of {len(batch)} calls failed, retrying individually: {e}")
+            for item in batch:
+                try:
+                    item.future.set_result(self.embedder.embed_batch(item.texts))
+                except Exception as item_error:
+                    self._fail(item, item_error)
+            return
+
+        offset = 0
+        for item in batch:
+            item.future.set_result(vectors[offset:offset + len(item.texts)])
+            offset += len(item.texts)
+
+    def _fail(self, item: _PendingEmbed, error: Exception):
+        self.stats["failed_calls"] += 1
+        logger.error(f"Embedding failed for {len(item.texts)} texts: {error}")
+        if not isinstance(error, (EmbeddingError, TimeoutError, ConnectionError)):
+            error = EmbeddingError(str(error), code=getattr(error, "code", None))
+        item.future.set_exception(error)
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        return self(texts)
+
+    def close(self):
+        if self._worker is not None:
+            self._queue.put(None)
+            self._worker.join(timeout=5)
+            self._worker = None
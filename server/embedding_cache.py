@@ -0,0 +1,173 @@
+import re
+import time
+import sqlite3
+import logging
+import threading
+from array import array
+from collections import OrderedDict
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """Cache key normalisation: case-folded with whitespace collapsed"""
+    return re.sub(r"\s+", " ", text).strip().casefold()
+
+
+# -------------------- Two-Tier Cache --------------------
+class EmbeddingCache:
+    """
+    Normalised-text -> vector cache with an in-memory LRU tier and an optional
+    SQLite tier that survives restarts. Both tiers are bounded by entry count
+    and by TTL; disk hits are promoted into memory.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 86400,
+                 db_path: Optional[str] = None, max_disk_entries: int = 100000, namespace: str = ""):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.max_disk_entries = max_disk_entries
+        self.namespace = namespace
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, vector BLOB NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_accessed ON embeddings(accessed)")
+            self._db.commit()
+            self._purge_disk()
+
+    def _key(self, text: str) -> str:
+        return f"{self.namespace}:{normalize_text(text)}"
+
+    def get(self, text: str) -> Optional[List[float]]:
+        key = self._key(text)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                vector, created = entry
+                if now - created <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    return vector
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT vector, created FROM embeddings WHERE key = ? AND created >= ?",
+                    (key, now - self.ttl),
+                ).fetchone()
+                if row is not None:
+                    self._db.execute("UPDATE embeddings SET accessed = ? WHERE key = ?", (now, key))
+                    self._db.commit()
+                    vector = array("f", row[0]).tolist()
+                    self._put_memory(key, vector, row[1])
+                    self.stats["disk_hits"] += 1
+                    return vector
+
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, text: str, vector: List[float]):
+        key = self._key(text)
+        now = time.time()
+        with self._lock:
+            self._put_memory(key, vector, now)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO embeddings (key, vector, created, accessed) VALUES (?, ?, ?, ?)",
+                    (key, array("f", vector).tobytes(), now, now),
+                )
+                self._db.commit()
+                self._trim_disk()
+
+    def _put_memory(self, key: str, vector: List[float], created: float):
+        self._memory[key] = (vector, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def _trim_disk(self):
+        excess = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0] - self.max_disk_entries
+        if excess > 0:
+            self._db.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY accessed LIMIT ?)",
+                (excess,),
+            )
+            self._db.commit()
+            self.stats["evictions"] += excess
+
+    def _purge_disk(self):
+        with self._lock:
+            cur = self._db.execute("DELETE FROM embeddings WHERE created < ?", (time.time() - self.ttl,))
+            self._db.commit()
+            if cur.rowcount:
+                logger.info(f"Purged {cur.rowcount} expired embeddings from disk cache")
+
+    def info(self) -> dict:
+        lookups = self.stats["memory_hits"] + self.stats["disk_hits"] + self.stats["misses"]
+        hits = lookups - self.stats["misses"]
+        return {
+            **self.stats,
+            "memory_entries": len(self._memory),
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "persistent": self._db is not None,
+        }
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+# -------------------- Cached Embedder --------------------
+class CachedEmbeddingFunction:
+    """
+    Embedding function that answers from the cache and forwards only misses,
+    as a single batch, to the wrapped embedder
+    """
+
+    def __init__(self, embedder, cache: EmbeddingCache):
+        self.embedder = embedder
+        self.cache = cache
+        self.signature = getattr(embedder, "signature", None)
+        self.__name__ = getattr(embedder, "__name__", "cached-embedding")
+        self.name = lambda: self.__name__
+
+    def __call__(self, input):
+        texts = [input] if isinstance(input, str) else list(input)
+        vectors = [self.cache.get(text) for text in texts]
+
+        # Identical texts within one call are embedded once
+        missing = {}
+        for i, vector in enumerate(vectors):
+            if vector is None:
+                missing.setdefault(normalize_text(texts[i]), []).append(i)
+
+        if missing:
+            positions = list(missing.values())
+            fresh = self.embedder.embed_batch([texts[p[0]] for p in positions])
+            for indexes, vector in zip(positions, fresh):
+                self.cache.put(texts[indexes[0]], vector)
+                for i in indexes:
+                    vectors[i] = vector
+        return vectors
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        return self(texts)
+
+    def close(self):
+        close = getattr(self.embedder, "close", None)
+        if close:
+            close()
+        self.cache.close()
@@ -0,0 +1,197 @@
+import re
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+# -------------------- Curated Lexicon --------------------
+# Categories mirror the ones the Gemini keyword prompt asks for
+FASHION_LEXICON = {
+    "garment": [
+        "dress", "gown", "maxi", "midi", "mini dress", "sundress", "blouse", "top", "crop top", "tank top",
+        "tunic", "shirt", "t shirt", "tee", "camisole", "bodysuit", "sweater", "cardigan", "pullover",
+        "hoodie", "sweatshirt", "jacket", "blazer", "coat", "trench coat", "shrug", "kimono", "poncho",
+        "jeans", "jeggings", "trousers", "pants", "palazzo", "culottes", "leggings", "shorts", "skirt",
+        "jumpsuit", "romper", "playsuit", "co ord set", "dungarees", "saree", "sari", "lehenga",
+        "kurti", "kurta", "salwar", "churidar", "anarkali", "dupatta", "sharara", "gharara", "choli",
+        "abaya", "kaftan", "nightdress", "nightgown", "pyjamas", "pajamas", "lingerie", "bra",
+        "swimsuit", "bikini", "waistcoat", "vest", "capris", "joggers", "track pants", "peplum",
+    ],
+    "color": [
+        "black", "white", "red", "blue", "navy", "green", "olive", "yellow", "mustard", "orange",
+        "pink", "peach", "purple", "lavender", "violet", "maroon", "burgundy", "wine", "beige",
+        "brown", "tan", "grey", "gray", "cream", "ivory", "gold", "silver", "teal", "turquoise",
+        "coral", "magenta", "off white", "pastel", "multicolor",
+    ],
+    "fabric": [
+        "cotton", "silk", "linen", "denim", "wool", "chiffon", "georgette", "satin", "velvet",
+        "rayon", "polyester", "lace", "crepe", "organza", "net", "tulle", "jersey", "khadi",
+        "chanderi", "banarasi", "modal", "viscose", "corduroy", "fleece", "knit", "cashmere", "lycra",
+    ],
+    "style": [
+        "casual", "formal", "vintage", "boho", "ethnic", "western", "fusion", "bodycon", "a line",
+        "flared", "fitted", "slim fit", "relaxed fit", "oversized", "high waist", "wrap", "pleated",
+        "ruffle", "off shoulder", "one shoulder", "sleeveless", "full sleeve", "embroidered",
+        "printed", "floral", "striped", "checked", "polka dot", "sequin", "embellished", "solid",
+        "straight fit", "skinny", "bootcut", "wide leg", "v neck", "halter",
+    ],
+    "event": [
+        "wedding", "party", "partywear", "bridal", "cocktail", "evening", "office", "workwear",
+        "festival", "festive", "celebration", "prom", "date night", "vacation", "beach", "brunch",
+    ],
+}
+
+# Accessories the Gemini prompt excludes, and vocabulary of clearly non-clothing text
+ACCESSORY_TERMS = [
+    "bag", "handbag", "purse", "clutch", "wallet", "shoe", "sandal", "heel", "sneaker", "boot",
+    "necklace", "earring", "bracelet", "ring", "jewellery", "jewelry", "watch", "sunglasses",
+]
+NEGATIVE_TERMS = [
+    "invoice", "receipt", "subtotal", "gst", "tax", "order id", "transaction", "upi", "bank",
+    "account", "balance", "otp", "smartphone", "phone", "laptop", "charger", "battery", "usb",
+    "bluetooth", "headphone", "earbuds", "television", "tv", "refrigerator", "processor", "ram",
+    "storage", "gb", "mah", "pizza", "burger", "restaurant", "menu", "calorie", "grocery",
+    "recipe", "flight", "boarding", "ticket", "hotel", "error", "exception", "login", "password",
+    "download", "install", "software", "meeting", "agenda", "serum", "moisturizer", "shampoo",
+]
+
+STRONG_CATEGORIES = {"garment", "fabric"}
+
+
+# -------------------- Tokenisation --------------------
+def stem(token: str) -> str:
+    """Light plural stemming, applied identically to lexicon terms and input text"""
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 4 and token.endswith(("ses", "xes", "ches", "shes")):
+        return token[:-2]
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def normalize(text: str) -> str:
+    return " ".join(stem(token) for token in re.findall(r"[a-z0-9]+", text.lower()))
+
+
+# -------------------- Aho-Corasick Automaton --------------------
+class KeywordAutomaton:
+    """
+    Multi-pattern matcher over normalised text: finds every lexicon term in a
+    single pass regardless of lexicon size. Matches must align with token
+    boundaries, so "tan" does not fire inside "tank".
+    """
+
+    def __init__(self, terms: Dict[str, str]):
+        # terms: normalised pattern -> label
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[str, str]]] = [[]]
+        for pattern, label in terms.items():
+            self._add(pattern, label)
+        self._build()
+
+    def _add(self, pattern: str, label: str):
+        state = 0
+        for ch in pattern:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = nxt
+        self._out[state].append((pattern, label))
+
+    def _build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                if state:
+                    fallback = self._fail[state]
+                    while fallback and ch not in self._goto[fallback]:
+                        fallback = self._fail[fallback]
+                    self._fail[nxt] = self._goto[fallback].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def find(self, text: str) -> List[Tuple[int, str, str]]:
+        """Returns (start, pattern, label) for each token-aligned match"""
+        matches = []
+        state = 0
+        for end, ch in enumerate(text):
+            while state and ch not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(ch, 0)
+            for pattern, label in self._out[state]:
+                start = end - len(pattern) + 1
+                if (start == 0 or text[start - 1] == " ") and (end + 1 == len(text) or text[end + 1] == " "):
+                    matches.append((start, pattern, label))
+        return matches
+
+
+def _build_terms() -> Dict[str, str]:
+    terms = {}
+    for category, words in FASHION_LEXICON.items():
+        for word in words:
+            terms[normalize(word)] = category
+    for word in ACCESSORY_TERMS:
+        terms.setdefault(normalize(word), "accessory")
+    for word in NEGATIVE_TERMS:
+        terms.setdefault(normalize(word), "negative")
+    return terms
+
+
+_AUTOMATON = KeywordAutomaton(_build_terms())
+_CANONICAL = {normalize(word): word for words in FASHION_LEXICON.values() for word in words}
+
+
+# -------------------- Pre-Classifier --------------------
+@dataclass
+class LexiconVerdict:
+    decision: str  # "positive", "negative" or "ambiguous"
+    keywords: List[str] = field(default_factory=list)
+    counts: Dict[str, int] = field(default_factory=dict)
+
+
+def classify_fashion_text(text: str) -> LexiconVerdict:
+    """
+    Decide the obvious cases locally:
+    - positive: a garment plus at least one more fashion term, no non-clothing vocabulary
+    - negative: no garment or fabric term, but non-clothing or accessory vocabulary (or no text)
+    Everything else is "ambiguous" and should go to Gemini, including text that
+    matches no lexicon term at all: unknown vocabulary is not evidence against clothing.
+    """
+    normalized = normalize(text or "")
+    if not normalized:
+        return LexiconVerdict("negative")
+
+    # Keep the longest match at each position and drop overlaps ("tank top" wins over "top")
+    matches = []
+    covered = -1
+    for start, pattern, label in sorted(_AUTOMATON.find(normalized), key=lambda m: (m[0], -len(m[1]))):
+        if start > covered:
+            matches.append((pattern, label))
+            covered = start + len(pattern) - 1
+
+    keywords = []
+    counts = {}
+    for pattern, label in matches:
+        counts[label] = counts.get(label, 0) + 1
+        if label in FASHION_LEXICON:
+            keyword = _CANONICAL[pattern]
+            if keyword not in keywords:
+                keywords.append(keyword)
+
+    strong = sum(counts.get(category, 0) for category in STRONG_CATEGORIES)
+    fashion = sum(counts.get(category, 0) for category in FASHION_LEXICON)
+    negative = counts.get("negative", 0)
+    # Accessories alone are out of scope for the Gemini prompt too
+    accessory = counts.get("accessory", 0)
+
+    if counts.get("garment", 0) and fashion >= 2 and negative == 0:
+        return LexiconVerdict("positive", keywords, counts)
+    if strong == 0 and (negative > 0 or accessory > 0):
+        return LexiconVerdict("negative", [], counts)
+    return LexiconVerdict("ambiguous", keywords, counts)
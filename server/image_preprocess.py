@@ -0,0 +1,93 @@
+import io
+import os
+import math
+import logging
+from dataclasses import dataclass
+
+logger = logging.getLogger(__name__)
+
+# Limits applied before an upload is sent to Gemini Vision
+MAX_DIMENSION = int(os.getenv("OCR_MAX_DIMENSION", "3072"))
+MAX_PIXELS = int(os.getenv("OCR_MAX_PIXELS", "3000000"))
+MAX_BYTES = int(os.getenv("OCR_MAX_BYTES", "800000"))
+# Below this pixel standard deviation the image is treated as low contrast
+LOW_CONTRAST_STDDEV = 40
+# Text stays legible down to roughly this width for screenshots
+MIN_WIDTH = 640
+
+
+@dataclass
+class PreparedImage:
+    data: bytes
+    mime_type: str
+    width: int
+    height: int
+    original_bytes: int
+
+    def as_part(self) -> dict:
+        """Inline blob in the form genai.generate_content accepts"""
+        return {"mime_type": self.mime_type, "data": self.data}
+
+
+def _encode(image, quality: int) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format="WEBP", quality=quality, method=4)
+    return buffer.getvalue()
+
+
+def preprocess_image(data: bytes, max_dimension: int = MAX_DIMENSION, max_pixels: int = MAX_PIXELS,
+                     max_bytes: int = MAX_BYTES, grayscale: bool = True) -> PreparedImage:
+    """
+    Decode an upload straight from memory and shrink it for OCR:
+    cap dimensions and pixel count, convert to grayscale, stretch contrast
+    when the image is washed out, and re-encode as WebP under `max_bytes`.
+    Raises ValueError if the bytes are not a decodable image.
+    """
+    # Only uploads need Pillow, so the API server does not import it at startup
+    from PIL import Image, ImageOps, ImageStat
+
+    try:
+        image = Image.open(io.BytesIO(data))
+        image.load()
+    except Exception as e:
+        raise ValueError(f"Unreadable image: {e}") from e
+
+    image = ImageOps.exif_transpose(image)
+
+    # Flatten transparency onto white so text on transparent PNGs stays visible
+    if image.mode in ("RGBA", "LA", "P"):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        image = background
+
+    image = image.convert("L" if grayscale else "RGB")
+
+    if grayscale and ImageStat.Stat(image).stddev[0] < LOW_CONTRAST_STDDEV:
+        image = ImageOps.autocontrast(image, cutoff=1)
+
+    width, height = image.size
+    scale = min(1.0, max_dimension / max(width, height), math.sqrt(max_pixels / (width * height)))
+    if scale < 1.0:
+        image = image.resize((max(1, round(width * scale)), max(1, round(height * scale))), Image.LANCZOS)
+
+    # Step quality down first, then size, until the payload fits
+    quality = 85
+    encoded = _encode(image, quality)
+    while len(encoded) > max_bytes:
+        if quality > 50:
+            quality -= 15
+        elif image.width * 0.8 >= MIN_WIDTH:
+            image = image.resize((round(image.width * 0.8), round(image.height * 0.8)), Image.LANCZOS)
+        else:
+            logger.warning(f"Image still {len(encoded)} bytes at minimum legible size, sending as is")
+            break
+        encoded = _encode(image, quality)
+
+    return PreparedImage(
+        data=encoded,
+        mime_type="image/webp",
+        width=image.width,
+        height=image.height,
+        original_bytes=len(data),
+    )
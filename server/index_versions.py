@@ -0,0 +1,174 @@
+"""
+Versioned index snapshots.
+
+Each db_store.py build with INDEX_VERSIONED=true writes a complete snapshot
+(ChromaDB directory, lexical, filter and flat indexes, catalog snapshot) into its
+own directory under INDEX_ROOT/versions, validates it and then publishes it by
+atomically replacing the INDEX_ROOT/CURRENT pointer. Published snapshots are
+never written to again, so any number of server processes can read them while
+the next build runs. Servers poll the pointer and swap new versions in.
+
+    python index_versions.py list
+    python index_versions.py rollback          # re-publish the previous version
+    python index_versions.py publish <version>
+    python index_versions.py prune --keep 3
+"""
+import os
+import json
+import time
+import uuid
+import shutil
+import logging
+import argparse
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+INDEX_ROOT = os.getenv("INDEX_ROOT", "./index_versions")
+# Complete versions kept on disk besides the current and previous ones
+INDEX_KEEP_VERSIONS = int(os.getenv("INDEX_KEEP_VERSIONS", "3"))
+
+POINTER_FILE = "CURRENT"
+MANIFEST_FILE = "manifest.json"
+# Unpublished build directories older than this are treated as abandoned
+ABANDONED_BUILD_SECONDS = 86400
+
+
+class IndexVersion:
+    """Paths of one snapshot directory"""
+
+    def __init__(self, name: str, root: str = INDEX_ROOT):
+        self.name = name
+        self.root = root
+        self.path = os.path.join(root, "versions", name)
+        self.chroma_path = os.path.join(self.path, "chroma")
+        self.lexical_path = os.path.join(self.path, "lexical_index")
+        self.catalog_path = os.path.join(self.path, "catalog_snapshot")
+        self.flat_index_path = os.path.join(self.path, "flat_index")
+        self.filter_path = os.path.join(self.path, "filter_index")
+
+    @classmethod
+    def create(cls, root: str = INDEX_ROOT) -> "IndexVersion":
+        version = cls(f"v{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}", root)
+        os.makedirs(version.path)
+        return version
+
+    @property
+    def manifest(self) -> Optional[Dict]:
+        """Written last by a build that passed validation; None while building"""
+        try:
+            with open(os.path.join(self.path, MANIFEST_FILE), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def write_manifest(self, manifest: Dict):
+        _write_atomic(os.path.join(self.path, MANIFEST_FILE), {"version": self.name, **manifest})
+
+
+def _write_atomic(path: str, payload: Dict):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+# -------------------- Pointer --------------------
+def read_pointer(root: str = INDEX_ROOT) -> Optional[Dict]:
+    """{"version", "previous", "published_at"} of the published snapshot, or None"""
+    try:
+        with open(os.path.join(root, POINTER_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def current_version(root: str = INDEX_ROOT) -> Optional[IndexVersion]:
+    pointer = read_pointer(root)
+    return IndexVersion(pointer["version"], root) if pointer else None
+
+
+def publish(name: str, root: str = INDEX_ROOT) -> Dict:
+    """Point CURRENT at a validated version; the old target becomes `previous`"""
+    if IndexVersion(name, root).manifest is None:
+        raise ValueError(f"Version {name} does not exist or did not pass validation")
+    pointer = read_pointer(root) or {}
+    previous = pointer.get("version")
+    updated = {
+        "version": name,
+        "previous": previous if previous != name else pointer.get("previous"),
+        "published_at": time.time(),
+    }
+    _write_atomic(os.path.join(root, POINTER_FILE), updated)
+    logger.info(f"Published index version {name} (previous: {updated['previous']})")
+    return updated
+
+
+def rollback(root: str = INDEX_ROOT) -> Dict:
+    pointer = read_pointer(root)
+    if not pointer or not pointer.get("previous"):
+        raise ValueError("No previous version to roll back to")
+    return publish(pointer["previous"], root)
+
+
+# -------------------- Housekeeping --------------------
+def list_versions(root: str = INDEX_ROOT) -> List[IndexVersion]:
+    """Every snapshot directory, oldest first (names sort by build time)"""
+    versions_dir = os.path.join(root, "versions")
+    if not os.path.isdir(versions_dir):
+        return []
+    return [IndexVersion(name, root) for name in sorted(os.listdir(versions_dir))]
+
+
+def prune(root: str = INDEX_ROOT, keep: int = INDEX_KEEP_VERSIONS) -> List[str]:
+    """
+    Delete all but the newest `keep` complete versions and abandoned builds.
+    The current and previous versions are always kept.
+    """
+    pointer = read_pointer(root) or {}
+    protected = {pointer.get("version"), pointer.get("previous")}
+    complete = [v.name for v in list_versions(root) if v.manifest is not None]
+    removed = []
+    for version in list_versions(root):
+        if version.name in protected:
+            continue
+        if version.manifest is not None:
+            stale = version.name in complete[:max(0, len(complete) - keep)]
+        else:
+            stale = time.time() - os.path.getmtime(version.path) > ABANDONED_BUILD_SECONDS
+        if stale:
+            shutil.rmtree(version.path, ignore_errors=True)
+            removed.append(version.name)
+    if removed:
+        logger.info(f"Pruned index versions: {', '.join(removed)}")
+    return removed
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--root", default=INDEX_ROOT)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list")
+    commands.add_parser("rollback")
+    publish_parser = commands.add_parser("publish")
+    publish_parser.add_argument("version")
+    prune_parser = commands.add_parser("prune")
+    prune_parser.add_argument("--keep", type=int, default=INDEX_KEEP_VERSIONS)
+    args = parser.parse_args()
+
+    if args.command == "list":
+        pointer = read_pointer(args.root) or {}
+        for version in list_versions(args.root):
+            manifest = version.manifest
+            marker = "*" if version.name == pointer.get("version") else " "
+            state = f"{manifest['products']} products" if manifest else "incomplete"
+            print(f"{marker} {version.name}  {state}")
+    elif args.command == "rollback":
+        print(rollback(args.root)["version"])
+    elif args.command == "publish":
+        print(publish(args.version, args.root)["version"])
+    else:
+        print("\n".join(prune(args.root, args.keep)))
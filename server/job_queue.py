@@ -0,0 +1,199 @@
+import os
+import json
+import math
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+# Finished jobs past their TTL are deleted by claim() at most this often
+PURGE_INTERVAL_SECONDS = 60
+
+
+class QueueFull(Exception):
+    """The job queue is at capacity; `retry_after` estimates when a slot frees up"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Upload queue is full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+# -------------------- Upload Job Store --------------------
+class UploadJobStore:
+    """
+    Durable FIFO of upload jobs in SQLite. The image bytes are stored with the
+    job and dropped once it finishes, so queued work survives a restart.
+
+    At most `max_pending` jobs may be queued or running. A worker claims a job
+    with a lease of `lease_seconds`; a job whose worker died (lease expired) is
+    handed out again, up to `max_attempts` times. Finished jobs are kept for
+    `result_ttl_seconds` so clients can collect them; older ones are reported as
+    missing and purged periodically by claim(). Every process pointing at the
+    same file shares the queue.
+    """
+
+    def __init__(self, db_path: str = "./data/upload_jobs.db", max_pending: int = 100, lease_seconds: float = 120,
+                 max_attempts: int = 3, result_ttl_seconds: float = 3600):
+        self.max_pending = max_pending
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.result_ttl = result_ttl_seconds
+        self.stats = {"submitted": 0, "rejected": 0, "completed": 0, "failed": 0, "requeued": 0}
+        # Moving average of job run time, for Retry-After estimates
+        self.avg_seconds = 5.0
+        self._purged = 0.0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS upload_jobs ("
+            "job_id TEXT PRIMARY KEY, filename TEXT NOT NULL, data BLOB, status TEXT NOT NULL, "
+            "attempts INTEGER NOT NULL DEFAULT 0, lease_until REAL, result TEXT, "
+            "created REAL NOT NULL, updated REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS upload_jobs_status ON upload_jobs(status, created)")
+        self._db.commit()
+        self.purge()
+        recovered = self._db.execute("SELECT COUNT(*) FROM upload_jobs WHERE status IN (?, ?)",
+                                     (QUEUED, RUNNING)).fetchone()[0]
+        if recovered:
+            logger.info(f"Recovered {recovered} unfinished upload jobs from {db_path}")
+
+    def _pending(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM upload_jobs WHERE status IN (?, ?)",
+                                (QUEUED, RUNNING)).fetchone()[0]
+
+    def submit(self, filename: str, data: bytes, workers: int = 1) -> Dict:
+        """Queue a job and return its status, or raise QueueFull"""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                pending = self._pending()
+                if pending >= self.max_pending:
+                    self._db.rollback()
+                    self.stats["rejected"] += 1
+                    # A slot frees up when one of the running jobs finishes
+                    raise QueueFull(max(1, math.ceil(self.avg_seconds / max(1, workers))))
+                now = time.time()
+                job_id = uuid.uuid4().hex
+                self._db.execute(
+                    "INSERT INTO upload_jobs (job_id, filename, data, status, created, updated) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (job_id, filename, data, QUEUED, now, now),
+                )
+                self._db.commit()
+            except sqlite3.Error:
+                self._db.rollback()
+                raise
+            self.stats["submitted"] += 1
+        return {"job_id": job_id, "status": QUEUED, "filename": filename, "position": pending + 1}
+
+    def claim(self) -> Optional[Dict]:
+        """Lease the oldest runnable job to the caller, or return None"""
+        with self._lock:
+            now = time.time()
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                # Jobs whose worker died mid-run; give up on ones that keep killing workers
+                expired = self._db.execute(
+                    "UPDATE upload_jobs SET status = ?, data = NULL, updated = ?, result = ? "
+                    "WHERE status = ? AND lease_until < ? AND attempts >= ?",
+                    (FAILED, now, json.dumps({"status_code": 500, "message": "Job was interrupted too many times"}),
+                     RUNNING, now, self.max_attempts),
+                ).rowcount
+                if now - self._purged >= min(PURGE_INTERVAL_SECONDS, self.result_ttl):
+                    self._purge(now)
+                row = self._db.execute(
+                    "SELECT job_id, filename, data, attempts FROM upload_jobs "
+                    "WHERE status = ? OR (status = ? AND lease_until < ?) ORDER BY created LIMIT 1",
+                    (QUEUED, RUNNING, now),
+                ).fetchone()
+                if row is not None:
+                    self._db.execute(
+                        "UPDATE upload_jobs SET status = ?, attempts = attempts + 1, lease_until = ?, updated = ? "
+                        "WHERE job_id = ?",
+                        (RUNNING, now + self.lease_seconds, now, row[0]),
+                    )
+                self._db.commit()
+            except sqlite3.Error:
+                self._db.rollback()
+                raise
+            self.stats["failed"] += expired
+            if row is None:
+                return None
+            if row[3]:
+                self.stats["requeued"] += 1
+                logger.warning(f"Re-running upload job {row[0]} after an interrupted attempt")
+            return {"job_id": row[0], "filename": row[1], "data": row[2]}
+
+    def finish(self, job_id: str, result: Dict, seconds: float, failed: bool = False):
+        """Store a job's outcome and release its image bytes"""
+        with self._lock:
+            self._db.execute(
+                "UPDATE upload_jobs SET status = ?, data = NULL, result = ?, lease_until = NULL, updated = ? "
+                "WHERE job_id = ?",
+                (FAILED if failed else DONE, json.dumps(result), time.time(), job_id),
+            )
+            self._db.commit()
+            self.stats["failed" if failed else "completed"] += 1
+            self.avg_seconds = 0.8 * self.avg_seconds + 0.2 * seconds
+
+    def release(self, job_id: str):
+        """Put a job interrupted by shutdown back at the head of the queue"""
+        with self._lock:
+            self._db.execute(
+                "UPDATE upload_jobs SET status = ?, attempts = attempts - 1, lease_until = NULL, updated = ? "
+                "WHERE job_id = ? AND status = ?",
+                (QUEUED, time.time(), job_id, RUNNING),
+            )
+            self._db.commit()
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT status, filename, result, created, updated FROM upload_jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+            if row is None or (row[0] in (DONE, FAILED) and row[4] < time.time() - self.result_ttl):
+                return None
+            job = {"job_id": job_id, "status": row[0], "filename": row[1], "created": row[3], "updated": row[4]}
+            if row[0] == QUEUED:
+                job["position"] = self._db.execute(
+                    "SELECT COUNT(*) FROM upload_jobs WHERE status = ? AND created <= ?", (QUEUED, row[3])
+                ).fetchone()[0]
+        if row[2] is not None:
+            job["result"] = json.loads(row[2])
+        return job
+
+    def _purge(self, now: float):
+        cur = self._db.execute("DELETE FROM upload_jobs WHERE status IN (?, ?) AND updated < ?",
+                               (DONE, FAILED, now - self.result_ttl))
+        self._purged = now
+        if cur.rowcount:
+            logger.info(f"Purged {cur.rowcount} expired upload job results")
+
+    def purge(self):
+        """Delete finished jobs older than the result TTL"""
+        with self._lock:
+            self._purge(time.time())
+            self._db.commit()
+
+    def info(self) -> dict:
+        with self._lock:
+            counts = dict(self._db.execute("SELECT status, COUNT(*) FROM upload_jobs GROUP BY status").fetchall())
+        return {
+            **self.stats,
+            **{status: counts.get(status, 0) for status in (QUEUED, RUNNING, DONE, FAILED)},
+            "max_pending": self.max_pending,
+            "avg_job_seconds": round(self.avg_seconds, 3),
+        }
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
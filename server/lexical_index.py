@@ -0,0 +1,148 @@
+import os
+import json
+import shutil
+import logging
+from collections import defaultdict
+from typing import Dict, List, Sequence, Tuple
+import numpy as np
+from fashion_lexicon import normalize
+
+logger = logging.getLogger(__name__)
+
+LEXICAL_INDEX_PATH = os.getenv("LEXICAL_INDEX_PATH", "./lexical_index")
+# A query made only of terms this rare (brands, SKUs, rare fabrics) is answered lexically
+RARE_TERM_MAX_DF = float(os.getenv("LEXICAL_RARE_TERM_MAX_DF", "0.01"))
+
+
+def tokenize(text: str) -> List[str]:
+    return normalize(text).split()
+
+
+# -------------------- Build --------------------
+class LexicalIndexBuilder:
+    """
+    Accumulates an inverted index over product documents at ingest time and
+    writes it as flat NumPy arrays that the server memory-maps
+    """
+
+    def __init__(self):
+        self.doc_ids: List[str] = []
+        self.doc_lengths: List[int] = []
+        self.postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+
+    def add(self, doc_id: str, text: str):
+        row = len(self.doc_ids)
+        tokens = tokenize(text)
+        self.doc_ids.append(doc_id)
+        self.doc_lengths.append(len(tokens))
+        counts = defaultdict(int)
+        for token in tokens:
+            counts[token] += 1
+        for token, tf in counts.items():
+            self.postings[token].append((row, tf))
+
+    def save(self, path: str = LEXICAL_INDEX_PATH):
+        """Write to a sibling temp directory, then swap it in so readers never see a partial index"""
+        tmp = f"{path}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+
+        vocab = {}
+        docs, tfs = [], []
+        for term in sorted(self.postings):
+            entries = self.postings[term]
+            vocab[term] = [len(docs), len(entries)]
+            docs.extend(row for row, _ in entries)
+            tfs.extend(tf for _, tf in entries)
+
+        np.save(os.path.join(tmp, "postings_docs.npy"), np.asarray(docs, dtype=np.int32))
+        np.save(os.path.join(tmp, "postings_tf.npy"), np.asarray(tfs, dtype=np.float32))
+        np.save(os.path.join(tmp, "doc_lengths.npy"), np.asarray(self.doc_lengths, dtype=np.float32))
+        with open(os.path.join(tmp, "vocab.json"), "w", encoding="utf-8") as f:
+            json.dump(vocab, f)
+        with open(os.path.join(tmp, "doc_ids.json"), "w", encoding="utf-8") as f:
+            json.dump(self.doc_ids, f)
+
+        old = f"{path}.old"
+        shutil.rmtree(old, ignore_errors=True)
+        if os.path.exists(path):
+            os.replace(path, old)
+        os.replace(tmp, path)
+        shutil.rmtree(old, ignore_errors=True)
+        logger.info(f"Saved lexical index: {len(self.doc_ids)} documents, {len(vocab)} terms -> {path}")
+
+
+# -------------------- Query --------------------
+class LexicalIndex:
+    """
+    Okapi BM25 over memory-mapped postings built by LexicalIndexBuilder
+    """
+
+    def __init__(self, path: str, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings_docs = np.load(os.path.join(path, "postings_docs.npy"), mmap_mode="r")
+        self.postings_tf = np.load(os.path.join(path, "postings_tf.npy"), mmap_mode="r")
+        self.doc_lengths = np.load(os.path.join(path, "doc_lengths.npy"), mmap_mode="r")
+        with open(os.path.join(path, "vocab.json"), encoding="utf-8") as f:
+            self.vocab = json.load(f)
+        with open(os.path.join(path, "doc_ids.json"), encoding="utf-8") as f:
+            self.doc_ids = json.load(f)
+        self.size = len(self.doc_ids)
+        self.avg_length = float(self.doc_lengths.mean()) if self.size else 0.0
+
+    @classmethod
+    def load(cls, path: str = LEXICAL_INDEX_PATH):
+        """Returns None when no index has been built yet"""
+        if not os.path.exists(os.path.join(path, "vocab.json")):
+            logger.info(f"No lexical index at {path}, using vector retrieval only")
+            return None
+        index = cls(path)
+        logger.info(f"Loaded lexical index: {index.size} documents, {len(index.vocab)} terms")
+        return index
+
+    def _idf(self, df: int) -> float:
+        return float(np.log(1 + (self.size - df + 0.5) / (df + 0.5)))
+
+    def search(self, query: str, k: int = 5) -> Tuple[List[str], bool]:
+        """
+        Top-k document IDs by BM25, plus whether the query is "exact": every term is
+        rare in the catalog and the best match contains all of them
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or not self.size:
+            return [], False
+
+        scores = np.zeros(self.size, dtype=np.float32)
+        matched_terms = np.zeros(self.size, dtype=np.int16)
+        all_rare = True
+        for term in terms:
+            entry = self.vocab.get(term)
+            if entry is None:
+                all_rare = False
+                continue
+            offset, df = entry
+            all_rare = all_rare and df <= max(1, self.size * RARE_TERM_MAX_DF)
+            rows = self.postings_docs[offset:offset + df]
+            tf = self.postings_tf[offset:offset + df]
+            norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[rows] / self.avg_length)
+            scores[rows] += self._idf(df) * tf * (self.k1 + 1) / (tf + norm)
+            matched_terms[rows] += 1
+
+        candidates = np.flatnonzero(scores)
+        if candidates.size == 0:
+            return [], False
+        if candidates.size > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        ranked = candidates[np.argsort(-scores[candidates], kind="stable")]
+        exact = all_rare and int(matched_terms[ranked[0]]) == len(terms)
+        return [self.doc_ids[row] for row in ranked], exact
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60) -> List[str]:
+    """Merge ranked ID lists by summing 1 / (k + rank) across lists"""
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] += 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
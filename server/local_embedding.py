@@ -0,0 +1,124 @@
+import os
+import logging
+from typing import Dict, List, Optional
+import numpy as np
+from embedding import EmbeddingError, _as_text_list
+
+logger = logging.getLogger(__name__)
+
+# Directory of a sentence-transformers model exported to ONNX (model.onnx + tokenizer.json),
+# e.g. sentence-transformers/all-MiniLM-L6-v2 exported with optimum
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "./models/all-MiniLM-L6-v2")
+# Use the int8 dynamically quantized export (model_quantized.onnx) instead of float32
+ONNX_QUANTIZED = os.getenv("ONNX_QUANTIZED", "false").lower() == "true"
+# Threads per inference call; 0 lets ONNX Runtime use one per physical core
+ONNX_THREADS = int(os.getenv("ONNX_THREADS", "0"))
+ONNX_MAX_LENGTH = int(os.getenv("ONNX_MAX_LENGTH", "256"))
+ONNX_MAX_BATCH_SIZE = int(os.getenv("ONNX_MAX_BATCH_SIZE", "64"))
+# "mean" over the attention mask (sentence-transformers default) or "cls"
+ONNX_POOLING = os.getenv("ONNX_POOLING", "mean").lower()
+
+MODEL_FILES = ["model.onnx", "onnx/model.onnx"]
+QUANTIZED_MODEL_FILES = ["model_quantized.onnx", "model_int8.onnx", "onnx/model_quantized.onnx", "onnx/model_int8.onnx"]
+
+
+def _find(model_dir: str, names: List[str]) -> Optional[str]:
+    for name in names:
+        path = os.path.join(model_dir, name)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+class OnnxEmbeddingFunction:
+    """
+    Sentence embeddings computed in-process on CPU with ONNX Runtime.
+
+    Texts are tokenized with the model's tokenizer.json, sorted by length and run
+    in chunks of `max_batch_size` padded only to the longest text in the chunk.
+    Token states are pooled over the attention mask and L2-normalised, as
+    sentence-transformers does. Thread-safe; one session serves all callers.
+    """
+
+    def __init__(self, model_dir: str = ONNX_MODEL_DIR, quantized: bool = ONNX_QUANTIZED,
+                 threads: int = ONNX_THREADS, max_length: int = ONNX_MAX_LENGTH,
+                 max_batch_size: int = ONNX_MAX_BATCH_SIZE, pooling: str = ONNX_POOLING):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_path = _find(model_dir, QUANTIZED_MODEL_FILES if quantized else MODEL_FILES)
+        tokenizer_path = _find(model_dir, ["tokenizer.json"])
+        if model_path is None or tokenizer_path is None:
+            kind = "an int8-quantized" if quantized else "a float32"
+            raise FileNotFoundError(f"{model_dir} must contain {kind} ONNX model and tokenizer.json")
+        if pooling not in ("mean", "cls"):
+            raise ValueError(f"Unknown pooling '{pooling}', expected 'mean' or 'cls'")
+
+        self.tokenizer = Tokenizer.from_file(tokenizer_path)
+        self.tokenizer.enable_truncation(max_length)
+        pad_token = next((t for t in ("[PAD]", "<pad>") if self.tokenizer.token_to_id(t) is not None), None)
+        self.tokenizer.enable_padding(pad_id=self.tokenizer.token_to_id(pad_token) if pad_token else 0,
+                                      pad_token=pad_token or "[PAD]")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        outputs = [o.name for o in self.session.get_outputs()]
+        # Exports that include the pooling layer expose it directly
+        self.output_name = "sentence_embedding" if "sentence_embedding" in outputs else outputs[0]
+
+        self.max_batch_size = max(1, max_batch_size)
+        self.pooling = pooling
+        self.model = os.path.basename(os.path.normpath(model_dir)) + (":int8" if quantized else "")
+        self.dimensions = len(self._run(["dimension probe"])[0])
+        self.signature = {
+            "embedding_backend": "onnx",
+            "embedding_model": self.model,
+            "embedding_dimensions": self.dimensions,
+        }
+        self.__name__ = "onnx-embedding"
+        self.name = lambda: "onnx-embedding"
+        logger.info(f"Loaded ONNX embedding model {self.model} ({self.dimensions} dims) from {model_path}")
+
+    def _run(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds: Dict[str, np.ndarray] = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+        feeds = {name: value for name, value in feeds.items() if name in self.input_names}
+
+        hidden = self.session.run([self.output_name], feeds)[0]
+        if hidden.ndim == 3:
+            if self.pooling == "cls":
+                hidden = hidden[:, 0]
+            else:
+                mask = attention_mask[:, :, None].astype(np.float32)
+                hidden = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(hidden, axis=1, keepdims=True)
+        return hidden / np.clip(norms, 1e-12, None)
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        empty = [i for i, text in enumerate(texts) if not text or not text.strip()]
+        if empty:
+            raise EmbeddingError(f"Cannot embed empty text at positions {empty}")
+        if not texts:
+            return []
+
+        # Similar lengths share a chunk, so little compute is spent on padding
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors = np.empty((len(texts), self.dimensions), dtype=np.float32)
+        try:
+            for start in range(0, len(order), self.max_batch_size):
+                chunk = order[start:start + self.max_batch_size]
+                vectors[chunk] = self._run([texts[i] for i in chunk])
+        except Exception as e:
+            raise EmbeddingError(f"ONNX embedding failed for {len(texts)} texts: {e}") from e
+        return vectors.tolist()
+
+    def __call__(self, input):
+        return self.embed_batch(_as_text_list(input))
@@ -1,71 +1,163 @@
+import time
+# Start of the import phase, for the startup timing breakdown in /stats
+IMPORT_STARTED = time.perf_counter()
 import os
 import logging
+import threading
 import re
+import json
+import asyncio
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
 from typing import List, Dict
 from pydantic import BaseModel
-from fastapi import FastAPI, HTTPException, Depends, File, UploadFile
+from fastapi import FastAPI, HTTPException, Depends, File, UploadFile, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, PlainTextResponse, JSONResponse
 from dotenv import load_dotenv
-import chromadb
-from chromadb.config import Settings
-import google.generativeai as genai
+from chroma_store import ChromaResources
+from product_catalog import product_card
+from index_versions import IndexVersion, read_pointer
+from lexical_index import reciprocal_rank_fusion
+from embedding import EMBEDDING_BACKEND, MicroBatchingEmbedder, create_embedding_function
+from embedding_cache import EmbeddingCache, CachedEmbeddingFunction
+from concurrency import run_blocking, shutdown as shutdown_blocking_pool
 from ocr_utils import extract_text_from_image
-from semantic_filter import process_fashion_keywords
+from image_preprocess import preprocess_image
+from upload_cache import UploadResultCache, content_hash, perceptual_hash, same_text
+from response_cache import SemanticResponseCache, context_key
+from session_store import SessionStore
+from job_queue import UploadJobStore, QueueFull, DONE, FAILED
+from providers import LLM_PROVIDER, get_provider
+from resilience import resilient_call, resilient_stream, resilience_stats
+from telemetry import TelemetryMiddleware, render_metrics, slow_traces, stage
+from semantic_filter import process_fashion_keywords, analyze_fashion_image, fast_path_stats
+IMPORTS_DONE = time.perf_counter()
 
 # -------------------- Logging --------------------
 logging.basicConfig(level=logging.INFO) 
 logger = logging.getLogger(__name__)
 
+# -------------------- Startup Timing --------------------
+# Phases in milliseconds: module imports and setup, then the background index
+# load and warm-up, and the total until the server was first ready
+startup_timings = {"imports_ms": round((IMPORTS_DONE - IMPORT_STARTED) * 1000, 2)}
+dependencies_ready = threading.Event()
+dependencies_error = None
+
 # -------------------- Load Env --------------------
 load_dotenv()
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
+if not GEMINI_API_KEY and LLM_PROVIDER != "fake":
     logger.error("GEMINI_API_KEY environment variable not set.")
     raise RuntimeError("GEMINI_API_KEY not set")
 
 # -------------------- Gemini Setup --------------------
-genai.configure(api_key=GEMINI_API_KEY)
-
-# -------------------- Custom Gemini Embedder --------------------
-class GeminiEmbeddingFunction:
-    def __init__(self, model="models/embedding-001", api_key=None):
-        self.model = model
-        self.api_key = api_key
-        genai.configure(api_key=api_key)
-        self.__name__ = "gemini-embedding"
-        self.name = lambda: "gemini-embedding"
-
-    def __call__(self, input=None, texts=None):
-        # Handle both 'input' and 'texts' parameters for ChromaDB compatibility
-        if input is not None:
-            texts = input
-        elif texts is None:
-            raise ValueError("Either 'input' or 'texts' parameter must be provided")
-            
-        if not isinstance(texts, list):
-            texts = [texts]
-            
-        embeddings = []
-        for text in texts:
-            try:
-                res = genai.embed_content(
-                    model=self.model,
-                    content=text,
-                    task_type="retrieval_document"
-                )
-                embeddings.append(res["embedding"])
-            except Exception as e:
-                logger.error(f"Embedding failed for: {text}\nError: {e}")
-                embeddings.append([0.0] * 768)
-        return embeddings
-    
+# Fails fast on a bad configuration; LLM_PROVIDER=fake runs without a key or network.
+# FAST_STARTUP creates the provider (importing the Gemini SDK) in the background
+# warm-up instead, so liveness answers sooner; readiness waits for it.
+FAST_STARTUP = os.getenv("FAST_STARTUP", "false").lower() == "true"
+if not FAST_STARTUP:
+    get_provider()
+
+def warm_up_dependencies():
+    """
+    Create the LLM provider if FAST_STARTUP deferred it, and import the image
+    libraries uploads need, while the index loads
+    """
+    global dependencies_error
+    start = time.perf_counter()
+    try:
+        get_provider()
+        provider_ready = time.perf_counter()
+        import PIL.Image, PIL.ImageOps, PIL.ImageStat  # noqa: F401
+        startup_timings["provider_ms"] = round((provider_ready - start) * 1000, 2)
+        startup_timings["image_libs_ms"] = round((time.perf_counter() - provider_ready) * 1000, 2)
+        dependencies_ready.set()
+    except Exception as e:
+        dependencies_error = str(e)
+        logger.exception("Failed to initialize the LLM provider")
+
+async def report_startup(chroma, *loading):
+    await asyncio.gather(*loading, return_exceptions=True)
+    if not (chroma.ready and dependencies_ready.is_set()):
+        return
+    startup_timings["index"] = chroma.timings
+    startup_timings["ready_ms"] = round((time.perf_counter() - IMPORT_STARTED) * 1000, 2)
+    logger.info(
+        f"Ready {startup_timings['ready_ms']}ms after import: imports {startup_timings['imports_ms']}ms, "
+        f"setup {startup_timings['setup_ms']}ms, provider {startup_timings['provider_ms']}ms, "
+        f"index {round(sum(chroma.timings.values()), 2)}ms {chroma.timings}"
+    )
+
+# -------------------- Lifespan --------------------
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Open the ChromaDB client once and warm the HNSW index in the background,
+    # so liveness answers immediately and readiness flips once the index is loaded.
+    chroma = ChromaResources.published(embedding_fn)
+    app.state.chroma = chroma
+    app.state.previous_chroma = None
+    app.state.job_store = open_job_store()
+    warmup = asyncio.create_task(asyncio.to_thread(chroma.load))
+    dependencies = asyncio.create_task(asyncio.to_thread(warm_up_dependencies))
+    report = asyncio.create_task(report_startup(chroma, warmup, dependencies))
+    watcher = asyncio.create_task(watch_index_versions())
+    workers = start_upload_workers()
+    yield
+    watcher.cancel()
+    report.cancel()
+    await stop_upload_workers(workers)
+    if not warmup.done():
+        await warmup
+    if not dependencies.done():
+        await dependencies
+    embedding_fn.close()
+    session_store.close()
+    app.state.job_store.close()
+    shutdown_blocking_pool()
+
 # -------------------- FastAPI Init --------------------
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 @app.get("/")
 def read_root():
     return {"message": "API is running"}
 
+@app.get("/health/live")
+def liveness():
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+def readiness(request: Request):
+    status = request.app.state.chroma.status()
+    if not dependencies_ready.is_set():
+        status["ready"] = False
+        status["dependencies"] = dependencies_error or "loading"
+    if not status["ready"]:
+        raise HTTPException(status_code=503, detail=status)
+    return status
+
+@app.get("/stats")
+def stats():
+    return {
+        "embedding_cache": embedding_fn.cache.info(),
+        "embedding_batcher": embedding_fn.embedder.stats,
+        "upload_cache": upload_cache.info(),
+        "response_cache": response_cache.info(),
+        "sessions": session_store.info(),
+        "upload_jobs": app.state.job_store.info(),
+        "keyword_fast_path": fast_path_stats,
+        "vector_search": getattr(getattr(app.state.chroma, "collection", None), "stats", None),
+        "upstream": resilience_stats(),
+        "startup": startup_timings,
+        "slow_traces": list(slow_traces),
+    }
+
+@app.get("/metrics")
+def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 # -------------------- CORS --------------------
 app.add_middleware(
     CORSMiddleware,
@@ -73,8 +165,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID", "Server-Timing"],
 )
 
+# -------------------- Telemetry --------------------
+# Request IDs, per-stage timings and the Server-Timing header
+app.add_middleware(TelemetryMiddleware)
+
 # -------------------- Request Model --------------------
 class PromptRequest(BaseModel):
     prompt: str
@@ -82,123 +179,582 @@ class PromptRequest(BaseModel):
     session_id: str | None = None
 
 # -------------------- Embedding Function --------------------
-embedding_fn = GeminiEmbeddingFunction(
-    api_key=GEMINI_API_KEY,
-    model="models/embedding-001"
+# Repeated prompts are answered from the embedding cache; the remaining query
+# embeddings from concurrent requests are coalesced into shared batch calls.
+# EMBEDDING_BACKEND must match the backend db_store.py built the collection with.
+base_embedder = create_embedding_function(model="models/embedding-001")
+if EMBEDDING_BACKEND == "gemini":
+    # Fake vectors must never be served for real ones from a shared disk cache
+    embedding_namespace = "models/embedding-001" if LLM_PROVIDER != "fake" else "fake:models/embedding-001"
+else:
+    embedding_namespace = f"{EMBEDDING_BACKEND}:{base_embedder.model}"
+embedding_fn = CachedEmbeddingFunction(
+    MicroBatchingEmbedder(
+        base_embedder,
+        max_batch_size=int(os.getenv("EMBED_MAX_BATCH_SIZE", "32")),
+        # A local model answers in milliseconds, so only wait briefly for company
+        max_wait_ms=float(os.getenv("EMBED_MAX_WAIT_MS", "10" if EMBEDDING_BACKEND == "gemini" else "2")),
+    ),
+    EmbeddingCache(
+        max_entries=int(os.getenv("EMBED_CACHE_SIZE", "10000")),
+        ttl_seconds=float(os.getenv("EMBED_CACHE_TTL_SECONDS", "86400")),
+        db_path=os.getenv("EMBED_CACHE_PATH") or None,
+        max_disk_entries=int(os.getenv("EMBED_CACHE_DISK_SIZE", "100000")),
+        namespace=embedding_namespace,
+    ),
+)
+
+# -------------------- Semantic Response Cache --------------------
+SEMANTIC_CACHE = os.getenv("SEMANTIC_CACHE", "true").lower() == "true"
+response_cache = SemanticResponseCache(
+    max_entries=int(os.getenv("SEMANTIC_CACHE_SIZE", "2048")),
+    threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95")),
+    ttl_seconds=float(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "3600")),
+)
+
+# -------------------- Conversation Sessions --------------------
+SESSIONS = os.getenv("SESSIONS", "true").lower() == "true"
+session_store = SessionStore(
+    max_sessions=int(os.getenv("SESSION_MAX", "10000")),
+    idle_ttl_seconds=float(os.getenv("SESSION_IDLE_TTL_SECONDS", "3600")),
+    token_budget=int(os.getenv("SESSION_TOKEN_BUDGET", "1500")),
+    summary_budget=int(os.getenv("SESSION_SUMMARY_BUDGET", "300")),
+    db_path=os.getenv("SESSION_DB_PATH") or None,
 )
 
 # -------------------- ChromaDB Connection --------------------
-def get_chroma_collection():
-    try:
-        logger.info("Initializing ChromaDB client...")
-        client = chromadb.PersistentClient(
-            path="./chroma_db",
-            settings=Settings(anonymized_telemetry=False)
-        )
-
-        existing_collections = client.list_collections()
-        collection_exists = any(col.name == "Clothes_products" for col in existing_collections)
-
-        if collection_exists:
-            collection = client.get_collection("Clothes_products")
-            if hasattr(collection, '_embedding_function'):
-                if collection._embedding_function.__class__.__name__ != embedding_fn.__class__.__name__:
-                    logger.warning("Existing collection uses different embedding function")
-            collection._embedding_function = embedding_fn
-        else:
-            collection = client.create_collection(
-                name="Clothes_products",
-                embedding_function=embedding_fn
-            )
-            logger.info("Created new collection")
+# The index version a request started on; the lexical, filter and catalog lookups
+# read from it too, so a version swap mid-request cannot mix two catalogs
+request_chroma: ContextVar = ContextVar("request_chroma", default=None)
+# Versions pinned by the current request, released by IndexPinMiddleware
+request_pins: ContextVar = ContextVar("request_pins", default=None)
 
-        return collection
+def current_chroma():
+    return request_chroma.get() or getattr(app.state, "chroma", None)
 
-    except Exception as e:
-        logger.exception("Failed to initialize ChromaDB")
-        raise HTTPException(status_code=500, detail=f"Database initialization failed: {str(e)}")
+class IndexPinMiddleware:
+    """
+    Releases the index versions a request pinned once its response has been sent,
+    streamed bodies included, or the client has gone away. Dependency teardown
+    runs before a StreamingResponse body is sent, so it cannot do this.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        pins = []
+        token = request_pins.set(pins)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            request_pins.reset(token)
+            for chroma in pins:
+                chroma.release()
+
+app.add_middleware(IndexPinMiddleware)
+
+async def get_chroma_collection(request: Request):
+    """
+    Hand out the shared app-lifetime collection opened during startup (or the
+    latest swapped-in version) and pin its version for the rest of the request,
+    so a swap cannot close it while the request is still using it
+    """
+    chroma = request.app.state.chroma
+    if not chroma.ready:
+        detail = chroma.error or "Product index is still loading"
+        raise HTTPException(status_code=503, detail=f"Database not ready: {detail}")
+    pins = request_pins.get()
+    if pins is not None and chroma.acquire():
+        pins.append(chroma)
+    request_chroma.set(chroma)
+    return chroma.collection
 
 # -------------------- Extract Chatbot Logic --------------------
-async def generate_chatbot_response(request: PromptRequest, collection):
+PRODUCT_ID_PATTERN = re.compile(r'Product ID:\s*(\d{1,6})')
+FALLBACK_RESPONSE = "I apologize, but I'm having trouble finding products right now. Please try again."
+# Sent with the top retrieved products when generation fails or misses its deadline
+DEGRADED_RESPONSE = "I can't put together a full answer right now, but these products match what you're looking for."
+DEGRADED_MAX_PRODUCTS = 4
+
+def clean_response_text(response_text: str) -> str:
+    return re.sub(r'\n?Product ID:\s*\d{1,6}', '', response_text).strip()
+
+HYBRID_RETRIEVAL = os.getenv("HYBRID_RETRIEVAL", "true").lower() == "true"
+QUERY_FILTERS = os.getenv("QUERY_FILTERS", "true").lower() == "true"
+# Price ranges matching more products than this are not pushed down to ChromaDB
+# as an ID list; the query over-fetches and is filtered against them afterwards
+QUERY_FILTER_MAX_IDS = int(os.getenv("QUERY_FILTER_MAX_IDS", "1000"))
+POST_FILTER_OVERFETCH = 10
+
+def get_lexical_index():
+    return getattr(current_chroma(), "lexical", None) if HYBRID_RETRIEVAL else None
+
+def get_filter_index():
+    chroma = current_chroma()
+    return getattr(chroma, "filters", None) if QUERY_FILTERS else None
+
+def narrow_candidates(prompt: str):
+    """
+    Pull price / color / category / brand constraints out of the prompt and resolve
+    them against the secondary indexes.
+    Returns (query text, candidate IDs or None, extra collection.query filter kwargs,
+    whether vector results must still be filtered against the candidates).
+    Constraints that no product satisfies are dropped rather than returning nothing.
+    """
+    filters = get_filter_index()
+    if filters is None:
+        return prompt, None, {}, False
+    constraints = filters.extract(prompt)
+    if constraints.empty:
+        return prompt, None, {}, False
+
+    candidates = filters.candidate_ids(constraints)
+    if not candidates:
+        logger.info(f"No products satisfy {constraints}, retrieving without filters")
+        return prompt, None, {}, False
+    logger.info(f"Query constraints {constraints} narrowed to {len(candidates)} products")
+
+    if getattr(current_chroma(), "vector_backend", "chroma") == "flat":
+        # The flat index filters by row, so every constraint goes down as the ID set
+        return constraints.text, candidates, {"ids": candidates}, False
+
+    query_filters = {}
+    where = filters.where_filter(constraints)
+    if where is not None:
+        query_filters["where"] = where
+    if constraints.min_price is not None or constraints.max_price is not None:
+        if len(candidates) > QUERY_FILTER_MAX_IDS:
+            # A broad range would become a huge $in clause; filter the results instead
+            return constraints.text, candidates, query_filters, True
+        # Prices are stored as display strings, so the range is pushed down as an ID set
+        query_filters["ids"] = candidates
+    return constraints.text, candidates, query_filters, False
+
+async def hydrate_products(product_ids: List[str], collection) -> List[Dict]:
+    """
+    Product cards for `product_ids` in order: an in-process lookup in the catalog
+    snapshot, with one ChromaDB round-trip only for IDs the snapshot lacks.
+    Either way a card holds the CARD_FIELDS, as strings.
+    """
+    catalog = getattr(current_chroma(), "catalog", None)
+    with stage("hydrate"):
+        cards = catalog.get_many(product_ids) if catalog is not None else {}
+
+        missing = [str(pid) for pid in product_ids if str(pid) not in cards]
+        if missing:
+            data = await run_blocking("chroma", collection.get, ids=missing)
+            cards.update(
+                (pid, product_card(metadata)) for pid, metadata in zip(data.get("ids", []), data.get("metadatas", []))
+            )
+    return [cards[str(pid)] for pid in product_ids if str(pid) in cards]
+
+async def retrieval_only_response(candidate_ids: List[str], collection) -> Dict:
+    """
+    Answer without the model: the top retrieved products under a templated
+    message, flagged `degraded`. Falls back to the apology if nothing was retrieved.
+    """
+    product_ids = [str(pid) for pid in candidate_ids[:DEGRADED_MAX_PRODUCTS]]
+    products = []
+    if product_ids:
+        try:
+            products = await hydrate_products(product_ids, collection)
+        except Exception as e:
+            logger.error(f"Failed to fetch fallback product metadata: {e}")
+    if not products:
+        return {"response": FALLBACK_RESPONSE, "products": [], "product_ids": [], "degraded": True}
+    return {"response": DEGRADED_RESPONSE, "products": products, "product_ids": product_ids, "degraded": True}
+
+async def retrieve_products_batch(prompts: List[str], collection, n_results: int = 5,
+                                  embeddings: Dict | None = None) -> List:
     """
-    Generate chatbot response - extracted from /generate-response endpoint
+    Hybrid retrieval: dense ChromaDB neighbours fused with BM25 matches by reciprocal
+    rank fusion, restricted to products matching any constraints in the prompt.
+    Queries made only of rare exact tokens (brands, SKUs) are answered from the
+    lexical index alone, without an embedding call.
+    Prompts that need vectors are embedded in one call and share one multi-query
+    collection.query per distinct filter; metadata misses are fetched together.
+    Returns, per prompt, (ids, metadatas) in rank order or the exception it failed with.
+    `embeddings`, if given, is filled with prompt -> the query embedding used for it,
+    for prompts that needed one.
+    """
+    lexical = get_lexical_index()
+    plans = []
+    for prompt in prompts:
+        with stage("constraints"):
+            query_text, candidates, query_filters, post_filter = narrow_candidates(prompt)
+        allowed = set(candidates) if candidates is not None else None
+
+        lexical_ids, exact = [], False
+        if lexical is not None:
+            # Over-fetch when filtering so enough matches survive the candidate check
+            with stage("lexical"):
+                lexical_ids, exact = lexical.search(prompt, n_results if allowed is None else n_results * 10)
+            if allowed is not None:
+                exact = exact and bool(lexical_ids) and lexical_ids[0] in allowed
+                lexical_ids = [pid for pid in lexical_ids if pid in allowed][:n_results]
+
+        plan = {"prompt": prompt, "query_text": query_text, "filters": query_filters, "lexical": lexical_ids,
+                "allowed": allowed if post_filter else None,
+                "fetch": n_results * POST_FILTER_OVERFETCH if post_filter else n_results,
+                "ranked": None, "metadata": {}, "error": None}
+        if exact:
+            logger.info(f"Exact-token query answered lexically: {lexical_ids}")
+            plan["ranked"] = lexical_ids
+        elif candidates is not None and len(candidates) <= n_results:
+            # Every product that satisfies the constraints fits in the answer
+            plan["ranked"] = reciprocal_rank_fusion([lexical_ids, candidates])
+        plans.append(plan)
+
+    pending = [plan for plan in plans if plan["ranked"] is None]
+    vectors = {}
+    if pending:
+        # Embedded here rather than by ChromaDB so the two costs are timed separately
+        texts = list(dict.fromkeys(plan["query_text"] for plan in pending))
+        try:
+            with stage("embed"):
+                vectors = dict(zip(texts, await resilient_call("embed", "gemini", embedding_fn, texts)))
+        except Exception as e:
+            for plan in pending:
+                if plan["lexical"]:
+                    # BM25 matches are a usable answer on their own while embeddings are unavailable
+                    logger.warning(f"Query embedding failed ({e!r}), ranking lexical matches only")
+                    plan["ranked"] = plan["lexical"]
+                else:
+                    plan["error"] = e
+
+    groups = {}
+    for plan in pending:
+        if plan["query_text"] in vectors:
+            if embeddings is not None:
+                embeddings[plan["prompt"]] = vectors[plan["query_text"]]
+            groups.setdefault(json.dumps([plan["fetch"], plan["filters"]], sort_keys=True), []).append(plan)
+    for group in groups.values():
+        try:
+            with stage("vector_query"):
+                results = await run_blocking(
+                    "chroma",
+                    collection.query,
+                    query_embeddings=[vectors[plan["query_text"]] for plan in group],
+                    n_results=group[0]["fetch"],
+                    **group[0]["filters"]
+                )
+        except Exception as e:
+            for plan in group:
+                plan["error"] = e
+            continue
+        for plan, vector_ids, metadatas in zip(group, results.get("ids", []), results.get("metadatas", [])):
+            if plan["allowed"] is not None:
+                kept = [(pid, meta) for pid, meta in zip(vector_ids, metadatas) if pid in plan["allowed"]][:n_results]
+                vector_ids, metadatas = [pid for pid, _ in kept], [meta for _, meta in kept]
+            plan["metadata"] = dict(zip(vector_ids, metadatas))
+            plan["ranked"] = (
+                reciprocal_rank_fusion([vector_ids, plan["lexical"]])[:n_results] if plan["lexical"] else vector_ids
+            )
+
+    live = [plan for plan in plans if plan["error"] is None]
+    missing = list(dict.fromkeys(pid for plan in live for pid in plan["ranked"] if pid not in plan["metadata"]))
+    if missing:
+        try:
+            with stage("metadata_fetch"):
+                data = await run_blocking("chroma", collection.get, ids=missing)
+            fetched = dict(zip(data.get("ids", []), data.get("metadatas", [])))
+            for plan in live:
+                plan["metadata"].update((pid, fetched[pid]) for pid in plan["ranked"] if pid in fetched)
+        except Exception as e:
+            for plan in live:
+                if any(pid not in plan["metadata"] for pid in plan["ranked"]):
+                    plan["error"] = e
+
+    retrieved = []
+    for plan in plans:
+        if plan["error"] is not None:
+            retrieved.append(plan["error"])
+            continue
+        ranked = [pid for pid in plan["ranked"] if pid in plan["metadata"]]
+        retrieved.append((ranked, [plan["metadata"][pid] for pid in ranked]))
+    return retrieved
+
+async def retrieve_products(prompt: str, collection, n_results: int = 5):
+    """Hybrid retrieval for one prompt (see retrieve_products_batch); returns (ids, metadatas)"""
+    result = (await retrieve_products_batch([prompt], collection, n_results))[0]
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+async def load_conversation(request: PromptRequest, use_session: bool = True):
+    """
+    Conversation so far as (history, summary lines, from_session). A known session
+    supplies its stored turns and rolling summary, so clients only need to send
+    the new message; otherwise the client's chat_history is validated and used.
+    Session reads may hit SQLite (SESSION_DB_PATH), so they run off the event loop.
+    """
+    if use_session and SESSIONS and request.session_id:
+        session = await asyncio.to_thread(session_store.get, request.session_id)
+        if session is not None:
+            return session.turns, session.summary, True
+
+    valid_roles = {"user", "assistant"}
+    for msg in request.chat_history:
+        if not all(key in msg for key in ["role", "content"]) or msg["role"] not in valid_roles:
+            raise HTTPException(status_code=400, detail="Invalid chat_history format")
+    return request.chat_history[-10:], [], False
+
+async def remember_exchange(request: PromptRequest, history: List[Dict], from_session: bool, response_text: str):
+    """Store the new turn server-side; a new session is seeded with the client's history"""
+    if not SESSIONS or not request.session_id:
+        return
+    seed = [] if from_session else history
+    await asyncio.to_thread(session_store.append, request.session_id, seed + [
+        {"role": "user", "content": request.prompt},
+        {"role": "assistant", "content": response_text},
+    ])
+
+def chat_contents(request: PromptRequest, history: List[Dict], summary: List[str], retrieved):
+    """
+    Gemini chat contents for a request given its retrieval result, which is
+    (ids, metadatas) or the exception retrieval failed with.
+    Returns (chat, candidate product IDs).
+    """
+    if isinstance(retrieved, Exception):
+        logger.error(f"ChromaDB query error: {retrieved}")
+        product_ids = []
+        product_names = []
+    else:
+        product_ids, metadatas = retrieved
+        product_names = [meta.get("name", "") for meta in metadatas]
+
+    product_string = "Available products (suggest only when appropriate):\n"
+    for pid, name in zip(product_ids, product_names):
+        product_string += f"{pid}. {name}\n"
+
+    summary_string = ""
+    if summary:
+        summary_string = "Earlier in this conversation:\n" + "\n".join(summary) + "\n\n"
+
+    chat = []
+    for message in history:
+        role = "user" if message["role"] == "user" else "model"
+        chat.append({"role": role, "parts": [message["content"]]})
+
+    chat.append({
+        "role": "user",
+        "parts": [
+            "You are a fashion assistant for women's clothing. "
+            "Follow these rules strictly:\n"
+            "1. Only recommend products from the list below\n"
+            "2. Always include Product ID in format 'Product ID: 123'\n"
+            "3. Recommend max 4 products\n"
+            "4. Only suggest women's clothing\n\n"
+            f"{product_string}\n\n"
+            f"{summary_string}"
+            f"User query: {request.prompt}"
+        ]
+    })
+    return chat, product_ids
+
+async def build_chats(requests: List[PromptRequest], collection, conversations: List):
+    """
+    Retrieve candidate products for all requests in one batch and build each one's
+    Gemini chat contents. `conversations` holds (history, summary) per request.
+    Returns (chat, candidate product IDs, query embedding or None) per request; the
+    embedding retrieval computed is reused by the semantic response cache.
+    """
+    embeddings = {}
+    retrieved = await retrieve_products_batch([request.prompt for request in requests], collection,
+                                              embeddings=embeddings)
+    return [
+        (*chat_contents(request, history, summary, result), embeddings.get(request.prompt))
+        for request, (history, summary), result in zip(requests, conversations, retrieved)
+    ]
+
+async def build_chat(request: PromptRequest, collection, history: List[Dict], summary: List[str]):
+    """
+    Retrieve candidate products and build the Gemini chat contents;
+    returns (chat, candidate IDs, query embedding or None)
+    """
+    return (await build_chats([request], collection, [(history, summary)]))[0]
+
+async def generate_chatbot_response(request: PromptRequest, collection, use_session: bool = True, prepared=None):
+    """
+    Generate chatbot response - extracted from /generate-response endpoint.
+    `prepared` is ((history, summary, from_session), (chat, candidate IDs, query embedding))
+    when the caller has already loaded the conversation and retrieved products (batch requests).
     """
     logger.info("gasitaram")
     logger.info(f"Received request: {request.prompt}")
     try:
         logger.info(f"🤖 Processing chatbot request for session_id: {request.session_id}")
 
-        valid_roles = {"user", "assistant"}
-        for msg in request.chat_history:
-            if not all(key in msg for key in ["role", "content"]) or msg["role"] not in valid_roles:
-                raise HTTPException(status_code=400, detail="Invalid chat_history format")
+        start = time.perf_counter()
+        if prepared is None:
+            history, summary, from_session = await load_conversation(request, use_session)
+            chat, candidate_ids, query_embedding = await build_chat(request, collection, history, summary)
+        else:
+            (history, summary, from_session), (chat, candidate_ids, query_embedding) = prepared
 
-        limited_history = request.chat_history[-10:]
+        # Same question in other words, same history and same candidates: reuse the answer.
+        # Retrieval has usually embedded the prompt already; answered lexically, it has not.
+        cache_key = None
+        if not SEMANTIC_CACHE:
+            query_embedding = None
+        else:
+            try:
+                with stage("semantic_cache"):
+                    if query_embedding is None:
+                        query_embedding = (await resilient_call("embed", "gemini", embedding_fn, [request.prompt]))[0]
+                    cache_key = context_key([history, summary], candidate_ids)
+                    cached = response_cache.get(query_embedding, cache_key)
+            except Exception as e:
+                logger.warning(f"Semantic cache lookup failed: {e}")
+                query_embedding = cached = None
+            if cached is not None:
+                logger.info(f"⚡ Semantic cache hit for session_id: {request.session_id}")
+                products = await hydrate_products(cached["product_ids"], collection)
+                if use_session:
+                    # The raw text, as on a miss: follow-up turns rely on its Product ID lines
+                    await remember_exchange(request, history, from_session, cached["raw_response"])
+                response_cache.record_response(True, time.perf_counter() - start)
+                return {"response": cached["response"], "products": products, "product_ids": cached["product_ids"]}
 
         try:
-            results = collection.query(
-                query_texts=[request.prompt],
-                n_results=5
-            )
-            product_ids = results.get("ids", [[]])[0]
-            product_names = [meta.get("name", "") for meta in results.get("metadatas", [[]])[0]]
+            with stage("generate"):
+                response = await resilient_call("generate", "gemini", get_provider().generate, chat)
+                response_text = response.text
         except Exception as e:
-            logger.error(f"ChromaDB query error: {e}")
-            product_ids = []
-            product_names = []
-
-        product_string = "Available products (suggest only when appropriate):\n"
-        for pid, name in zip(product_ids, product_names):
-            product_string += f"{pid}. {name}\n"
-
-        chat = []
-        for message in limited_history:
-            role = "user" if message["role"] == "user" else "model"
-            chat.append({"role": role, "parts": [message["content"]]})
-
-        chat.append({
-            "role": "user",
-            "parts": [
-                "You are a fashion assistant for women's clothing. "
-                "Follow these rules strictly:\n"
-                "1. Only recommend products from the list below\n"
-                "2. Always include Product ID in format 'Product ID: 123'\n"
-                "3. Recommend max 4 products\n"
-                "4. Only suggest women's clothing\n\n"
-                f"{product_string}\n\n"
-                f"User query: {request.prompt}"
-            ]
-        })
-
-        model = genai.GenerativeModel("gemini-1.5-flash")
-        response = model.generate_content(contents=chat)
-        response_text = response.text
-
-        matched_ids = re.findall(r'Product ID:\s*(\d{1,6})', response_text)
+            # Deadline missed, retries exhausted or circuit open: answer from retrieval
+            logger.warning(f"Generation failed ({e!r}), answering from retrieved products only")
+            return await retrieval_only_response(candidate_ids, collection)
+
+        # Deduplicate while keeping order; ChromaDB rejects repeated IDs in get()
+        matched_ids = list(dict.fromkeys(PRODUCT_ID_PATTERN.findall(response_text)))
         logger.info(f"Matched product IDs: {matched_ids}")
+        cleaned_text = clean_response_text(response_text)
+        if query_embedding is not None:
+            response_cache.put(query_embedding, cache_key, {
+                "response": cleaned_text, "raw_response": response_text, "product_ids": matched_ids,
+            })
+        if use_session:
+            await remember_exchange(request, history, from_session, response_text)
 
         matched_products = []
         if matched_ids:
             try:
-                products_data = collection.get(ids=[str(pid) for pid in matched_ids])
-                matched_products = products_data.get("metadatas", [])
+                matched_products = await hydrate_products(matched_ids, collection)
             except Exception as e:
                 logger.error(f"Failed to fetch matched product metadata: {e}")
 
-        cleaned_response = re.sub(r'\n?Product ID:\s*\d{1,6}', '', response_text).strip()
-
+        if SEMANTIC_CACHE:
+            response_cache.record_response(False, time.perf_counter() - start)
         return {
-            "response": cleaned_response,
-            "products": matched_products
+            "response": cleaned_text,
+            "products": matched_products,
+            "product_ids": matched_ids
         }
 
     except Exception as e:
         logger.error(f"Chatbot response generation failed: {e}")
         return {
-            "response": "I apologize, but I'm having trouble finding products right now. Please try again.",
-            "products": []
+            "response": FALLBACK_RESPONSE,
+            "products": [],
+            "product_ids": []
         }
 
+# -------------------- Streaming Chatbot Logic --------------------
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def stream_chatbot_response(request: PromptRequest, collection):
+    """
+    Stream the chatbot answer as Server-Sent Events:
+    `token` events carry text as Gemini produces it, a `product` event is pushed
+    as soon as each recommended Product ID is resolved, and a final `done` event
+    carries the cleaned response and all products (same shape as /generate-response).
+    """
+    events = asyncio.Queue()
+    finished = object()
+    products = {}
+
+    async def resolve_product(pid: str):
+        try:
+            cards = await hydrate_products([pid], collection)
+            if cards:
+                products[pid] = cards[0]
+                await events.put(sse_event("product", {"id": pid, "product": cards[0]}))
+        except Exception as e:
+            logger.error(f"Failed to fetch product {pid} metadata: {e}")
+
+    async def produce():
+        text = ""
+        scanned = 0
+        seen = []
+        lookups = []
+        candidate_ids = []
+
+        def scan(final: bool):
+            # Only accept an ID once a non-digit follows it, so "Product ID: 12"
+            # split across chunks is not resolved as 1 or 12 prematurely
+            nonlocal scanned
+            for match in PRODUCT_ID_PATTERN.finditer(text, scanned):
+                if match.end() == len(text) and not final:
+                    break
+                scanned = match.end()
+                pid = match.group(1)
+                if pid not in seen:
+                    seen.append(pid)
+                    lookups.append(asyncio.create_task(resolve_product(pid)))
+
+        try:
+            history, summary, from_session = await load_conversation(request)
+            chat, candidate_ids, _ = await build_chat(request, collection, history, summary)
+            with stage("generate_stream"):
+                async for chunk in resilient_stream("generate_stream", "gemini", get_provider().generate, chat, stream=True):
+                    delta = chunk.text
+                    if not delta:
+                        continue
+                    text += delta
+                    await events.put(sse_event("token", {"text": delta}))
+                    scan(final=False)
+            scan(final=True)
+            await remember_exchange(request, history, from_session, text)
+            await asyncio.gather(*lookups)
+            logger.info(f"Matched product IDs: {seen}")
+            await events.put(sse_event("done", {
+                "response": clean_response_text(text),
+                "products": [products[pid] for pid in seen if pid in products],
+            }))
+        except Exception as e:
+            logger.error(f"Streaming chatbot response failed: {e}")
+            await asyncio.gather(*lookups, return_exceptions=True)
+            if not text:
+                # Nothing streamed yet, so the retrieval-only answer can stand in
+                fallback = await retrieval_only_response(candidate_ids, collection)
+                if fallback["products"]:
+                    await events.put(sse_event("token", {"text": fallback["response"]}))
+                    await events.put(sse_event("done", {
+                        "response": fallback["response"],
+                        "products": fallback["products"],
+                        "degraded": True,
+                    }))
+                    return
+            await events.put(sse_event("error", {"message": FALLBACK_RESPONSE}))
+            await events.put(sse_event("done", {"response": FALLBACK_RESPONSE, "products": []}))
+        finally:
+            await events.put(finished)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            event = await events.get()
+            if event is finished:
+                break
+            yield event
+    finally:
+        producer.cancel()
+
 # -------------------- Generate Response Endpoint --------------------
 @app.post("/generate-response")
 async def generate_response(request: PromptRequest, collection=Depends(get_chroma_collection)):
@@ -207,99 +763,509 @@ async def generate_response(request: PromptRequest, collection=Depends(get_chrom
     """
     return await generate_chatbot_response(request, collection)
 
+@app.post("/generate-response/stream")
+async def generate_response_stream(request: PromptRequest, collection=Depends(get_chroma_collection)):
+    """
+    Streaming variant of /generate-response using Server-Sent Events
+    """
+    return StreamingResponse(
+        stream_chatbot_response(request, collection),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 # -------------------- Upload File Endpoint --------------------
-@app.post("/upload-file")
-async def upload_file(file: UploadFile = File(...)):
-    logger.info("✅ Upload endpoint hit")
-    
-    # Validate file type
-    if not file.content_type.startswith("image/"):
-        raise HTTPException(status_code=400, detail="Only image files are supported")
-    
-    try:
-        # Step 1: Save uploaded image
-        upload_dir = "uploaded_files"
-        os.makedirs(upload_dir, exist_ok=True)
-        file_location = os.path.join(upload_dir, file.filename)
+UPLOAD_DIR = "uploaded_files"
+SAVE_UPLOADS = os.getenv("SAVE_UPLOADS", "false").lower() == "true"
+# "multi": OCR, keyword detection and description as separate calls; "fused": one multimodal call
+UPLOAD_PIPELINE_MODE = os.getenv("UPLOAD_PIPELINE_MODE", "multi").lower()
+
+upload_cache = UploadResultCache(
+    max_entries=int(os.getenv("UPLOAD_CACHE_SIZE", "1024")),
+    ttl_seconds=float(os.getenv("UPLOAD_CACHE_TTL_SECONDS", "86400")),
+    max_distance=int(os.getenv("UPLOAD_CACHE_PHASH_DISTANCE", "6")),
+)
 
-        with open(file_location, "wb") as f:
-            f.write(await file.read())
+def save_upload(file_location: str, data: bytes):
+    os.makedirs(os.path.dirname(file_location), exist_ok=True)
+    with open(file_location, "wb") as f:
+        f.write(data)
 
-        logger.info(f"📁 Image saved at {file_location}")
+async def run_upload_pipeline(prepared, filename: str, collection, extracted_text: str | None = None) -> dict:
+    """
+    OCR -> keyword detection -> description -> chatbot recommendations.
+    `extracted_text` skips OCR when the caller already ran it.
+    Successful results carry `product_ids` so they can be cached and re-hydrated.
+    """
+    fashion_result = None
+    if UPLOAD_PIPELINE_MODE == "fused" and extracted_text is None:
+        # Steps 2-4 in a single multimodal call; falls back to the chain below on failure
+        logger.info("🔍 Running fused image analysis...")
+        with stage("fused_analysis"):
+            fashion_result = await analyze_fashion_image(prepared.as_part())
+        if fashion_result is not None:
+            extracted_text = fashion_result.pop("extracted_text")
+        else:
+            logger.warning("Fused analysis unavailable, falling back to multi-call pipeline")
 
+    if fashion_result is None:
         # Step 2: Extract text using OCR
-        extracted_text = extract_text_from_image(file_location)
-        logger.info(f"📝 Extracted text from {file.filename} (length: {len(extracted_text)})")
+        error = None
+        if extracted_text is None:
+            try:
+                with stage("ocr"):
+                    extracted_text = await resilient_call("ocr", "ocr", extract_text_from_image, prepared)
+            except Exception as e:
+                # Retries and the OCR circuit breaker have already had their turn
+                logger.error(f"OCR failed for {filename}: {e!r}")
+                error = f"OCR extraction failed: {e!r}"
+        if error is None:
+            logger.info(f"📝 Extracted text from {filename} (length: {len(extracted_text)})")
+            if not extracted_text:
+                error = "No text found in image"
 
-        if not extracted_text or extracted_text.startswith("OCR extraction failed"):
+        if error is not None:
             return {
                 "success": False,
                 "message": "Failed to extract text from image",
-                "filename": file.filename,
-                "error": extracted_text
+                "filename": filename,
+                "error": error
             }
 
         # Step 3: Process fashion keywords using Gemini
         logger.info("🔍 Processing fashion keywords...")
         fashion_result = await process_fashion_keywords(extracted_text)
 
-        # Step 4: Get the generated product description
-        product_description = fashion_result.get("product_description", "")
-        if not product_description or fashion_result.get("keywords_found", 0) == 0:
-            return {
-                "success": False,
-                "message": "Uploaded image is not related to clothes. Please try again.",
-                "filename": file.filename,
-                "extracted_text": extracted_text.strip(),
-                "fashion_keywords": fashion_result.get("keywords", []),
-                "keywords_count": fashion_result.get("keywords_found", 0),
-                "generated_description": product_description,
-                "chatbot_response": "",
-                "recommended_products": [],
-                "total_products": 0,
-                "keyword_detection_success": False
-            }
-        
-        if not product_description:
-            return {
-                "success": False,
-                "message": "Failed to generate product description from uploaded image",
-                "filename": file.filename,
-                "error": "No product description generated"
-            }
-
-        # Step 5: Send the generated description to chatbot as user message
-        logger.info("🤖 Sending generated description to chatbot...")
-        logger.info(f"📝 Description being sent: {product_description}")
-        
-        # Create a PromptRequest with the generated description
-        chatbot_request = PromptRequest(
-            prompt=product_description,
-            chat_history=[],  # Start fresh conversation
-            session_id=f"upload_{file.filename}_{hash(file.filename) % 10000}"  # Unique session ID
-        )
-        
-        # Get ChromaDB collection
-        collection = get_chroma_collection()
-        
-        # Call the existing chatbot endpoint logic
-        chatbot_response = await generate_chatbot_response(chatbot_request, collection)
-
-        # Step 6: Return combined response
+    # Step 4: Get the generated product description
+    product_description = fashion_result.get("product_description", "")
+    if not product_description or fashion_result.get("keywords_found", 0) == 0:
         return {
-            "success": True,
-            "message": "Image processed and product recommendations generated",
-            "filename": file.filename,
+            "success": False,
+            "message": "Uploaded image is not related to clothes. Please try again.",
+            "filename": filename,
             "extracted_text": extracted_text.strip(),
             "fashion_keywords": fashion_result.get("keywords", []),
             "keywords_count": fashion_result.get("keywords_found", 0),
             "generated_description": product_description,
-            "chatbot_response": "Here are some product recommendations based on your image",
-            "recommended_products": chatbot_response.get("products", []),
-            "total_products": len(chatbot_response.get("products", [])),
-            "keyword_detection_success": fashion_result.get("success", False)
+            "chatbot_response": "",
+            "recommended_products": [],
+            "total_products": 0,
+            "keyword_detection_success": False,
+            "product_ids": []
         }
 
+    # Step 5: Send the generated description to chatbot as user message
+    logger.info("🤖 Sending generated description to chatbot...")
+    logger.info(f"📝 Description being sent: {product_description}")
+
+    # Create a PromptRequest with the generated description
+    chatbot_request = PromptRequest(
+        prompt=product_description,
+        chat_history=[],  # Start fresh conversation
+        session_id=f"upload_{filename}_{hash(filename) % 10000}"  # Unique session ID
+    )
+
+    # Call the existing chatbot endpoint logic
+    chatbot_response = await generate_chatbot_response(chatbot_request, collection, use_session=False)
+
+    # Step 6: Return combined response
+    result = {
+        "success": True,
+        "message": "Image processed and product recommendations generated",
+        "filename": filename,
+        "extracted_text": extracted_text.strip(),
+        "fashion_keywords": fashion_result.get("keywords", []),
+        "keywords_count": fashion_result.get("keywords_found", 0),
+        "generated_description": product_description,
+        "chatbot_response": "Here are some product recommendations based on your image",
+        "recommended_products": chatbot_response.get("products", []),
+        "total_products": len(chatbot_response.get("products", [])),
+        "keyword_detection_success": fashion_result.get("success", False),
+        "product_ids": chatbot_response.get("product_ids", [])
+    }
+    if chatbot_response.get("degraded"):
+        result["degraded"] = True
+    return result
+
+async def cached_upload_result(cached: dict, filename: str, collection) -> dict:
+    """
+    Rebuild a response from a cache entry, re-hydrating products by ID
+    """
+    products = []
+    if cached["product_ids"]:
+        try:
+            products = await hydrate_products(cached["product_ids"], collection)
+        except Exception as e:
+            logger.error(f"Failed to fetch cached product metadata: {e}")
+    return {
+        **cached,
+        "filename": filename,
+        "recommended_products": products,
+        "total_products": len(products),
+    }
+
+async def process_upload(data: bytes, filename: str, collection, sha256: str | None = None) -> dict:
+    """
+    Cache lookups, then preprocessing and the analysis pipeline for one image.
+    Raises HTTPException for undecodable images and pipeline failures.
+    """
+    # Identical bytes skip decoding entirely
+    sha256 = sha256 or content_hash(data)
+    cached = upload_cache.get_exact(sha256)
+    if cached is not None:
+        logger.info(f"⚡ Upload cache hit (exact) for {filename}")
+        return await cached_upload_result(cached, filename, collection)
+
+    # Step 1: Decode and shrink the upload in memory
+    try:
+        with stage("preprocess"):
+            prepared = await run_blocking("ocr", preprocess_image, data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    logger.info(
+        f"🖼️ Preprocessed {filename}: {prepared.original_bytes} -> {len(prepared.data)} bytes "
+        f"({prepared.width}x{prepared.height})"
+    )
+
+    # Re-encoded or lightly cropped copies of a known image. Different screenshots
+    # with the same layout hash alike, so a candidate is only used once OCR of
+    # this upload reads the same; otherwise the text feeds the pipeline below.
+    with stage("phash"):
+        phash = await run_blocking("ocr", perceptual_hash, prepared.data)
+    aspect = prepared.width / prepared.height
+    extracted_text = None
+    cached = upload_cache.find_similar(phash, aspect)
+    if cached is not None:
+        try:
+            with stage("ocr"):
+                extracted_text = await resilient_call("ocr", "ocr", extract_text_from_image, prepared)
+        except Exception as e:
+            logger.warning(f"Could not confirm perceptual cache match for {filename}: {e!r}")
+        confirmed = extracted_text is not None and same_text(extracted_text, cached.get("extracted_text", ""))
+        upload_cache.record_similar(confirmed)
+        if confirmed:
+            logger.info(f"⚡ Upload cache hit (perceptual) for {filename}")
+            upload_cache.put(sha256, phash, aspect, cached)
+            return await cached_upload_result(cached, filename, collection)
+    upload_cache.record_miss()
+
+    try:
+        # Keeping a copy of uploads is optional and off the OCR path
+        if SAVE_UPLOADS:
+            file_location = os.path.join(UPLOAD_DIR, os.path.basename(filename))
+            await asyncio.to_thread(save_upload, file_location, data)
+            logger.info(f"📁 Image saved at {file_location}")
+
+        result = await run_upload_pipeline(prepared, filename, collection, extracted_text)
+
+        # Only completed analyses are cached; OCR failures and retrieval-only
+        # answers are retried next time
+        if "product_ids" in result and not result.get("degraded"):
+            upload_cache.put(sha256, phash, aspect, {
+                key: value for key, value in result.items()
+                if key not in ("filename", "recommended_products", "total_products")
+            })
+        return result
+
     except Exception as e:
         logger.error(f"❌ Upload or processing failed: {e}")
-        raise HTTPException(status_code=500, detail=f"Image processing failed: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Image processing failed: {str(e)}")
+
+@app.post("/upload-file")
+async def upload_file(file: UploadFile = File(...), collection=Depends(get_chroma_collection)):
+    logger.info("✅ Upload endpoint hit")
+    
+    # Validate file type
+    if not file.content_type.startswith("image/"):
+        raise HTTPException(status_code=400, detail="Only image files are supported")
+    
+    data = await file.read()
+    return await process_upload(data, file.filename, collection)
+
+# -------------------- Batch Endpoints --------------------
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "100"))
+# Items of one batch request in their LLM / OCR stages at the same time
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+
+class BatchPromptRequest(BaseModel):
+    items: List[PromptRequest]
+
+def check_batch_size(count: int):
+    if count == 0:
+        raise HTTPException(status_code=400, detail="Batch is empty")
+    if count > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Batch exceeds {BATCH_MAX_ITEMS} items")
+
+async def stream_batch(keys: List[str], work: Dict, overlays: List[Dict] | None = None):
+    """
+    Run one task per distinct key (`work` maps key -> coroutine) and emit a `result`
+    event for every item as soon as its key's task finishes, then a final `done`
+    event. Items sharing a key (duplicate inputs) share one result, with the
+    item's own `overlays[i]` fields on top.
+    """
+    indexes = {}
+    for i, key in enumerate(keys):
+        indexes.setdefault(key, []).append(i)
+    tasks = {asyncio.ensure_future(coroutine): key for key, coroutine in work.items()}
+    try:
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                try:
+                    result = task.result()
+                except Exception as e:
+                    logger.error(f"Batch item failed: {e}")
+                    result = {"error": str(e)}
+                for i in indexes[tasks[task]]:
+                    yield sse_event("result", {"index": i, **result, **(overlays[i] if overlays else {})})
+        yield sse_event("done", {"items": len(keys), "unique": len(work)})
+    finally:
+        for task in tasks:
+            task.cancel()
+
+@app.post("/generate-response/batch")
+async def generate_response_batch(batch: BatchPromptRequest, collection=Depends(get_chroma_collection)):
+    """
+    Answer many prompts in one request, streamed back as Server-Sent Events:
+    a `result` event per item ({"index": i, ...same shape as /generate-response})
+    in completion order, then `done`. Identical items are answered once; all
+    prompts are embedded and retrieved together before generation fans out.
+    """
+    check_batch_size(len(batch.items))
+    keys = [json.dumps([item.prompt, item.chat_history, item.session_id], sort_keys=True) for item in batch.items]
+    unique = {}
+    for key, item in zip(keys, batch.items):
+        unique.setdefault(key, item)
+    items = list(unique.values())
+
+    conversations = await asyncio.gather(*(load_conversation(item) for item in items))
+    chats = await build_chats(items, collection, [(history, summary) for history, summary, _ in conversations])
+    limit = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def answer(item, conversation, chat):
+        async with limit:
+            return await generate_chatbot_response(item, collection, prepared=(conversation, chat))
+
+    work = {key: answer(item, conversation, chat) for key, item, conversation, chat in zip(unique, items, conversations, chats)}
+    return StreamingResponse(
+        stream_batch(keys, work),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.post("/upload-files")
+async def upload_files(files: List[UploadFile] = File(...), collection=Depends(get_chroma_collection)):
+    """
+    Multi-image variant of /upload-file, streamed back as Server-Sent Events: a
+    `result` event per file ({"index": i, ...same shape as /upload-file}) in
+    completion order, then `done`. Files with identical bytes are analysed once;
+    a file that fails carries `success: false` and `status_code` instead.
+    """
+    check_batch_size(len(files))
+    uploads = [(file.filename, file.content_type or "", await file.read()) for file in files]
+    keys = [content_hash(data) for _, _, data in uploads]
+    limit = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def analyse(filename: str, content_type: str, data: bytes, sha256: str):
+        if not content_type.startswith("image/"):
+            return {"success": False, "filename": filename, "status_code": 400,
+                    "message": "Only image files are supported"}
+        async with limit:
+            try:
+                return await process_upload(data, filename, collection, sha256=sha256)
+            except HTTPException as e:
+                return {"success": False, "filename": filename, "status_code": e.status_code, "message": e.detail}
+
+    work = {}
+    for key, (filename, content_type, data) in zip(keys, uploads):
+        if key not in work:
+            work[key] = analyse(filename, content_type, data, key)
+    return StreamingResponse(
+        stream_batch(keys, work, [{"filename": filename} for filename, _, _ in uploads]),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# -------------------- Upload Jobs --------------------
+# POST /upload-jobs queues an image and answers at once; a pool of workers runs
+# the /upload-file pipeline in the background. UPLOAD_JOB_WORKERS=0 only accepts
+# jobs, leaving them to worker processes sharing UPLOAD_JOB_DB_PATH.
+UPLOAD_JOB_WORKERS = int(os.getenv("UPLOAD_JOB_WORKERS", "2"))
+# How often idle workers and subscribers look for changes made by other processes
+UPLOAD_JOB_POLL_SECONDS = float(os.getenv("UPLOAD_JOB_POLL_SECONDS", "1.0"))
+
+def open_job_store() -> UploadJobStore:
+    """Opened by the lifespan, so importing this module creates no files"""
+    return UploadJobStore(
+        db_path=os.getenv("UPLOAD_JOB_DB_PATH", "./data/upload_jobs.db"),
+        max_pending=int(os.getenv("UPLOAD_JOB_QUEUE_SIZE", "100")),
+        lease_seconds=float(os.getenv("UPLOAD_JOB_LEASE_SECONDS", "120")),
+        max_attempts=int(os.getenv("UPLOAD_JOB_MAX_ATTEMPTS", "3")),
+        result_ttl_seconds=float(os.getenv("UPLOAD_JOB_RESULT_TTL_SECONDS", "3600")),
+    )
+
+# Wakes idle workers on submit and subscribers when a job finishes
+job_events = None
+
+async def notify_job_event():
+    async with job_events:
+        job_events.notify_all()
+
+async def wait_job_event():
+    async with job_events:
+        try:
+            await asyncio.wait_for(job_events.wait(), UPLOAD_JOB_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+async def run_upload_job(job: dict, collection) -> tuple:
+    try:
+        return await process_upload(job["data"], job["filename"], collection), False
+    except HTTPException as e:
+        return {"success": False, "filename": job["filename"], "status_code": e.status_code, "message": e.detail}, True
+    except Exception as e:
+        logger.error(f"❌ Upload job {job['job_id']} failed: {e}")
+        return {"success": False, "filename": job["filename"], "status_code": 500, "message": str(e)}, True
+
+async def upload_worker():
+    job_store = app.state.job_store
+    while True:
+        if not app.state.chroma.ready:
+            await asyncio.sleep(UPLOAD_JOB_POLL_SECONDS)
+            continue
+        job = await asyncio.to_thread(job_store.claim)
+        if job is None:
+            await wait_job_event()
+            continue
+        start = time.perf_counter()
+        # Read after claiming: versions may have been swapped while the claim ran
+        chroma = app.state.chroma
+        chroma.acquire()
+        request_chroma.set(chroma)
+        try:
+            result, failed = await run_upload_job(job, chroma.collection)
+        except asyncio.CancelledError:
+            await asyncio.to_thread(job_store.release, job["job_id"])
+            raise
+        finally:
+            chroma.release()
+        await asyncio.to_thread(job_store.finish, job["job_id"], result, time.perf_counter() - start, failed)
+        await notify_job_event()
+
+def start_upload_workers() -> List[asyncio.Task]:
+    global job_events
+    job_events = asyncio.Condition()
+    if UPLOAD_JOB_WORKERS:
+        logger.info(f"Starting {UPLOAD_JOB_WORKERS} upload job workers")
+    return [asyncio.create_task(upload_worker()) for _ in range(UPLOAD_JOB_WORKERS)]
+
+async def stop_upload_workers(workers: List[asyncio.Task]):
+    # Interrupted jobs go back to the queue for the next start
+    for worker in workers:
+        worker.cancel()
+    await asyncio.gather(*workers, return_exceptions=True)
+
+@app.post("/upload-jobs", status_code=202)
+async def submit_upload_job(file: UploadFile = File(...)):
+    """
+    Queue an image for the /upload-file pipeline and return its job ID at once.
+    Answers 429 with Retry-After while the queue is full.
+    """
+    if not file.content_type.startswith("image/"):
+        raise HTTPException(status_code=400, detail="Only image files are supported")
+    data = await file.read()
+    try:
+        job = await asyncio.to_thread(app.state.job_store.submit, file.filename, data, max(1, UPLOAD_JOB_WORKERS))
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    await notify_job_event()
+    return JSONResponse(job, status_code=202, headers={"Location": f"/upload-jobs/{job['job_id']}"})
+
+def get_upload_job(job_id: str) -> dict:
+    job = app.state.job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    return job
+
+@app.get("/upload-jobs/{job_id}")
+async def upload_job_status(job_id: str):
+    """
+    Job status; `result` has the /upload-file response once the job is done,
+    or `status_code` and `message` if it failed
+    """
+    return await asyncio.to_thread(get_upload_job, job_id)
+
+@app.get("/upload-jobs/{job_id}/events")
+async def upload_job_events(job_id: str):
+    """
+    Subscribe to a job: a `status` event whenever its state or queue position
+    changes, then a final `result` event with the finished job
+    """
+    job = await asyncio.to_thread(get_upload_job, job_id)
+
+    async def events(job):
+        last = None
+        while job["status"] not in (DONE, FAILED):
+            current = (job["status"], job.get("position"))
+            if current != last:
+                yield sse_event("status", job)
+                last = current
+            await wait_job_event()
+            job = await asyncio.to_thread(get_upload_job, job_id)
+        yield sse_event("result", job)
+
+    return StreamingResponse(
+        events(job),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# -------------------- Index Versions --------------------
+# Once db_store.py publishes versioned snapshots (INDEX_VERSIONED=true), each new
+# version is loaded in the background and swapped in; requests already running
+# finish on the version they started with. The version it replaced stays loaded
+# so a rollback swaps back instantly.
+INDEX_POLL_SECONDS = float(os.getenv("INDEX_POLL_SECONDS", "5"))
+
+async def swap_index_version(name: str) -> bool:
+    current = app.state.chroma
+    previous = app.state.previous_chroma
+    if previous is not None and previous.version == name and previous.ready:
+        candidate = previous
+    else:
+        candidate = ChromaResources.for_version(embedding_fn, IndexVersion(name))
+        with stage("index_load"):
+            await asyncio.to_thread(candidate.load)
+        if not candidate.ready:
+            logger.error(f"Index version {name} failed to load, staying on {current.version}: {candidate.error}")
+            candidate.close()
+            return False
+
+    app.state.chroma = candidate
+    app.state.previous_chroma = current
+    if previous is not None and previous is not candidate:
+        # Closed once the requests and jobs still pinned to it finish
+        previous.retire()
+    # Cached answers and upload results name products of the old catalog
+    response_cache.clear()
+    upload_cache.clear()
+    logger.info(f"Swapped index version {current.version} -> {name} ({candidate.item_count} items)")
+    return True
+
+async def watch_index_versions():
+    failed = None
+    while True:
+        await asyncio.sleep(INDEX_POLL_SECONDS)
+        try:
+            pointer = await asyncio.to_thread(read_pointer)
+            if pointer is None or pointer["version"] in (app.state.chroma.version, failed):
+                continue
+            if not await swap_index_version(pointer["version"]):
+                # Not retried until something else is published
+                failed = pointer["version"]
+        except Exception as e:
+            logger.error(f"Index version check failed: {e}")
+
+# Module-level setup ends here; the rest of startup runs in the lifespan
+startup_timings["setup_ms"] = round((time.perf_counter() - IMPORTS_DONE) * 1000, 2)
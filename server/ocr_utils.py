@@ -11,29 +11,25 @@
 #     except Exception as e:
 #         return f"OCR extraction failed: {e}"
 
-import google.generativeai as genai
-from PIL import Image
-import os
+from image_preprocess import PreparedImage
+from providers import get_provider
 
-# Configure Gemini API
-genai.configure(api_key=os.getenv('GOOGLE_API_KEY'))
+def extract_text_from_image(image) -> str:
+    """
+    Extract text from an image path or a PreparedImage using Gemini Vision API.
+    Errors propagate, so callers can retry them and count them against the circuit breaker.
+    """
+    # Preprocessed uploads are sent as an inline blob; paths are opened from disk
+    if isinstance(image, PreparedImage):
+        image = image.as_part()
+    else:
+        from PIL import Image
+        image = Image.open(image)
 
-def extract_text_from_image(image_path: str) -> str:
-    """Extract text from image files using Gemini Vision API"""
-    try:
-        # Initialize the model
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        
-        # Open and prepare the image
-        image = Image.open(image_path)
-        
-        # Create prompt for text extraction
-        prompt = "Extract all text from this image. Return only the text content without any additional commentary or formatting."
-        
-        # Generate response
-        response = model.generate_content([prompt, image])
-        
-        return response.text.strip()
-        
-    except Exception as e:
-        return f"OCR extraction failed: {e}"
\ No newline at end of file
+    # Create prompt for text extraction
+    prompt = "Extract all text from this image. Return only the text content without any additional commentary or formatting."
+
+    # Generate response
+    response = get_provider().vision(prompt, image)
+
+    return response.text.strip()
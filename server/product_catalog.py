@@ -0,0 +1,141 @@
+import os
+import json
+import mmap
+import shutil
+import logging
+from array import array
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CATALOG_SNAPSHOT_PATH = os.getenv("CATALOG_SNAPSHOT_PATH", "./catalog_snapshot")
+
+# Fields a product card needs, with the source keys tried in order (as in format_product)
+CARD_FIELDS = {
+    "name": ("name", "Title"),
+    "brand": ("brand",),
+    "price": ("price", "Price"),
+    "image": ("image", "image_url"),
+    "color": ("color",),
+}
+
+
+def card_values(metadata: Dict) -> List[str]:
+    values = []
+    for sources in CARD_FIELDS.values():
+        value = next((metadata[key] for key in sources if metadata.get(key) not in (None, "")), "")
+        values.append(str(value))
+    return values
+
+
+def product_card(metadata: Dict) -> Dict[str, str]:
+    """The card a snapshot lookup returns, built from raw collection metadata"""
+    return dict(zip(CARD_FIELDS, card_values(metadata or {})))
+
+
+# -------------------- Build --------------------
+class CatalogSnapshotWriter:
+    """
+    Streams product cards to disk at ingest time: field values are appended to one
+    UTF-8 blob and only their end offsets are kept in memory
+    """
+
+    def __init__(self, path: str = CATALOG_SNAPSHOT_PATH):
+        self.path = path
+        self.tmp = f"{path}.tmp"
+        shutil.rmtree(self.tmp, ignore_errors=True)
+        os.makedirs(self.tmp)
+        self._blob = open(os.path.join(self.tmp, "strings.bin"), "wb")
+        self._written = 0
+        self.offsets = array("q", [0])
+        self.ids: List[str] = []
+
+    def add(self, product_id: str, metadata: Dict):
+        self.ids.append(product_id)
+        for value in card_values(metadata):
+            encoded = value.encode("utf-8")
+            self._blob.write(encoded)
+            self._written += len(encoded)
+            self.offsets.append(self._written)
+
+    def save(self):
+        """Finish the temp directory, then swap it in so readers never see a partial snapshot"""
+        self._blob.close()
+        np.save(os.path.join(self.tmp, "offsets.npy"), np.frombuffer(self.offsets, dtype=np.int64))
+        with open(os.path.join(self.tmp, "catalog.json"), "w", encoding="utf-8") as f:
+            json.dump({"fields": list(CARD_FIELDS), "ids": self.ids}, f)
+
+        old = f"{self.path}.old"
+        shutil.rmtree(old, ignore_errors=True)
+        if os.path.exists(self.path):
+            os.replace(self.path, old)
+        os.replace(self.tmp, self.path)
+        shutil.rmtree(old, ignore_errors=True)
+        logger.info(f"Saved catalog snapshot: {len(self.ids)} products, {self._written} bytes -> {self.path}")
+
+
+# -------------------- Lookup --------------------
+class ProductCatalog:
+    """
+    Read-only product cards served from a memory-mapped snapshot. Numeric IDs
+    (the catalog's 1-based positions) resolve to rows through a dense array;
+    other IDs fall back to a dict.
+    """
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, "catalog.json"), encoding="utf-8") as f:
+            manifest = json.load(f)
+        self.fields = manifest["fields"]
+        self.ids = manifest["ids"]
+        self.size = len(self.ids)
+        self.offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+
+        with open(os.path.join(path, "strings.bin"), "rb") as f:
+            # mmap rejects empty files
+            self._blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+
+        self._dense = None
+        self._rows = None
+        if all(pid.isdigit() for pid in self.ids):
+            self._dense = np.full(max((int(pid) for pid in self.ids), default=-1) + 1, -1, dtype=np.int32)
+            self._dense[[int(pid) for pid in self.ids]] = np.arange(self.size, dtype=np.int32)
+        else:
+            self._rows = {pid: row for row, pid in enumerate(self.ids)}
+
+    @classmethod
+    def load(cls, path: str = CATALOG_SNAPSHOT_PATH):
+        """Returns None when no snapshot has been written yet"""
+        if not os.path.exists(os.path.join(path, "catalog.json")):
+            logger.info(f"No catalog snapshot at {path}, hydrating products from ChromaDB")
+            return None
+        catalog = cls(path)
+        logger.info(f"Loaded catalog snapshot: {catalog.size} products")
+        return catalog
+
+    def row(self, product_id: str) -> int:
+        if self._rows is not None:
+            return self._rows.get(product_id, -1)
+        if not product_id.isdigit() or int(product_id) >= len(self._dense):
+            return -1
+        return int(self._dense[int(product_id)])
+
+    def get(self, product_id: str) -> Optional[Dict[str, str]]:
+        row = self.row(str(product_id))
+        if row < 0:
+            return None
+        width = len(self.fields)
+        bounds = self.offsets[row * width:(row + 1) * width + 1]
+        return {
+            name: self._blob[int(bounds[i]):int(bounds[i + 1])].decode("utf-8")
+            for i, name in enumerate(self.fields)
+        }
+
+    def get_many(self, product_ids: Iterable[str]) -> Dict[str, Dict[str, str]]:
+        """Cards for the IDs that are in the snapshot, keyed by ID"""
+        cards = {}
+        for pid in product_ids:
+            card = self.get(pid)
+            if card is not None:
+                cards[str(pid)] = card
+        return cards
@@ -0,0 +1,231 @@
+import os
+import re
+import json
+import math
+import time
+import random
+import hashlib
+import logging
+import threading
+from typing import Dict, Iterator, List, Optional
+from dotenv import load_dotenv
+from fashion_lexicon import classify_fashion_text
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# "gemini" calls Google's API; "fake" is a deterministic local stand-in for load tests
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini").lower()
+GENERATION_MODEL = os.getenv("GEMINI_GENERATION_MODEL", "gemini-1.5-flash")
+
+
+class ProviderResponse:
+    """The part of a Gemini response the app reads"""
+    __slots__ = ("text",)
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+# -------------------- Gemini --------------------
+class GeminiProvider:
+    """
+    Embedding, text generation and vision through google.generativeai.
+    All methods block; callers run them via concurrency.run_blocking.
+    """
+
+    name = "gemini"
+
+    def __init__(self, api_key: Optional[str] = None):
+        import google.generativeai as genai
+        self._genai = genai
+        api_key = api_key or os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise RuntimeError("GEMINI_API_KEY not set")
+        genai.configure(api_key=api_key)
+
+    def embed(self, texts: List[str], model: str, task_type: str) -> List[List[float]]:
+        return self._genai.embed_content(model=model, content=texts, task_type=task_type)["embedding"]
+
+    def generate(self, contents, generation_config: Optional[Dict] = None, stream: bool = False,
+                 model: str = GENERATION_MODEL):
+        return self._genai.GenerativeModel(model).generate_content(
+            contents, generation_config=generation_config, stream=stream
+        )
+
+    def vision(self, prompt: str, image, generation_config: Optional[Dict] = None,
+               model: str = GENERATION_MODEL):
+        return self._genai.GenerativeModel(model).generate_content(
+            [prompt, image], generation_config=generation_config
+        )
+
+
+# -------------------- Local Fake --------------------
+class FakeProviderError(RuntimeError):
+    """Injected failure from FakeProvider; looks like a 503 to the retry policy"""
+    code = 503
+
+
+FAKE_OCR_TEXTS = [
+    "Elegant red silk saree with golden zari border, perfect for wedding",
+    "Floral print cotton maxi dress for summer casual wear",
+    "Black sequin party gown with off shoulder sleeves",
+    "Navy blue denim jacket for women, relaxed fit",
+    "Fresh organic apples 1kg pack, best before 12/08",
+    "Wireless bluetooth earbuds with charging case",
+]
+
+
+def _parse_ms(spec: str, default: float) -> Dict[str, float]:
+    """'embed=20,generate=400' -> {"embed": 20.0, "generate": 400.0}; a bare number applies to all"""
+    values = {"embed": default, "generate": default, "vision": default}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        if "=" in part:
+            op, value = part.split("=", 1)
+            values[op.strip()] = float(value)
+        else:
+            values = {op: float(part) for op in values}
+    return values
+
+
+class FakeProvider:
+    """
+    Deterministic stand-in for Gemini that needs no key or network.
+
+    Embeddings are hashed bags of words, so similar texts get similar vectors.
+    Generation recommends the first products listed in the prompt, keyword and
+    description prompts are answered from the fashion lexicon, and vision returns
+    one of a few canned OCR texts chosen by a hash of the image.
+
+    Each call sleeps for a latency drawn from a log-normal distribution around the
+    per-operation median (`sigma` 0 means constant) and fails with probability
+    `error_rate`. Draws come from a seeded RNG, so a run is reproducible.
+    """
+
+    name = "fake"
+
+    def __init__(self, latency_ms: Optional[Dict[str, float]] = None, sigma: float = 0.0,
+                 error_rate: float = 0.0, seed: int = 0, dimensions: int = 768):
+        self.latency_ms = latency_ms or {"embed": 0.0, "generate": 0.0, "vision": 0.0}
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self.dimensions = dimensions
+        self.stats = {"embed": 0, "generate": 0, "vision": 0, "errors": 0}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            latency_ms=_parse_ms(os.getenv("FAKE_PROVIDER_LATENCY_MS", "embed=20,generate=300,vision=500"), 0.0),
+            sigma=float(os.getenv("FAKE_PROVIDER_LATENCY_SIGMA", "0.25")),
+            error_rate=float(os.getenv("FAKE_PROVIDER_ERROR_RATE", "0")),
+            seed=int(os.getenv("FAKE_PROVIDER_SEED", "0")),
+        )
+
+    def _call(self, op: str):
+        with self._lock:
+            self.stats[op] += 1
+            median = self.latency_ms.get(op, 0.0)
+            delay = median * math.exp(self._rng.gauss(0, self.sigma)) if median and self.sigma else median
+            fail = self._rng.random() < self.error_rate
+            if fail:
+                self.stats["errors"] += 1
+        if delay:
+            time.sleep(delay / 1000)
+        if fail:
+            raise FakeProviderError(f"Injected {op} failure")
+
+    def _vector(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimensions
+        for token in re.findall(r"\w+", text.lower()):
+            digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+            vector[int.from_bytes(digest[:4], "big") % self.dimensions] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed(self, texts: List[str], model: str = "", task_type: str = "") -> List[List[float]]:
+        self._call("embed")
+        return [self._vector(text) for text in texts]
+
+    @staticmethod
+    def _prompt_text(contents) -> str:
+        if isinstance(contents, str):
+            return contents
+        if isinstance(contents, dict):
+            return "\n".join(FakeProvider._prompt_text(p) for p in contents.get("parts", []))
+        if isinstance(contents, (list, tuple)):
+            return "\n".join(FakeProvider._prompt_text(c) for c in contents)
+        return ""
+
+    def _answer(self, prompt: str) -> str:
+        if "Available products" in prompt:
+            # Only the product list; the numbered rules above it are not products
+            listing = prompt.split("Available products", 1)[1].partition("\n")[2].split("\n\n", 1)[0]
+            ids = re.findall(r"^(\d+)\. ", listing, flags=re.MULTILINE)[:2]
+            if not ids:
+                return "I couldn't find matching products right now."
+            return "Here are some lovely options for you.\n" + "\n".join(f"Product ID: {pid}" for pid in ids)
+        if "Text to analyze:" in prompt:
+            text = prompt.split("Text to analyze:", 1)[1].split("\n", 1)[0]
+            return json.dumps(classify_fashion_text(text).keywords)
+        if "based on these keywords:" in prompt:
+            keywords = prompt.split("based on these keywords:", 1)[1].split("\n", 1)[0].strip()
+            return f"Beautiful {keywords} piece, elegant and comfortable for any occasion."
+        return "Sure."
+
+    def generate(self, contents, generation_config: Optional[Dict] = None, stream: bool = False,
+                 model: str = GENERATION_MODEL):
+        self._call("generate")
+        text = self._answer(self._prompt_text(contents))
+        if not stream:
+            return ProviderResponse(text)
+        return self._chunks(text)
+
+    @staticmethod
+    def _chunks(text: str) -> Iterator[ProviderResponse]:
+        for piece in re.findall(r"\S+\s*", text):
+            yield ProviderResponse(piece)
+
+    def vision(self, prompt: str, image, generation_config: Optional[Dict] = None,
+               model: str = GENERATION_MODEL):
+        self._call("vision")
+        data = image.get("data", b"") if isinstance(image, dict) else repr(image).encode("utf-8")
+        text = FAKE_OCR_TEXTS[int.from_bytes(hashlib.sha256(data).digest()[:4], "big") % len(FAKE_OCR_TEXTS)]
+        if not (generation_config or {}).get("response_schema"):
+            return ProviderResponse(text)
+        # Fused analysis: fill the structured fields from the same text
+        verdict = classify_fashion_text(text)
+        is_clothing = verdict.decision == "positive"
+        return ProviderResponse(json.dumps({
+            "extracted_text": text,
+            "is_clothing": is_clothing,
+            "keywords": verdict.keywords if is_clothing else [],
+            "product_description": f"Beautiful {', '.join(verdict.keywords)} piece." if is_clothing else "",
+        }))
+
+
+# -------------------- Selection --------------------
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def get_provider():
+    """The process-wide provider selected by LLM_PROVIDER, created on first use"""
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                if LLM_PROVIDER == "fake":
+                    _provider = FakeProvider.from_env()
+                    logger.warning("Using the local fake LLM provider; responses are synthetic")
+                else:
+                    _provider = GeminiProvider()
+    return _provider
+
+
+def set_provider(provider):
+    """Replace the process-wide provider (load tests and benchmarks)"""
+    global _provider
+    with _provider_lock:
+        _provider = provider
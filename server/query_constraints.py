@@ -0,0 +1,231 @@
+import os
+import re
+import json
+import bisect
+import shutil
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+import numpy as np
+from fashion_lexicon import KeywordAutomaton, normalize
+
+logger = logging.getLogger(__name__)
+
+FILTER_INDEX_PATH = os.getenv("FILTER_INDEX_PATH", "./filter_index")
+
+# Filterable metadata keys, matched on the last segment of sanitize_metadata's flattened
+# key so that nested attributes ("attributes_Colour") are picked up too
+FILTER_FIELDS = {"color": "color", "colour": "color", "category": "category", "brand": "brand"}
+PRICE_FIELD = "price"
+
+_NUMBER = r"(?:rs\.?|inr|₹|\$)?\s*(\d[\d,]*(?:\.\d+)?)\s*(k\b)?"
+# A bare "8-10" is more likely a size than a price, so ranges need a keyword or currency
+_RANGE = re.compile(rf"(?:\b(?:between|from|price|budget)\s*|(?=\b(?:rs|inr)\b|₹|\$)){_NUMBER}\s*(?:-|to|and)\s*{_NUMBER}")
+_MAX = re.compile(
+    rf"\b(?:under|below|less than|upto|up to|within|max(?:imum)?|cheaper than|not more than|budget(?: of)?)\s*{_NUMBER}"
+)
+_MIN = re.compile(rf"\b(?:above|over|more than|min(?:imum)?|at least|starting (?:at|from))\s*{_NUMBER}")
+
+
+def _amount(digits: str, thousands: Optional[str]) -> float:
+    value = float(digits.replace(",", ""))
+    return value * 1000 if thousands else value
+
+
+def field_name(key: str) -> str:
+    return key.lower().rsplit("_", 1)[-1]
+
+
+def parse_price(value) -> Optional[float]:
+    """Numeric price from metadata that may be a number or a string like '₹1,299'"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = re.search(r"\d[\d,]*(?:\.\d+)?", str(value or ""))
+    return float(match.group().replace(",", "")) if match else None
+
+
+# -------------------- Constraints --------------------
+@dataclass
+class QueryConstraints:
+    text: str
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    values: Dict[str, List[str]] = field(default_factory=dict)  # field -> normalised values
+
+    @property
+    def empty(self) -> bool:
+        return self.min_price is None and self.max_price is None and not self.values
+
+
+def extract_price_range(prompt: str):
+    """Returns (min_price, max_price, prompt with the price phrase removed)"""
+    lowered = prompt.lower()
+    for pattern, kind in ((_RANGE, "range"), (_MAX, "max"), (_MIN, "min")):
+        match = pattern.search(lowered)
+        if not match:
+            continue
+        stripped = " ".join(f"{prompt[:match.start()]} {prompt[match.end():]}".split())
+        if kind == "range":
+            low, high = _amount(*match.group(1, 2)), _amount(*match.group(3, 4))
+            return min(low, high), max(low, high), stripped
+        if kind == "max":
+            return None, _amount(*match.group(1, 2)), stripped
+        return _amount(*match.group(1, 2)), None, stripped
+    return None, None, prompt
+
+
+# -------------------- Secondary Indexes --------------------
+class CatalogFilterIndex:
+    """
+    In-memory secondary indexes over product metadata, built once at startup
+    (or loaded from a snapshot written at ingest time): a price-sorted array for
+    range lookups and one boolean row bitmap per colour / category / brand
+    value. Also recognises those values in prompts.
+    """
+
+    def __init__(self, ids: List[str], metadatas: List[Dict]):
+        self.ids = ids
+        self.size = len(ids)
+        self.row_of = {pid: row for row, pid in enumerate(ids)}
+
+        prices = np.full(self.size, np.nan)
+        self.bitmaps: Dict[str, Dict[str, np.ndarray]] = {}
+        # field -> normalised value -> (metadata key, raw string) pairs containing it, for `where` filters
+        self.raw_values: Dict[str, Dict[str, Set[Tuple[str, str]]]] = {}
+
+        for row, meta in enumerate(metadatas):
+            for key, raw in (meta or {}).items():
+                name = field_name(key)
+                if name == PRICE_FIELD and np.isnan(prices[row]):
+                    price = parse_price(raw)
+                    if price is not None:
+                        prices[row] = price
+                    continue
+                canonical = FILTER_FIELDS.get(name)
+                if canonical is None or not isinstance(raw, str) or not raw.strip():
+                    continue
+                for part in raw.split(","):
+                    value = normalize(part)
+                    if not value:
+                        continue
+                    bitmap = self.bitmaps.setdefault(canonical, {}).get(value)
+                    if bitmap is None:
+                        bitmap = self.bitmaps[canonical][value] = np.zeros(self.size, dtype=bool)
+                    bitmap[row] = True
+                    self.raw_values.setdefault(canonical, {}).setdefault(value, set()).add((key, raw))
+
+        priced = np.flatnonzero(~np.isnan(prices))
+        order = priced[np.argsort(prices[priced], kind="stable")]
+        self.price_rows = order
+        self.sorted_prices = prices[order].tolist()
+        self._build_matcher()
+        logger.info(
+            f"Built filter index over {self.size} products: {len(self.sorted_prices)} priced, "
+            + ", ".join(f"{len(v)} {k} values" for k, v in self.bitmaps.items())
+        )
+
+    def _build_matcher(self):
+        terms = {}
+        for canonical, values in self.bitmaps.items():
+            for value in values:
+                terms.setdefault(value, canonical)
+        self._automaton = KeywordAutomaton(terms)
+
+    @classmethod
+    def from_collection(cls, collection, page_size: int = 5000):
+        ids, metadatas = [], []
+        offset = 0
+        while True:
+            page = collection.get(include=["metadatas"], limit=page_size, offset=offset)
+            ids.extend(page["ids"])
+            metadatas.extend(page["metadatas"])
+            if len(page["ids"]) < page_size:
+                return cls(ids, metadatas)
+            offset += page_size
+
+    def save(self, path: str = FILTER_INDEX_PATH):
+        """Write the indexes to a temp directory, then swap it in"""
+        tmp, old = f"{path}.tmp", f"{path}.old"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        keys = [(canonical, value) for canonical, values in self.bitmaps.items() for value in values]
+        bitmaps = np.stack([self.bitmaps[c][v] for c, v in keys]) if keys else np.zeros((0, self.size), dtype=bool)
+        np.savez(os.path.join(tmp, "arrays.npz"), price_rows=self.price_rows,
+                 sorted_prices=np.asarray(self.sorted_prices, dtype=np.float64), bitmaps=np.packbits(bitmaps, axis=1))
+        with open(os.path.join(tmp, "filter_index.json"), "w", encoding="utf-8") as f:
+            json.dump({"ids": self.ids, "keys": keys,
+                       "raw_values": [sorted(self.raw_values[c][v]) for c, v in keys]}, f)
+        shutil.rmtree(old, ignore_errors=True)
+        if os.path.exists(path):
+            os.replace(path, old)
+        os.replace(tmp, path)
+        shutil.rmtree(old, ignore_errors=True)
+        logger.info(f"Saved filter index: {self.size} products, {len(keys)} values -> {path}")
+
+    @classmethod
+    def load(cls, path: str = FILTER_INDEX_PATH):
+        """Returns None when no snapshot has been written yet"""
+        if not os.path.exists(os.path.join(path, "filter_index.json")):
+            return None
+        with open(os.path.join(path, "filter_index.json"), encoding="utf-8") as f:
+            manifest = json.load(f)
+        arrays = np.load(os.path.join(path, "arrays.npz"))
+        index = cls.__new__(cls)
+        index.ids = manifest["ids"]
+        index.size = len(index.ids)
+        index.row_of = {pid: row for row, pid in enumerate(index.ids)}
+        index.price_rows = arrays["price_rows"]
+        index.sorted_prices = arrays["sorted_prices"].tolist()
+        bitmaps = np.unpackbits(arrays["bitmaps"], axis=1, count=index.size).astype(bool)
+        index.bitmaps, index.raw_values = {}, {}
+        for (canonical, value), bitmap, raws in zip(manifest["keys"], bitmaps, manifest["raw_values"]):
+            index.bitmaps.setdefault(canonical, {})[value] = bitmap
+            index.raw_values.setdefault(canonical, {})[value] = {tuple(raw) for raw in raws}
+        index._build_matcher()
+        logger.info(f"Loaded filter index: {index.size} products, {len(manifest['keys'])} values")
+        return index
+
+    def extract(self, prompt: str) -> QueryConstraints:
+        min_price, max_price, text = extract_price_range(prompt)
+        values: Dict[str, List[str]] = {}
+        for _, value, canonical in self._automaton.find(normalize(text)):
+            if value not in values.setdefault(canonical, []):
+                values[canonical].append(value)
+        return QueryConstraints(text=text or prompt, min_price=min_price, max_price=max_price,
+                                values={k: v for k, v in values.items() if v})
+
+    def candidate_mask(self, constraints: QueryConstraints) -> np.ndarray:
+        """Rows satisfying every constraint: OR within a field, AND across fields"""
+        mask = np.ones(self.size, dtype=bool)
+        for canonical, values in constraints.values.items():
+            field_mask = np.zeros(self.size, dtype=bool)
+            for value in values:
+                field_mask |= self.bitmaps[canonical][value]
+            mask &= field_mask
+        if constraints.min_price is not None or constraints.max_price is not None:
+            low = bisect.bisect_left(self.sorted_prices, constraints.min_price) if constraints.min_price is not None else 0
+            high = (bisect.bisect_right(self.sorted_prices, constraints.max_price)
+                    if constraints.max_price is not None else len(self.sorted_prices))
+            price_mask = np.zeros(self.size, dtype=bool)
+            price_mask[self.price_rows[low:high]] = True
+            mask &= price_mask
+        return mask
+
+    def candidate_ids(self, constraints: QueryConstraints) -> List[str]:
+        return [self.ids[row] for row in np.flatnonzero(self.candidate_mask(constraints))]
+
+    def where_filter(self, constraints: QueryConstraints) -> Optional[Dict]:
+        """ChromaDB `where` clause for the categorical constraints"""
+        clauses = []
+        for canonical, values in constraints.values.items():
+            by_key: Dict[str, Set[str]] = {}
+            for value in values:
+                for key, raw in self.raw_values[canonical][value]:
+                    by_key.setdefault(key, set()).add(raw)
+            options = [{key: {"$in": sorted(raws)}} for key, raws in sorted(by_key.items())]
+            clauses.append(options[0] if len(options) == 1 else {"$or": options})
+        if not clauses:
+            return None
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
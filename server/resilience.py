@@ -0,0 +1,407 @@
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+from collections import deque
+from typing import Dict, Optional
+from concurrency import run_blocking, stream_blocking
+from telemetry import UPSTREAM_EVENTS
+
+logger = logging.getLogger(__name__)
+
+# Attempts per call, including the first (hedges are not counted)
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "3"))
+RETRY_BASE_DELAY_MS = float(os.getenv("RETRY_BASE_DELAY_MS", "100"))
+RETRY_MAX_DELAY_MS = float(os.getenv("RETRY_MAX_DELAY_MS", "2000"))
+# Every call deposits this many tokens into the shared budget and every retry or
+# hedge spends one, so extra load stays near this fraction of traffic when the
+# upstream is struggling; the per-second floor keeps retries possible at low traffic
+RETRY_BUDGET_RATIO = float(os.getenv("RETRY_BUDGET_RATIO", "0.2"))
+RETRY_BUDGET_MIN_PER_SECOND = float(os.getenv("RETRY_BUDGET_MIN_PER_SECOND", "1"))
+RETRY_BUDGET_MAX_TOKENS = float(os.getenv("RETRY_BUDGET_MAX_TOKENS", "20"))
+
+# A duplicate attempt is sent once the first has run longer than this percentile
+# of recent successful latencies for the same operation
+HEDGE = os.getenv("HEDGE", "true").lower() == "true"
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+HEDGE_WINDOW = int(os.getenv("HEDGE_WINDOW", "200"))
+
+# Consecutive transient failures that open an operation's circuit, and how long
+# it stays open before a single probe call is let through
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_COOLDOWN_SECONDS = float(os.getenv("BREAKER_COOLDOWN_SECONDS", "30"))
+
+# (per-attempt timeout, overall deadline including retries) in seconds; each can
+# be overridden with <OPERATION>_TIMEOUT_SECONDS / <OPERATION>_DEADLINE_SECONDS
+DEFAULT_DEADLINES = {
+    "embed": (3.0, 6.0),
+    "generate": (10.0, 15.0),
+    "keywords": (5.0, 8.0),
+    "description": (5.0, 8.0),
+    "vision": (15.0, 25.0),
+    "ocr": (15.0, 25.0),
+    # For streams the timeout applies to the first chunk and to each gap after it
+    "generate_stream": (10.0, 15.0),
+}
+
+# HTTP statuses of google.api_core errors worth retrying
+TRANSIENT_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class DeadlineExceeded(TimeoutError):
+    """An upstream call did not finish within its deadline"""
+
+
+class CircuitOpenError(RuntimeError):
+    """An upstream call was rejected because its circuit is open"""
+
+
+def is_transient(error: BaseException) -> bool:
+    """Timeouts, connection errors and 408/429/5xx responses; bad requests are not retried"""
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    return getattr(error, "code", None) in TRANSIENT_STATUS_CODES
+
+
+# -------------------- Retry Budget --------------------
+class RetryBudget:
+    """Token bucket shared by all operations; retries and hedges withdraw from it"""
+
+    def __init__(self, ratio: float, min_per_second: float, max_tokens: float):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+        self.stats = {"granted": 0, "denied": 0}
+        self._refilled = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, amount: float = 0.0):
+        now = time.monotonic()
+        self.tokens = min(self.max_tokens, self.tokens + amount + (now - self._refilled) * self.min_per_second)
+        self._refilled = now
+
+    def deposit(self):
+        with self._lock:
+            self._refill(self.ratio)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            self._refill()
+            if self.tokens >= 1.0:
+                self.tokens -= 1.0
+                self.stats["granted"] += 1
+                return True
+            self.stats["denied"] += 1
+            return False
+
+    def info(self) -> dict:
+        with self._lock:
+            self._refill()
+            return {**self.stats, "tokens": round(self.tokens, 2)}
+
+
+# -------------------- Circuit Breaker --------------------
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` consecutive transient failures;
+    open -> half_open after `cooldown_seconds`, admitting one probe call;
+    the probe's outcome closes the circuit again or re-opens it.
+    """
+
+    def __init__(self, failure_threshold: int, cooldown_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.cooldown:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or (self.state == "closed" and self.failures >= self.failure_threshold):
+                if self.state == "closed":
+                    logger.warning(f"Circuit opened after {self.failures} consecutive failures")
+                self.state = "open"
+                self.opened += 1
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+    def release(self):
+        """A probe was abandoned without an outcome; let the next caller probe"""
+        with self._lock:
+            self._probing = False
+
+    def info(self) -> dict:
+        return {"state": self.state, "consecutive_failures": self.failures, "times_opened": self.opened}
+
+
+# -------------------- Call Policy --------------------
+class CallPolicy:
+    """
+    Deadline, retries, hedging and circuit breaking for one kind of upstream call.
+
+    Attempts run on the shared pool via run_blocking. An attempt that misses its
+    timeout is abandoned rather than interrupted: the worker thread finishes in
+    the background, but its dependency slot is released straight away.
+    """
+
+    def __init__(self, name: str, attempt_timeout: float, deadline: float, budget: RetryBudget,
+                 max_attempts: int = RETRY_MAX_ATTEMPTS, hedge: bool = HEDGE):
+        self.name = name
+        self.attempt_timeout = attempt_timeout
+        self.deadline = deadline
+        self.budget = budget
+        self.max_attempts = max_attempts
+        self.hedge = hedge
+        self.breaker = CircuitBreaker(BREAKER_FAILURE_THRESHOLD, BREAKER_COOLDOWN_SECONDS)
+        self.stats = {
+            "calls": 0, "failures": 0, "retries": 0, "timeouts": 0,
+            "hedges": 0, "hedge_wins": 0, "rejected": 0,
+        }
+        self._latencies = deque(maxlen=HEDGE_WINDOW)
+        self._hedge_delay: Optional[float] = None
+        self._since_hedge_update = 0
+        self._lock = threading.Lock()
+
+    def _event(self, event: str):
+        with self._lock:
+            self.stats[event] += 1
+        UPSTREAM_EVENTS.inc(self.name, event)
+
+    def _observe(self, seconds: float):
+        with self._lock:
+            self._latencies.append(seconds)
+            self._since_hedge_update += 1
+            # Re-sorting the window on every call is wasted work; refresh periodically
+            if len(self._latencies) >= HEDGE_MIN_SAMPLES and (
+                self._hedge_delay is None or self._since_hedge_update >= 16
+            ):
+                ordered = sorted(self._latencies)
+                index = min(len(ordered) - 1, int(len(ordered) * HEDGE_PERCENTILE / 100))
+                self._hedge_delay = ordered[index]
+                self._since_hedge_update = 0
+
+    def hedge_delay(self) -> Optional[float]:
+        return self._hedge_delay if self.hedge else None
+
+    def backoff(self, attempt: int) -> float:
+        """Full jitter: uniform in [0, min(cap, base * 2^(attempt-1))]"""
+        ceiling = min(RETRY_MAX_DELAY_MS, RETRY_BASE_DELAY_MS * 2 ** (attempt - 1))
+        return random.uniform(0, ceiling) / 1000
+
+    async def _attempt(self, dependency: str, fn, args, kwargs, timeout: float):
+        """One attempt, plus a hedged duplicate if it runs past the hedge delay"""
+        loop = asyncio.get_running_loop()
+        expires = loop.time() + timeout
+        primary = asyncio.ensure_future(run_blocking(dependency, fn, *args, **kwargs))
+        pending = {primary}
+        try:
+            delay = self.hedge_delay()
+            if delay is not None and delay < timeout:
+                done, _ = await asyncio.wait(pending, timeout=delay)
+                if not done and self.budget.withdraw():
+                    self._event("hedges")
+                    pending.add(asyncio.ensure_future(run_blocking(dependency, fn, *args, **kwargs)))
+
+            # First success wins; an error only counts once every copy has failed
+            error = None
+            while pending:
+                remaining = expires - loop.time()
+                if remaining <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self._event("hedge_wins")
+                        return task.result()
+                    error = task.exception()
+            if not pending and error is not None:
+                raise error
+            self._event("timeouts")
+            raise DeadlineExceeded(f"{self.name} attempt exceeded {timeout:.1f}s")
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def call(self, dependency: str, fn, *args, **kwargs):
+        if not self.breaker.allow():
+            self._event("rejected")
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        self._event("calls")
+        self.budget.deposit()
+
+        loop = asyncio.get_running_loop()
+        expires = loop.time() + self.deadline
+        attempt = 0
+        try:
+            while True:
+                attempt += 1
+                timeout = min(self.attempt_timeout, expires - loop.time())
+                start = time.perf_counter()
+                try:
+                    if timeout <= 0:
+                        raise DeadlineExceeded(f"{self.name} exceeded its {self.deadline:.1f}s deadline")
+                    result = await self._attempt(dependency, fn, args, kwargs, timeout)
+                except Exception as e:
+                    if not is_transient(e):
+                        # A bad request says nothing about the upstream's health either way
+                        self.breaker.release()
+                        raise
+                    self.breaker.record_failure()
+                    pause = self.backoff(attempt)
+                    if (
+                        attempt >= self.max_attempts
+                        or self.breaker.state != "closed"
+                        or expires - loop.time() <= pause
+                        or not self.budget.withdraw()
+                    ):
+                        self._event("failures")
+                        raise
+                    self._event("retries")
+                    logger.warning(f"{self.name} attempt {attempt} failed ({e!r}), retrying in {pause * 1000:.0f}ms")
+                    await asyncio.sleep(pause)
+                    continue
+                self.breaker.record_success()
+                self._observe(time.perf_counter() - start)
+                return result
+        except asyncio.CancelledError:
+            self.breaker.release()
+            raise
+
+    def info(self) -> dict:
+        delay = self.hedge_delay()
+        return {
+            **self.stats,
+            "hedge_after_ms": round(delay * 1000, 1) if delay is not None else None,
+            "circuit": self.breaker.info(),
+        }
+
+
+# -------------------- Policies --------------------
+retry_budget = RetryBudget(RETRY_BUDGET_RATIO, RETRY_BUDGET_MIN_PER_SECOND, RETRY_BUDGET_MAX_TOKENS)
+_policies: Dict[str, CallPolicy] = {}
+_policies_lock = threading.Lock()
+
+
+def get_policy(operation: str) -> CallPolicy:
+    policy = _policies.get(operation)
+    if policy is None:
+        with _policies_lock:
+            timeout, deadline = DEFAULT_DEADLINES.get(operation, DEFAULT_DEADLINES["generate"])
+            prefix = operation.upper()
+            policy = _policies.setdefault(operation, CallPolicy(
+                operation,
+                attempt_timeout=float(os.getenv(f"{prefix}_TIMEOUT_SECONDS", timeout)),
+                deadline=float(os.getenv(f"{prefix}_DEADLINE_SECONDS", deadline)),
+                budget=retry_budget,
+            ))
+    return policy
+
+
+async def resilient_call(operation: str, dependency: str, fn, *args, **kwargs):
+    """
+    run_blocking(dependency, fn, ...) under the named operation's deadline, retry,
+    hedging and circuit breaker policy. Raises DeadlineExceeded, CircuitOpenError
+    or the last upstream error once the policy gives up.
+    """
+    return await get_policy(operation).call(dependency, fn, *args, **kwargs)
+
+
+async def resilient_stream(operation: str, dependency: str, fn, *args, **kwargs):
+    """
+    stream_blocking(dependency, fn, ...) under the named operation's policy. The
+    first chunk and every later one must each arrive within the attempt timeout,
+    and the whole stream, retries included, must finish within the deadline.
+    An attempt that fails before yielding anything is retried; once text has been
+    handed to the caller a failure ends the stream. Streams are not hedged.
+    """
+    policy = get_policy(operation)
+    if not policy.breaker.allow():
+        policy._event("rejected")
+        raise CircuitOpenError(f"{operation} circuit is open")
+    policy._event("calls")
+    policy.budget.deposit()
+
+    loop = asyncio.get_running_loop()
+    expires = loop.time() + policy.deadline
+    attempt = 0
+    try:
+        while True:
+            attempt += 1
+            stream = stream_blocking(dependency, fn, *args, **kwargs)
+            yielded = False
+            try:
+                while True:
+                    remaining = expires - loop.time()
+                    timeout = min(policy.attempt_timeout, remaining)
+                    try:
+                        if timeout <= 0:
+                            raise asyncio.TimeoutError
+                        chunk = await asyncio.wait_for(stream.__anext__(), timeout)
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError:
+                        policy._event("timeouts")
+                        if timeout < policy.attempt_timeout:
+                            raise DeadlineExceeded(f"{operation} exceeded its {policy.deadline:.1f}s deadline")
+                        raise DeadlineExceeded(f"{operation} stream stalled for {policy.attempt_timeout:.1f}s")
+                    yielded = True
+                    yield chunk
+            except Exception as e:
+                if not is_transient(e):
+                    policy.breaker.release()
+                    raise
+                policy.breaker.record_failure()
+                pause = policy.backoff(attempt)
+                if (
+                    yielded
+                    or attempt >= policy.max_attempts
+                    or policy.breaker.state != "closed"
+                    or expires - loop.time() <= pause
+                    or not policy.budget.withdraw()
+                ):
+                    policy._event("failures")
+                    raise
+                policy._event("retries")
+                logger.warning(f"{operation} stream attempt {attempt} failed ({e!r}), retrying in {pause * 1000:.0f}ms")
+                await asyncio.sleep(pause)
+                continue
+            finally:
+                await stream.aclose()
+            policy.breaker.record_success()
+            return
+    except (asyncio.CancelledError, GeneratorExit):
+        policy.breaker.release()
+        raise
+
+
+def resilience_stats() -> dict:
+    return {
+        "retry_budget": retry_budget.info(),
+        "operations": {name: policy.info() for name, policy in sorted(_policies.items())},
+    }
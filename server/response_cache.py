@@ -0,0 +1,110 @@
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Sequence
+import numpy as np
+
+
+def context_key(context, candidate_ids: Sequence[str]) -> int:
+    """
+    64-bit key for everything besides the prompt that shapes the answer: the
+    conversation context sent to the model and the retrieved candidate products
+    """
+    payload = json.dumps([context, list(candidate_ids)], sort_keys=True, default=str)
+    return int.from_bytes(hashlib.sha256(payload.encode("utf-8")).digest()[:8], "big", signed=True)
+
+
+class SemanticResponseCache:
+    """
+    Caches chatbot answers by prompt embedding. A lookup hits when a cached prompt
+    with the same context key lies within `threshold` cosine similarity; all
+    entries are scored with one matrix-vector product over a preallocated
+    float32 matrix of unit vectors.
+    LRU-bounded by `max_entries` with a TTL.
+    """
+
+    def __init__(self, max_entries: int = 2048, threshold: float = 0.95, ttl_seconds: float = 3600):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.ttl = ttl_seconds
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+        self._latency = {"lookup": [0, 0.0], "hit": [0, 0.0], "miss": [0, 0.0]}
+        self._vectors = None  # allocated on first put, once the dimension is known
+        self._keys = np.zeros(max_entries, dtype=np.int64)
+        self._created = np.full(max_entries, -np.inf)
+        self._results: List[Optional[dict]] = [None] * max_entries
+        # slot -> None, in LRU order
+        self._lru = OrderedDict()
+        self._free = list(range(max_entries - 1, -1, -1))
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _unit(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else vector
+
+    def get(self, embedding, key: int) -> Optional[dict]:
+        start = time.perf_counter()
+        with self._lock:
+            result = None
+            if self._vectors is not None and self._lru:
+                query = self._unit(embedding)
+                live = (self._keys == key) & (self._created >= time.time() - self.ttl)
+                if query.shape[0] == self._vectors.shape[1] and live.any():
+                    scores = np.where(live, self._vectors @ query, -np.inf)
+                    slot = int(np.argmax(scores))
+                    if scores[slot] >= self.threshold:
+                        self._lru.move_to_end(slot)
+                        result = self._results[slot]
+            self.stats["hits" if result is not None else "misses"] += 1
+            self._observe("lookup", time.perf_counter() - start)
+            return result
+
+    def put(self, embedding, key: int, result: dict):
+        vector = self._unit(embedding)
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+            elif vector.shape[0] != self._vectors.shape[1]:
+                return
+            if self._free:
+                slot = self._free.pop()
+            else:
+                slot, _ = self._lru.popitem(last=False)
+                self.stats["evictions"] += 1
+            self._vectors[slot] = vector
+            self._keys[slot] = key
+            self._created[slot] = time.time()
+            self._results[slot] = result
+            self._lru[slot] = None
+
+    def clear(self):
+        with self._lock:
+            self._created[:] = -np.inf
+            self._results = [None] * self.max_entries
+            self._lru.clear()
+            self._free = list(range(self.max_entries - 1, -1, -1))
+
+    def _observe(self, name: str, seconds: float):
+        self._latency[name][0] += 1
+        self._latency[name][1] += seconds
+
+    def record_response(self, hit: bool, seconds: float):
+        """End-to-end response time, to compare answered-from-cache with generated"""
+        with self._lock:
+            self._observe("hit" if hit else "miss", seconds)
+
+    def info(self) -> dict:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "entries": len(self._lru),
+            "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+            **{
+                f"avg_{name}_ms": round(total / count * 1000, 3) if count else 0.0
+                for name, (count, total) in self._latency.items()
+            },
+        }
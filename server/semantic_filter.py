@@ -1,17 +1,20 @@
 import os
 import logging
 import json
-from typing import List, Dict
+from typing import List, Dict, Optional
 from dotenv import load_dotenv
-import google.generativeai as genai
+from resilience import resilient_call
+from fashion_lexicon import classify_fashion_text
+from providers import get_provider
+from telemetry import stage
 
 # Load environment variables
 load_dotenv()
 logger = logging.getLogger(__name__)
 
-# Configure Gemini
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-genai.configure(api_key=GEMINI_API_KEY)
+# Local lexicon pre-classifier in front of the Gemini keyword call
+KEYWORD_FAST_PATH = os.getenv("KEYWORD_FAST_PATH", "true").lower() == "true"
+fast_path_stats = {"positive": 0, "negative": 0, "ambiguous": 0}
 
 async def detect_women_clothing_keywords(ocr_text: str) -> List[str]:
     """
@@ -23,8 +26,16 @@ async def detect_women_clothing_keywords(ocr_text: str) -> List[str]:
             logger.warning("Empty OCR text provided")
             return []
         
-        # Initialize NEW Gemini model instance for each call
-        model = genai.GenerativeModel("gemini-1.5-flash")
+        # Clear hits and clear misses are decided locally; only ambiguous text goes to Gemini
+        if KEYWORD_FAST_PATH:
+            verdict = classify_fashion_text(ocr_text)
+            fast_path_stats[verdict.decision] += 1
+            if verdict.decision == "positive":
+                logger.info(f"✅ Lexicon detected {len(verdict.keywords)} fashion keywords: {verdict.keywords}")
+                return verdict.keywords
+            if verdict.decision == "negative":
+                logger.info("❌ Lexicon found no fashion keywords")
+                return []
         
         # Enhanced prompt with strict validation
         prompt = f"""
@@ -57,9 +68,12 @@ async def detect_women_clothing_keywords(ocr_text: str) -> List[str]:
         """
         
         # Generate response from Gemini with temperature=0 for consistency
-        response = model.generate_content(
+        response = await resilient_call(
+            "keywords",
+            "gemini",
+            get_provider().generate,
             prompt,
-            generation_config=genai.types.GenerationConfig(
+            generation_config=dict(
                 temperature=0,  # Make it deterministic
                 top_p=1,
                 top_k=1,
@@ -126,9 +140,6 @@ async def generate_product_description(keywords: List[str]) -> str:
             logger.warning("No keywords provided for description generation")
             return ""
         
-        # Initialize NEW Gemini model instance
-        model = genai.GenerativeModel("gemini-1.5-flash")
-        
         # Create prompt for product description generation
         keywords_text = ", ".join(keywords)
         
@@ -147,9 +158,12 @@ async def generate_product_description(keywords: List[str]) -> str:
         """
         
         # Generate description
-        response = model.generate_content(
+        response = await resilient_call(
+            "description",
+            "gemini",
+            get_provider().generate,
             prompt,
-            generation_config=genai.types.GenerationConfig(
+            generation_config=dict(
                 temperature=0.3,
                 max_output_tokens=100,
             )
@@ -177,12 +191,14 @@ async def process_fashion_keywords(ocr_text: str) -> Dict:
     """
     try:
         # Step 1: Detect keywords using Gemini
-        keywords = await detect_women_clothing_keywords(ocr_text)
+        with stage("keywords"):
+            keywords = await detect_women_clothing_keywords(ocr_text)
         
         # Step 2: Only generate description if keywords found
         description = ""
         if keywords and len(keywords) > 0:
-            description = await generate_product_description(keywords)
+            with stage("description"):
+                description = await generate_product_description(keywords)
         
         # Determine success based on keywords found
         success = len(keywords) > 0 and description != ""
@@ -206,4 +222,74 @@ async def process_fashion_keywords(ocr_text: str) -> Dict:
             "keywords": [],
             "product_description": "",
             "processed_text_length": 0
-        }
\ No newline at end of file
+        }
+
+# Structured output for the single-call upload mode
+FUSED_ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "extracted_text": {"type": "string"},
+        "is_clothing": {"type": "boolean"},
+        "keywords": {"type": "array", "items": {"type": "string"}},
+        "product_description": {"type": "string"},
+    },
+    "required": ["extracted_text", "is_clothing", "keywords", "product_description"],
+}
+
+async def analyze_fashion_image(image_part: Dict) -> Optional[Dict]:
+    """
+    Fused upload mode: OCR, keyword detection and description in one Gemini Vision call
+    with schema-constrained JSON output. Returns the process_fashion_keywords result
+    plus "extracted_text", or None if the call or its output is unusable so the caller
+    can fall back to the multi-call pipeline.
+    """
+    try:
+        prompt = """
+        You are a women's fashion expert. Analyze the attached image and fill in every field.
+
+        1. extracted_text: all text in the image, without commentary or formatting
+        2. is_clothing: true only if that text clearly mentions women's clothing items
+        3. keywords: lowercase women's clothing keywords found in the text - clothing types,
+           colors, materials, styles, fits, patterns and event words (wedding, party, casual,
+           formal, office, bridal, cocktail, evening, festival, celebration).
+           Do NOT include accessories like bags, shoes, jewelry. Empty if is_clothing is false.
+        4. product_description: if is_clothing is true, ONE natural product description
+           (1-2 sentences) using appealing words like "Beautiful", "Elegant", "Stunning",
+           incorporating the keywords and mentioning the occasion if one is present.
+           Empty if is_clothing is false.
+        """
+
+        response = await resilient_call(
+            "vision",
+            "ocr",
+            get_provider().vision,
+            prompt,
+            image_part,
+            generation_config=dict(
+                temperature=0,
+                response_mime_type="application/json",
+                response_schema=FUSED_ANALYSIS_SCHEMA,
+            )
+        )
+        analysis = json.loads(response.text)
+
+        extracted_text = (analysis.get("extracted_text") or "").strip()
+        keywords = [kw.strip().lower() for kw in analysis.get("keywords", []) if kw and kw.strip()]
+        description = (analysis.get("product_description") or "").strip().strip('"\'')
+        if not analysis.get("is_clothing"):
+            keywords, description = [], ""
+
+        logger.info(f"Fused analysis: {len(keywords)} keywords, description: {description}")
+
+        return {
+            "extracted_text": extracted_text,
+            "success": len(keywords) > 0 and description != "",
+            "keywords_found": len(keywords),
+            "keywords": keywords,
+            "product_description": description,
+            "processed_text_length": len(extracted_text)
+        }
+
+    except Exception as e:
+        logger.error(f"Fused image analysis failed: {e}")
+        return None
@@ -0,0 +1,182 @@
+import re
+import json
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PRODUCT_ID_PATTERN = re.compile(r"Product ID:\s*(\d{1,6})")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token), enough for budgeting"""
+    return len(text) // 4 + 1
+
+
+def summarize_turn(message: Dict[str, str], max_chars: int = 160) -> str:
+    """
+    One summary line for a compacted turn: the start of the message, plus the
+    product IDs an assistant turn recommended
+    """
+    ids = list(dict.fromkeys(PRODUCT_ID_PATTERN.findall(message["content"])))
+    content = " ".join(PRODUCT_ID_PATTERN.sub("", message["content"]).split())
+    line = content if len(content) <= max_chars else content[:max_chars].rsplit(" ", 1)[0] + "..."
+    if message["role"] == "assistant":
+        if ids:
+            line += f" [recommended {', '.join(ids)}]"
+        return f"Assistant: {line}"
+    return f"User: {line}"
+
+
+@dataclass
+class Session:
+    session_id: str
+    turns: List[Dict[str, str]] = field(default_factory=list)
+    summary: List[str] = field(default_factory=list)
+    updated: float = field(default_factory=time.time)
+
+
+# -------------------- Session Store --------------------
+class SessionStore:
+    """
+    Server-side conversation state keyed by session_id. Recent turns are kept
+    verbatim up to `token_budget`; older turns are compacted into a rolling
+    summary capped at `summary_budget` tokens.
+
+    Sessions live in an in-memory LRU bounded by `max_sessions` and expire
+    after `idle_ttl_seconds` without activity. With `db_path` they are kept in
+    SQLite instead, so they survive restarts and are shared by every worker
+    pointing at the same file.
+    """
+
+    def __init__(self, max_sessions: int = 10000, idle_ttl_seconds: float = 3600,
+                 token_budget: int = 1500, summary_budget: int = 300, db_path: Optional[str] = None):
+        self.max_sessions = max_sessions
+        self.ttl = idle_ttl_seconds
+        self.token_budget = token_budget
+        self.summary_budget = summary_budget
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "compacted_turns": 0}
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session_id TEXT PRIMARY KEY, turns TEXT NOT NULL, summary TEXT NOT NULL, updated REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS sessions_updated ON sessions(updated)")
+            self._db.commit()
+            self._purge_disk()
+
+    def _expired(self, session: Session) -> bool:
+        return time.time() - session.updated > self.ttl
+
+    def _load(self, session_id: str) -> Optional[Session]:
+        if self._db is not None:
+            row = self._db.execute(
+                "SELECT turns, summary, updated FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            return Session(session_id, json.loads(row[0]), json.loads(row[1]), row[2])
+        session = self._memory.get(session_id)
+        if session is not None:
+            self._memory.move_to_end(session_id)
+        return session
+
+    def _save(self, session: Session):
+        if self._db is not None:
+            self._db.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, turns, summary, updated) VALUES (?, ?, ?, ?)",
+                (session.session_id, json.dumps(session.turns), json.dumps(session.summary), session.updated),
+            )
+            self._db.commit()
+            self._trim_disk()
+            return
+        self._memory[session.session_id] = session
+        self._memory.move_to_end(session.session_id)
+        while len(self._memory) > self.max_sessions:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def get(self, session_id: str) -> Optional[Session]:
+        with self._lock:
+            session = self._load(session_id)
+            if session is not None and self._expired(session):
+                self._delete(session_id)
+                session = None
+            self.stats["hits" if session is not None else "misses"] += 1
+            return session
+
+    def append(self, session_id: str, messages: List[Dict[str, str]]):
+        """Add turns to a session (creating it), then compact it back under budget"""
+        with self._lock:
+            if self._db is not None:
+                # Read-modify-write under the database write lock, shared with other workers
+                self._db.execute("BEGIN IMMEDIATE")
+            try:
+                session = self._load(session_id)
+                if session is None or self._expired(session):
+                    session = Session(session_id)
+                session.turns.extend({"role": m["role"], "content": m["content"]} for m in messages)
+                self._compact(session)
+                session.updated = time.time()
+                self._save(session)
+            except Exception:
+                # Never leave the write lock held on the shared connection
+                if self._db is not None and self._db.in_transaction:
+                    self._db.rollback()
+                raise
+
+    def _compact(self, session: Session):
+        # Always keep the latest exchange verbatim, even if it alone exceeds the budget
+        while len(session.turns) > 2 and sum(estimate_tokens(m["content"]) for m in session.turns) > self.token_budget:
+            session.summary.append(summarize_turn(session.turns.pop(0)))
+            self.stats["compacted_turns"] += 1
+        while session.summary and sum(estimate_tokens(line) for line in session.summary) > self.summary_budget:
+            session.summary.pop(0)
+
+    def _delete(self, session_id: str):
+        if self._db is not None:
+            self._db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self._db.commit()
+        else:
+            self._memory.pop(session_id, None)
+
+    def _trim_disk(self):
+        excess = self._db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0] - self.max_sessions
+        if excess > 0:
+            self._db.execute(
+                "DELETE FROM sessions WHERE session_id IN "
+                "(SELECT session_id FROM sessions ORDER BY updated LIMIT ?)",
+                (excess,),
+            )
+            self._db.commit()
+            self.stats["evictions"] += excess
+
+    def _purge_disk(self):
+        with self._lock:
+            cur = self._db.execute("DELETE FROM sessions WHERE updated < ?", (time.time() - self.ttl,))
+            self._db.commit()
+            if cur.rowcount:
+                logger.info(f"Purged {cur.rowcount} idle sessions from disk")
+
+    def info(self) -> dict:
+        if self._db is not None:
+            with self._lock:
+                sessions = self._db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        else:
+            sessions = len(self._memory)
+        return {**self.stats, "sessions": sessions, "persistent": self._db is not None}
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
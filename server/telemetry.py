@@ -0,0 +1,218 @@
+import os
+import json
+import time
+import uuid
+import random
+import logging
+import threading
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Requests slower than this are candidates for a logged trace
+SLOW_TRACE_MS = float(os.getenv("SLOW_TRACE_MS", "3000"))
+# Fraction of slow requests whose stage breakdown is logged and kept (0 disables)
+SLOW_TRACE_SAMPLE_RATE = float(os.getenv("SLOW_TRACE_SAMPLE_RATE", "1.0"))
+SLOW_TRACE_KEEP = int(os.getenv("SLOW_TRACE_KEEP", "50"))
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+# -------------------- Metrics --------------------
+def _labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in values)
+    return ",".join(f'{name}="{value}"' for name, value in zip(names, escaped))
+
+
+class Histogram:
+    """Prometheus-style cumulative histogram keyed by label values"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float, *labelvalues: str):
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += seconds
+            series[2] += 1
+
+    def expose(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+        for labelvalues, (counts, total, count) in sorted(series.items()):
+            labels = _labels(self.labelnames, labelvalues)
+            prefix = f"{labels}," if labels else ""
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{self.name}_bucket{{{prefix}le="{le}"}} {cumulative}')
+            suffix = f"{{{labels}}}" if labels else ""
+            lines.append(f"{self.name}_sum{suffix} {total}")
+            lines.append(f"{self.name}_count{suffix} {count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def expose(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values)
+        for labelvalues, value in sorted(values.items()):
+            labels = _labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}{{{labels}}} {value}" if labels else f"{self.name} {value}")
+        return lines
+
+
+STAGE_SECONDS = Histogram("app_stage_duration_seconds", "Time spent in each pipeline stage", ["stage"])
+STAGE_ERRORS = Counter("app_stage_errors_total", "Pipeline stages that raised", ["stage"])
+REQUEST_SECONDS = Histogram(
+    "app_http_request_duration_seconds", "Time to response headers by route", ["method", "route", "status"]
+)
+UPSTREAM_EVENTS = Counter(
+    "app_upstream_events_total", "Retries, hedges, timeouts and circuit breaker rejections by operation",
+    ["operation", "event"],
+)
+METRICS = [STAGE_SECONDS, STAGE_ERRORS, REQUEST_SECONDS, UPSTREAM_EVENTS]
+
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text exposition format"""
+    return "\n".join(line for metric in METRICS for line in metric.expose()) + "\n"
+
+
+# -------------------- Request Traces --------------------
+class RequestTrace:
+    __slots__ = ("request_id", "method", "path", "start", "stages")
+
+    def __init__(self, request_id: str, method: str, path: str):
+        self.request_id = request_id
+        self.method = method
+        self.path = path
+        self.start = time.perf_counter()
+        self.stages: List[Tuple[str, float]] = []
+
+    def server_timing(self) -> str:
+        """Server-Timing header value; repeated stages are summed, in first-seen order"""
+        totals: Dict[str, float] = {}
+        for name, seconds in self.stages:
+            totals[name] = totals.get(name, 0.0) + seconds
+        entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in totals.items()]
+        entries.append(f"total;dur={(time.perf_counter() - self.start) * 1000:.1f}")
+        return ", ".join(entries)
+
+
+_current_trace: ContextVar[Optional[RequestTrace]] = ContextVar("current_trace", default=None)
+slow_traces = deque(maxlen=SLOW_TRACE_KEEP)
+
+
+def current_request_id() -> Optional[str]:
+    trace = _current_trace.get()
+    return trace.request_id if trace is not None else None
+
+
+@contextmanager
+def stage(name: str):
+    """Time a pipeline step into the stage histogram and the current request's trace"""
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(name)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, name)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.stages.append((name, elapsed))
+
+
+def _finish(trace: RequestTrace, route: str, status: int):
+    total = time.perf_counter() - trace.start
+    if total * 1000 < SLOW_TRACE_MS or random.random() >= SLOW_TRACE_SAMPLE_RATE:
+        return
+    record = {
+        "request_id": trace.request_id,
+        "method": trace.method,
+        "route": route,
+        "status": status,
+        "total_ms": round(total * 1000, 1),
+        "stages": [(name, round(seconds * 1000, 1)) for name, seconds in trace.stages],
+    }
+    slow_traces.append(record)
+    logger.warning(f"Slow request trace: {json.dumps(record)}")
+
+
+# -------------------- ASGI Middleware --------------------
+class TelemetryMiddleware:
+    """
+    Assigns every HTTP request an ID (honouring an incoming X-Request-ID), collects
+    its stage timings, and adds X-Request-ID and Server-Timing to the response.
+    Streaming responses report the stages finished before their headers went out.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for key, value in scope.get("headers", []):
+            if key == b"x-request-id":
+                request_id = value.decode("latin-1")[:128]
+                break
+        trace = RequestTrace(request_id or uuid.uuid4().hex, scope["method"], scope["path"])
+        token = _current_trace.set(trace)
+        status = 500
+
+        async def send_with_headers(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                route = getattr(scope.get("route"), "path", "unmatched")
+                REQUEST_SECONDS.observe(time.perf_counter() - trace.start, trace.method, route, str(status))
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [
+                    (b"x-request-id", trace.request_id.encode("latin-1")),
+                    (b"server-timing", trace.server_timing().encode("latin-1")),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            _current_trace.reset(token)
+            _finish(trace, getattr(scope.get("route"), "path", "unmatched"), status)
@@ -0,0 +1,14 @@
+import os
+import sys
+import tempfile
+
+# The server modules are imported top-level, as when running from server/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Local fake provider, no telemetry, and nothing written into the working tree
+_state_dir = tempfile.mkdtemp(prefix="server-tests-")
+os.environ.setdefault("ANONYMIZED_TELEMETRY", "False")
+os.environ.setdefault("LLM_PROVIDER", "fake")
+os.environ.setdefault("FAKE_PROVIDER_LATENCY_MS", "0")
+os.environ.setdefault("SEMANTIC_CACHE", "false")
+os.environ.setdefault("UPLOAD_JOB_DB_PATH", os.path.join(_state_dir, "upload_jobs.db"))
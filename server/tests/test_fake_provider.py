@@ -0,0 +1,80 @@
+import asyncio
+
+import main
+from providers import FakeProvider
+
+RETRIEVED_IDS = ["17", "42", "305"]
+
+
+class StubCollection:
+    """Returns fixed neighbours, as ChromaDB would for any query"""
+
+    def query(self, query_embeddings=None, n_results=5, **kwargs):
+        metadatas = [{"name": f"Product {pid}", "id": pid} for pid in RETRIEVED_IDS]
+        return {"ids": [RETRIEVED_IDS] * len(query_embeddings), "metadatas": [metadatas] * len(query_embeddings)}
+
+    def get(self, ids=None, **kwargs):
+        return {"ids": list(ids), "metadatas": [{"name": f"Product {pid}", "id": pid} for pid in ids]}
+
+
+def test_fake_answer_recommends_listed_products_not_rules():
+    metadatas = [{"name": f"Product {pid}"} for pid in RETRIEVED_IDS]
+    request = main.PromptRequest(prompt="red dress", chat_history=[])
+    chat, _ = main.chat_contents(request, [], [], (RETRIEVED_IDS, metadatas))
+
+    text = FakeProvider().generate(chat).text
+
+    assert main.PRODUCT_ID_PATTERN.findall(text) == ["17", "42"]
+
+
+def test_fake_answer_without_products():
+    request = main.PromptRequest(prompt="red dress", chat_history=[])
+    chat, _ = main.chat_contents(request, [], [], ([], []))
+
+    assert main.PRODUCT_ID_PATTERN.findall(FakeProvider().generate(chat).text) == []
+
+
+def test_chatbot_response_ids_come_from_retrieval(monkeypatch):
+    monkeypatch.setattr(main, "HYBRID_RETRIEVAL", False)
+    monkeypatch.setattr(main, "QUERY_FILTERS", False)
+    request = main.PromptRequest(prompt="floral summer dress", chat_history=[])
+
+    result = asyncio.run(main.generate_chatbot_response(request, StubCollection(), use_session=False))
+
+    assert result["product_ids"]
+    assert set(result["product_ids"]) <= set(RETRIEVED_IDS)
+    assert [product["name"] for product in result["products"]] == [f"Product {pid}" for pid in result["product_ids"]]
+
+
+def test_fallback_cards_match_snapshot_cards():
+    # No catalog snapshot is loaded here, so cards come from collection metadata
+    cards = asyncio.run(main.hydrate_products(["17"], StubCollection()))
+
+    assert cards == [{"name": "Product 17", "brand": "", "price": "", "image": "", "color": ""}]
+
+
+def test_cache_hit_remembers_the_same_turn_as_a_miss(monkeypatch):
+    from response_cache import SemanticResponseCache
+    from session_store import SessionStore
+
+    monkeypatch.setattr(main, "HYBRID_RETRIEVAL", False)
+    monkeypatch.setattr(main, "QUERY_FILTERS", False)
+    monkeypatch.setattr(main, "SEMANTIC_CACHE", True)
+    monkeypatch.setattr(main, "SESSIONS", True)
+    monkeypatch.setattr(main, "response_cache", SemanticResponseCache(max_entries=8))
+    monkeypatch.setattr(main, "session_store", SessionStore())
+
+    async def ask(session_id):
+        request = main.PromptRequest(prompt="floral summer dress", session_id=session_id)
+        return await main.generate_chatbot_response(request, StubCollection())
+
+    async def run():
+        return await ask("miss"), await ask("hit")
+
+    missed, hit = asyncio.run(run())
+
+    assert main.response_cache.stats["hits"] == 1
+    assert hit == missed
+    stored = [main.session_store.get(sid).turns[-1]["content"] for sid in ("miss", "hit")]
+    assert stored[0] == stored[1]
+    assert main.PRODUCT_ID_PATTERN.findall(stored[1]) == missed["product_ids"]
@@ -0,0 +1,21 @@
+import time
+
+from job_queue import DONE, UploadJobStore
+
+
+def test_finished_jobs_expire_after_their_ttl(tmp_path):
+    store = UploadJobStore(db_path=str(tmp_path / "jobs.db"), result_ttl_seconds=0.2)
+    try:
+        finished = store.submit("dress.jpg", b"image")["job_id"]
+        store.finish(store.claim()["job_id"], {"status_code": 200}, seconds=0.1)
+        assert store.get(finished)["status"] == DONE
+
+        time.sleep(0.3)
+        # Reported as gone straight away, and deleted by the next claim
+        assert store.get(finished) is None
+        queued = store.submit("saree.jpg", b"image")["job_id"]
+        assert store.claim()["job_id"] == queued
+        assert store._db.execute("SELECT COUNT(*) FROM upload_jobs WHERE job_id = ?", (finished,)).fetchone()[0] == 0
+        assert store.info()[DONE] == 0
+    finally:
+        store.close()
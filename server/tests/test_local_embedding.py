@@ -0,0 +1,129 @@
+import struct
+
+import numpy as np
+import pytest
+
+pytest.importorskip("onnxruntime")
+pytest.importorskip("tokenizers")
+
+from chroma_store import EmbeddingBackendMismatch, open_collection
+from local_embedding import OnnxEmbeddingFunction
+
+WORDS = ["red", "blue", "silk", "cotton", "saree", "dress", "with", "border", "dimension", "probe"]
+VOCAB = {"[PAD]": 0, "[UNK]": 1, **{word: i + 2 for i, word in enumerate(WORDS)}}
+
+# ---- Tiny ONNX model ----
+# ModelProto is written field by field so the test needs onnxruntime only, not the onnx package.
+# The graph is a single Gather over an embedding table: input_ids [batch, seq] -> [batch, seq, dims],
+# the shape of a transformer's last_hidden_state.
+
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte, value = value & 0x7F, value >> 7
+        out.append(byte | (0x80 if value else 0))
+        if not value:
+            return bytes(out)
+
+
+def _int(field: int, value: int) -> bytes:
+    return _varint(field << 3) + _varint(value)
+
+
+def _bytes(field: int, value) -> bytes:
+    value = value.encode("utf-8") if isinstance(value, str) else value
+    return _varint(field << 3 | 2) + _varint(len(value)) + value
+
+
+def _value_info(name: str, elem_type: int, dims) -> bytes:
+    shape = b"".join(_bytes(1, _bytes(2, d) if isinstance(d, str) else _int(1, d)) for d in dims)
+    return _bytes(1, name) + _bytes(2, _bytes(1, _int(1, elem_type) + _bytes(2, shape)))
+
+
+def tiny_model(table: np.ndarray) -> bytes:
+    FLOAT, INT64 = 1, 7
+    initializer = (_int(1, table.shape[0]) + _int(1, table.shape[1]) + _int(2, FLOAT)
+                   + _bytes(8, "embeddings") + _bytes(9, table.astype("<f4").tobytes()))
+    node = _bytes(1, "embeddings") + _bytes(1, "input_ids") + _bytes(2, "last_hidden_state") + _bytes(4, "Gather")
+    graph = (_bytes(1, node) + _bytes(2, "tiny") + _bytes(5, initializer)
+             + _bytes(11, _value_info("input_ids", INT64, ["batch", "seq"]))
+             + _bytes(11, _value_info("attention_mask", INT64, ["batch", "seq"]))
+             + _bytes(12, _value_info("last_hidden_state", FLOAT, ["batch", "seq", table.shape[1]])))
+    return _int(1, 8) + _bytes(7, graph) + _bytes(8, _bytes(1, "") + _int(2, 13))
+
+
+@pytest.fixture
+def make_model(tmp_path):
+    """Write model.onnx and a word-level tokenizer.json into tmp_path/<name>; returns (dir, table)"""
+    from tokenizers import Tokenizer
+    from tokenizers.models import WordLevel
+    from tokenizers.pre_tokenizers import Whitespace
+
+    def make(name: str = "tiny-model", dims: int = 8):
+        model_dir = tmp_path / name
+        model_dir.mkdir()
+        table = np.random.default_rng(dims).normal(size=(len(VOCAB), dims)).astype(np.float32)
+        (model_dir / "model.onnx").write_bytes(tiny_model(table))
+        tokenizer = Tokenizer(WordLevel(VOCAB, unk_token="[UNK]"))
+        tokenizer.pre_tokenizer = Whitespace()
+        tokenizer.save(str(model_dir / "tokenizer.json"))
+        return str(model_dir), table
+
+    return make
+
+
+def mean_of(table: np.ndarray, text: str) -> np.ndarray:
+    vector = table[[VOCAB.get(word, 1) for word in text.split()]].mean(axis=0)
+    return vector / np.linalg.norm(vector)
+
+
+# ---- Tests ----
+def test_onnx_embeddings_shape_and_signature(make_model):
+    model_dir, _ = make_model(dims=8)
+    embed = OnnxEmbeddingFunction(model_dir=model_dir, max_batch_size=2)
+
+    vectors = embed(["red dress", "blue silk saree with border", "cotton dress"])
+
+    assert embed.dimensions == 8
+    assert np.array(vectors).shape == (3, 8)
+    assert embed.signature == {"embedding_backend": "onnx", "embedding_model": "tiny-model", "embedding_dimensions": 8}
+
+
+def test_onnx_mean_pooling_is_l2_normalised_and_ignores_padding(make_model):
+    model_dir, table = make_model()
+    embed = OnnxEmbeddingFunction(model_dir=model_dir, pooling="mean")
+    texts = ["red dress", "blue silk saree with border"]
+
+    # Sharing a chunk pads "red dress" to the longer text; padding must not move its vector
+    vectors = np.array(embed.embed_batch(texts))
+    alone = np.array(embed.embed_batch(["red dress"]))[0]
+
+    np.testing.assert_allclose(np.linalg.norm(vectors, axis=1), 1.0, rtol=1e-5)
+    np.testing.assert_allclose(vectors[0], alone, rtol=1e-5, atol=1e-6)
+    for text, vector in zip(texts, vectors):
+        np.testing.assert_allclose(vector, mean_of(table, text), rtol=1e-5, atol=1e-6)
+
+
+def test_onnx_cls_pooling_takes_first_token(make_model):
+    model_dir, table = make_model()
+    embed = OnnxEmbeddingFunction(model_dir=model_dir, pooling="cls")
+
+    vector = np.array(embed(["silk saree"])[0])
+
+    np.testing.assert_allclose(vector, mean_of(table, "silk"), rtol=1e-5, atol=1e-6)
+
+
+def test_collection_rejects_a_different_embedding_signature(make_model, tmp_path):
+    built_with = OnnxEmbeddingFunction(model_dir=make_model("tiny-model", dims=8)[0])
+    served_with = OnnxEmbeddingFunction(model_dir=make_model("other-model", dims=4)[0])
+    chroma_path = str(tmp_path / "chroma")
+
+    _, collection = open_collection(built_with, path=chroma_path, name="products")
+    collection.add(ids=["1"], documents=["red silk saree"])
+
+    with pytest.raises(EmbeddingBackendMismatch, match="embedding_model=tiny-model"):
+        open_collection(served_with, path=chroma_path, name="products")
+    # The embedder it was built with still opens it
+    _, reopened = open_collection(built_with, path=chroma_path, name="products")
+    assert reopened.count() == 1
@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+import resilience
+from embedding import EmbeddingError, GeminiEmbeddingFunction, MicroBatchingEmbedder
+from providers import FakeProvider
+from resilience import CircuitOpenError, resilient_call
+
+
+@pytest.fixture(autouse=True)
+def fresh_policies(monkeypatch):
+    monkeypatch.setattr(resilience, "_policies", {})
+    monkeypatch.setattr(resilience, "RETRY_BASE_DELAY_MS", 1.0)
+
+
+async def call_repeatedly(operation: str, fn, times: int):
+    errors = []
+    for _ in range(times):
+        with pytest.raises(Exception) as raised:
+            await resilient_call(operation, "gemini", fn, ["red silk saree"])
+        errors.append(raised.value)
+    return errors
+
+
+def test_failing_embeds_are_retried_and_open_the_circuit():
+    embed = GeminiEmbeddingFunction(provider=FakeProvider(error_rate=1.0))
+
+    errors = asyncio.run(call_repeatedly("embed", embed, 7))
+
+    info = resilience.get_policy("embed").info()
+    assert isinstance(errors[0], EmbeddingError) and errors[0].code == 503
+    assert info["retries"] > 0
+    assert info["circuit"]["state"] == "open"
+    assert isinstance(errors[-1], CircuitOpenError)
+
+
+def test_micro_batched_embed_failures_keep_their_status():
+    embed = MicroBatchingEmbedder(GeminiEmbeddingFunction(provider=FakeProvider(error_rate=1.0)), max_wait_ms=0)
+    try:
+        with pytest.raises(EmbeddingError) as raised:
+            embed(["red silk saree"])
+    finally:
+        embed.close()
+    assert resilience.is_transient(raised.value)
+
+
+def test_bad_requests_leave_the_circuit_alone():
+    def flaky(texts):
+        raise TimeoutError("upstream timed out")
+
+    def invalid(texts):
+        raise ValueError("bad request")
+
+    async def run():
+        await call_repeatedly("embed", flaky, 1)
+        await call_repeatedly("embed", invalid, 1)
+
+    asyncio.run(run())
+
+    info = resilience.get_policy("embed").info()
+    assert info["retries"] == 2
+    assert info["circuit"]["consecutive_failures"] == 3
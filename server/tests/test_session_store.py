@@ -0,0 +1,22 @@
+import pytest
+
+from session_store import SessionStore
+
+
+def test_failed_append_releases_the_write_lock(tmp_path):
+    store = SessionStore(db_path=str(tmp_path / "sessions.db"))
+    try:
+        with pytest.raises(KeyError):
+            store.append("broken", [{"role": "user"}])
+        assert not store._db.in_transaction
+
+        # Both this connection and another writer on the same file can still write
+        store.append("s1", [{"role": "user", "content": "red dress"}])
+        other = SessionStore(db_path=str(tmp_path / "sessions.db"))
+        other._db.execute("PRAGMA busy_timeout = 100")
+        other.append("s2", [{"role": "user", "content": "blue saree"}])
+        other.close()
+        assert store.get("broken") is None
+        assert store.get("s1").turns == [{"role": "user", "content": "red dress"}]
+    finally:
+        store.close()
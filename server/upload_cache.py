@@ -0,0 +1,131 @@
+import io
+import re
+import time
+import hashlib
+import difflib
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+# OCR texts at least this similar count as the same image
+TEXT_MATCH_RATIO = 0.9
+# Relative aspect ratio difference tolerated between perceptual matches
+ASPECT_TOLERANCE = 0.05
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def perceptual_hash(data: bytes) -> int:
+    """
+    64-bit difference hash: compares neighbouring pixels of a 9x8 grayscale
+    thumbnail, so re-encoded, resized or lightly cropped copies land within a
+    few bits of each other
+    """
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(data))
+    image.draft("L", (64, 64))
+    pixels = list(image.convert("L").resize((9, 8), Image.LANCZOS).getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+def same_text(a: str, b: str) -> bool:
+    """
+    Whether two OCR results read the same, ignoring case and whitespace.
+    Screenshots that share a layout hash alike, so a perceptual match only
+    counts once the text agrees too.
+    """
+    a, b = (re.sub(r"\s+", " ", text).strip().lower() for text in (a or "", b or ""))
+    if not a or not b:
+        return False
+    return a == b or difflib.SequenceMatcher(None, a, b).ratio() >= TEXT_MATCH_RATIO
+
+
+class UploadResultCache:
+    """
+    Caches upload pipeline results (OCR text, keywords, description and
+    recommended product IDs) by exact SHA-256 of the upload bytes. Near
+    duplicates are looked up by the nearest perceptual hash within
+    `max_distance` bits and a matching aspect ratio; such a candidate must be
+    confirmed by the caller (see same_text) before it is used.
+    LRU-bounded by `max_entries` with a TTL; `max_distance=0` disables the
+    perceptual layer.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 86400, max_distance: int = 6):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.max_distance = max_distance
+        self.stats = {"exact_hits": 0, "perceptual_hits": 0, "perceptual_rejects": 0, "misses": 0,
+                      "evictions": 0}
+        # sha256 -> (perceptual hash, aspect ratio, result, created)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expired(self, created: float) -> bool:
+        return time.time() - created > self.ttl
+
+    def get_exact(self, sha256: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(sha256)
+            if entry is None:
+                return None
+            if self._expired(entry[3]):
+                del self._entries[sha256]
+                return None
+            self._entries.move_to_end(sha256)
+            self.stats["exact_hits"] += 1
+            return entry[2]
+
+    def find_similar(self, phash: int, aspect: float) -> Optional[dict]:
+        """Nearest unexpired entry by perceptual hash with the same aspect ratio, unconfirmed"""
+        if self.max_distance <= 0:
+            return None
+        with self._lock:
+            best: Tuple[int, Optional[str]] = (self.max_distance + 1, None)
+            for key, (other, other_aspect, _, created) in self._entries.items():
+                if self._expired(created) or abs(aspect - other_aspect) > ASPECT_TOLERANCE * other_aspect:
+                    continue
+                distance = (phash ^ other).bit_count()
+                if distance < best[0]:
+                    best = (distance, key)
+            if best[1] is None:
+                return None
+            return self._entries[best[1]][2]
+
+    def record_similar(self, confirmed: bool):
+        with self._lock:
+            self.stats["perceptual_hits" if confirmed else "perceptual_rejects"] += 1
+
+    def record_miss(self):
+        with self._lock:
+            self.stats["misses"] += 1
+
+    def put(self, sha256: str, phash: int, aspect: float, result: dict):
+        with self._lock:
+            self._entries[sha256] = (phash, aspect, result, time.time())
+            self._entries.move_to_end(sha256)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def info(self) -> dict:
+        lookups = self.stats["exact_hits"] + self.stats["perceptual_hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "entries": len(self._entries),
+            "exact_hit_rate": round(self.stats["exact_hits"] / lookups, 4) if lookups else 0.0,
+            "perceptual_hit_rate": round(self.stats["perceptual_hits"] / lookups, 4) if lookups else 0.0,
+        }
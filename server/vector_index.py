@@ -0,0 +1,298 @@
+import os
+import json
+import time
+import queue
+import shutil
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# "chroma" queries the HNSW index; "flat" scans a memory-mapped matrix exactly (built by db_store.py)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma").lower()
+FLAT_INDEX_PATH = os.getenv("FLAT_INDEX_PATH", "./flat_index")
+# Storage for the flat matrix: float32, float16 or int8 (per-vector scales). float32 is
+# exact and fastest; int8 quarters the footprint for large catalogs at ~1% recall. numpy
+# converts float16 slowly on most CPUs, so it saves memory but costs latency.
+FLAT_INDEX_DTYPE = os.getenv("FLAT_INDEX_DTYPE", "float32").lower()
+FLAT_SEARCH_MAX_BATCH = int(os.getenv("FLAT_SEARCH_MAX_BATCH", "32"))
+FLAT_SEARCH_MAX_WAIT_MS = float(os.getenv("FLAT_SEARCH_MAX_WAIT_MS", "1"))
+
+DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+# Rows scored before each top-k selection; bounds scores to CHUNK_ROWS * queries floats
+CHUNK_ROWS = 16384
+# float16 / int8 rows are widened through a scratch buffer this size, small enough to stay in cache
+CONVERT_ROWS = 256
+
+
+def _unit_rows(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.clip(norms, 1e-12, None)
+
+
+def quantize_rows(vectors: np.ndarray, dtype: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """Unit rows in the storage dtype, plus per-row scales for int8 (value = code * scale)"""
+    unit = _unit_rows(vectors)
+    if dtype != "int8":
+        return unit.astype(DTYPES[dtype]), None
+    scales = np.abs(unit).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.rint(unit / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+# -------------------- Build --------------------
+class FlatIndexWriter:
+    """
+    Writes unit-normalised vectors into a preallocated .npy matrix in a temp
+    directory, then swaps it in the way CatalogSnapshotWriter does
+    """
+
+    def __init__(self, path: str, count: int, dimensions: int, dtype: str = FLAT_INDEX_DTYPE,
+                 signature: Optional[Dict] = None):
+        if dtype not in DTYPES:
+            raise ValueError(f"Unknown flat index dtype '{dtype}', expected one of {sorted(DTYPES)}")
+        self.path = path
+        self.tmp = f"{path}.tmp"
+        self.dtype = dtype
+        self.signature = signature or {}
+        shutil.rmtree(self.tmp, ignore_errors=True)
+        os.makedirs(self.tmp)
+        self.vectors = np.lib.format.open_memmap(
+            os.path.join(self.tmp, "vectors.npy"), mode="w+", dtype=DTYPES[dtype], shape=(count, dimensions)
+        )
+        self.scales = np.ones(count, dtype=np.float32) if dtype == "int8" else None
+        self.ids: List[str] = []
+
+    def add(self, ids: Sequence[str], embeddings):
+        start = len(self.ids)
+        codes, scales = quantize_rows(embeddings, self.dtype)
+        self.vectors[start:start + len(ids)] = codes
+        if scales is not None:
+            self.scales[start:start + len(ids)] = scales
+        self.ids.extend(str(pid) for pid in ids)
+
+    def save(self):
+        if len(self.ids) != self.vectors.shape[0]:
+            raise ValueError(f"Flat index expected {self.vectors.shape[0]} vectors, got {len(self.ids)}")
+        self.vectors.flush()
+        del self.vectors
+        if self.scales is not None:
+            np.save(os.path.join(self.tmp, "scales.npy"), self.scales)
+        with open(os.path.join(self.tmp, "index.json"), "w", encoding="utf-8") as f:
+            json.dump({"dtype": self.dtype, "signature": self.signature, "ids": self.ids}, f)
+
+        old = f"{self.path}.old"
+        shutil.rmtree(old, ignore_errors=True)
+        if os.path.exists(self.path):
+            os.replace(self.path, old)
+        os.replace(self.tmp, self.path)
+        shutil.rmtree(old, ignore_errors=True)
+        logger.info(f"Saved flat vector index: {len(self.ids)} vectors ({self.dtype}) -> {self.path}")
+
+
+def build_flat_index(collection, path: str = FLAT_INDEX_PATH, dtype: str = FLAT_INDEX_DTYPE,
+                     signature: Optional[Dict] = None, page_size: int = 5000) -> int:
+    """Export every embedding in the collection into a flat index; returns the vector count"""
+    count = collection.count()
+    writer = None
+    offset = 0
+    while offset < count:
+        page = collection.get(include=["embeddings"], limit=page_size, offset=offset)
+        if not page["ids"]:
+            break
+        if writer is None:
+            writer = FlatIndexWriter(path, count, len(page["embeddings"][0]), dtype, signature)
+        writer.add(page["ids"], page["embeddings"])
+        offset += len(page["ids"])
+    if writer is None:
+        logger.warning("Collection is empty, no flat vector index written")
+        return 0
+    writer.save()
+    return len(writer.ids)
+
+
+# -------------------- Search --------------------
+class FlatVectorIndex:
+    """
+    Exact cosine top-k over a memory-mapped matrix of unit vectors. The matrix
+    is scanned in chunks with one matmul per chunk for all queries in a batch
+    and `argpartition` for the per-chunk top k, so scratch memory does not grow
+    with catalog size and pages stay file-backed.
+    """
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, "index.json"), encoding="utf-8") as f:
+            manifest = json.load(f)
+        self.dtype = manifest["dtype"]
+        self.signature = manifest.get("signature") or {}
+        self.ids = manifest["ids"]
+        self.size = len(self.ids)
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        self.dimensions = self.vectors.shape[1]
+        scales_path = os.path.join(path, "scales.npy")
+        self.scales = np.load(scales_path) if os.path.exists(scales_path) else None
+        self._rows = {pid: row for row, pid in enumerate(self.ids)}
+
+    @classmethod
+    def load(cls, path: str = FLAT_INDEX_PATH):
+        """Returns None when no index has been built yet"""
+        if not os.path.exists(os.path.join(path, "index.json")):
+            logger.warning(f"No flat vector index at {path}; run db_store.py with VECTOR_BACKEND=flat")
+            return None
+        index = cls(path)
+        logger.info(f"Loaded flat vector index: {index.size} x {index.dimensions} ({index.dtype})")
+        return index
+
+    def rows_mask(self, ids: Sequence[str]) -> np.ndarray:
+        mask = np.zeros(self.size, dtype=bool)
+        rows = [self._rows[str(pid)] for pid in ids if str(pid) in self._rows]
+        mask[rows] = True
+        return mask
+
+    def search(self, queries, k: int, masks: Optional[List[Optional[np.ndarray]]] = None):
+        """
+        Top-k rows per query as a list of (rows, scores), best first. `masks[j]`
+        restricts query j to the rows set in the boolean mask.
+        """
+        queries = _unit_rows(np.atleast_2d(queries))
+        if queries.shape[1] != self.dimensions:
+            raise ValueError(f"Query has {queries.shape[1]} dimensions, index has {self.dimensions}")
+        masks = masks or [None] * len(queries)
+        k = min(k, self.size)
+        if k <= 0:
+            return [(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)) for _ in queries]
+
+        widen = self.vectors.dtype != np.float32
+        scratch = np.empty((CONVERT_ROWS, self.dimensions), dtype=np.float32) if widen else None
+        best_rows, best_scores = [], []
+        for start in range(0, self.size, CHUNK_ROWS):
+            stop = min(start + CHUNK_ROWS, self.size)
+            if not widen:
+                scores = self.vectors[start:stop] @ queries.T
+            else:
+                scores = np.empty((stop - start, len(queries)), dtype=np.float32)
+                for offset in range(start, stop, CONVERT_ROWS):
+                    end = min(offset + CONVERT_ROWS, stop)
+                    buffer = scratch[:end - offset]
+                    np.copyto(buffer, self.vectors[offset:end])
+                    np.matmul(buffer, queries.T, out=scores[offset - start:end - start])
+            if self.scales is not None:
+                scores *= self.scales[start:stop, None]
+            for j, mask in enumerate(masks):
+                if mask is not None:
+                    scores[~mask[start:stop], j] = -np.inf
+            if stop - start > k:
+                top = np.argpartition(-scores, k - 1, axis=0)[:k]
+                scores = np.take_along_axis(scores, top, axis=0)
+            else:
+                top = np.broadcast_to(np.arange(stop - start)[:, None], scores.shape)
+            best_rows.append(top + start)
+            best_scores.append(scores)
+
+        rows = np.concatenate(best_rows)
+        scores = np.concatenate(best_scores)
+        results = []
+        for j in range(len(queries)):
+            column = scores[:, j]
+            order = np.argsort(-column, kind="stable")[:k]
+            keep = order[np.isfinite(column[order])]
+            results.append((rows[keep, j], column[keep]))
+        return results
+
+
+# -------------------- Collection Adapter --------------------
+class _PendingQuery:
+    __slots__ = ("vector", "k", "mask", "future")
+
+    def __init__(self, vector, k: int, mask):
+        self.vector = vector
+        self.k = k
+        self.mask = mask
+        self.future = Future()
+
+
+class FlatCollection:
+    """
+    Stands in for the ChromaDB collection in request handlers: `query` is answered
+    from a FlatVectorIndex, everything else (get, count, ...) goes to ChromaDB.
+
+    Queries from concurrent requests are coalesced, like MicroBatchingEmbedder
+    does for embeddings, so they share one pass over the matrix. Filtering is by
+    `ids` only; callers resolve metadata constraints to IDs first.
+    """
+
+    def __init__(self, collection, index: FlatVectorIndex, max_batch_size: int = FLAT_SEARCH_MAX_BATCH,
+                 max_wait_ms: float = FLAT_SEARCH_MAX_WAIT_MS):
+        self.collection = collection
+        self.index = index
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.stats = {"queries": 0, "batches": 0}
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    def query(self, query_embeddings=None, n_results: int = 10, ids: Optional[Sequence[str]] = None,
+              where: Optional[Dict] = None, include: Sequence[str] = ("metadatas",), **kwargs):
+        if query_embeddings is None:
+            raise ValueError("FlatCollection.query needs query_embeddings")
+        if where is not None:
+            raise ValueError("FlatCollection.query filters by ids only; resolve `where` to IDs first")
+        mask = self.index.rows_mask(ids) if ids is not None else None
+        pending = [_PendingQuery(np.asarray(vector, dtype=np.float32), n_results, mask) for vector in query_embeddings]
+        self._ensure_worker()
+        for item in pending:
+            self._queue.put(item)
+
+        result_ids = []
+        for item in pending:
+            rows, _ = item.future.result()
+            result_ids.append([self.index.ids[row] for row in rows])
+        result = {"ids": result_ids}
+        if "metadatas" in include:
+            flat = [pid for row_ids in result_ids for pid in row_ids]
+            fetched = self.collection.get(ids=list(dict.fromkeys(flat))) if flat else {"ids": [], "metadatas": []}
+            by_id = dict(zip(fetched["ids"], fetched["metadatas"]))
+            result["metadatas"] = [[by_id.get(pid) for pid in row_ids] for row_ids in result_ids]
+        return result
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="flat-search", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self.stats["queries"] += len(batch)
+            self.stats["batches"] += 1
+            try:
+                results = self.index.search(
+                    np.stack([item.vector for item in batch]),
+                    max(item.k for item in batch),
+                    [item.mask for item in batch],
+                )
+                for item, (rows, scores) in zip(batch, results):
+                    item.future.set_result((rows[:item.k], scores[:item.k]))
+            except Exception as e:
+                for item in batch:
+                    if not item.future.done():
+                        item.future.set_exception(e)